@@ -96,6 +96,15 @@ class Assignment(kvs.Base, assignment.Driver):
         except exception.NotFound:
             raise exception.RoleNotFound(role_id=role_id)
 
+    def get_roles(self, role_ids):
+        refs = []
+        for role_id in set(role_ids):
+            try:
+                refs.append(self.db.get('role-%s' % role_id))
+            except exception.NotFound:
+                pass
+        return refs
+
     def list_roles(self):
         role_ids = self.db.get('role_list', [])
         return [self.get_role(x) for x in role_ids]
@@ -152,7 +161,7 @@ class Assignment(kvs.Base, assignment.Driver):
             user_ref['tenants'] = list(tenants)
             self.identity_api.update_user(user_id, user_ref)
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, **filters):
         """List the role assignments.
 
         The kvs backend stores role assignments as key-values:
@@ -190,7 +199,7 @@ class Assignment(kvs.Base, assignment.Driver):
                 role_assignment['role_id'] = r
                 assignment_list.append(role_assignment)
 
-        return assignment_list
+        return self._filter_role_assignments(assignment_list, **filters)
 
     # CRUD
     def create_project(self, tenant_id, tenant):
@@ -112,6 +112,9 @@ class Assignment(assignment.Driver):
     def get_role(self, role_id):
         return self.role.get(role_id)
 
+    def get_roles(self, role_ids):
+        return self.role.get_list(role_ids)
+
     def list_roles(self):
         return self.role.get_all()
 
@@ -295,18 +298,16 @@ class ProjectApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap):
         project_ids = set()
         for assoc in associations:
             project_ids.add(self._dn_to_id(assoc.project_dn))
-        projects = []
-        for project_id in project_ids:
-            #slower to get them one at a time, but a huge list could blow out
-            #the connection.  This is the safer way
-            projects.append(self.get(project_id))
-        return projects
+        # A single search for a huge list could blow out the connection, so
+        # the projects are searched for a chunk of ids at a time.
+        return self.get_list(project_ids)
 
     def add_user(self, tenant_id, user_dn):
+        dn = self._id_to_dn(tenant_id)
         conn = self.get_connection()
         try:
             conn.modify_s(
-                self._id_to_dn(tenant_id),
+                dn,
                 [(ldap.MOD_ADD,
                   self.member_attribute,
                   user_dn)])
@@ -319,9 +320,10 @@ class ProjectApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap):
             conn.unbind_s()
 
     def remove_user(self, tenant_id, user_dn, user_id):
+        dn = self._id_to_dn(tenant_id)
         conn = self.get_connection()
         try:
-            conn.modify_s(self._id_to_dn(tenant_id),
+            conn.modify_s(dn,
                           [(ldap.MOD_DELETE,
                             self.member_attribute,
                             user_dn)])
@@ -19,6 +19,7 @@ from keystone import clean
 from keystone.common import dependency
 from keystone.common import sql
 from keystone.common.sql import migration
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 
@@ -57,69 +58,122 @@ class Assignment(sql.Base, assignment.Driver):
     def list_user_ids_for_project(self, tenant_id):
         session = self.get_session()
         self.get_project(tenant_id)
-        query = session.query(UserProjectGrant)
-        query = query.filter(UserProjectGrant.project_id ==
-                             tenant_id)
-        project_refs = query.all()
-        return [project_ref.user_id for project_ref in project_refs]
+        query = session.query(RoleAssignment.actor_id).distinct()
+        query = query.filter_by(type=AssignmentType.USER_PROJECT,
+                                target_id=tenant_id)
+        return [actor_id for actor_id, in query.all()]
+
+    def _assignment_query(self, session, user_id=None, group_id=None,
+                          domain_id=None, project_id=None, **kwargs):
+        if user_id:
+            actor_id = user_id
+            if project_id:
+                assignment_type = AssignmentType.USER_PROJECT
+            else:
+                assignment_type = AssignmentType.USER_DOMAIN
+        else:
+            actor_id = group_id
+            if project_id:
+                assignment_type = AssignmentType.GROUP_PROJECT
+            else:
+                assignment_type = AssignmentType.GROUP_DOMAIN
+        query = session.query(RoleAssignment)
+        return query.filter_by(type=assignment_type, actor_id=actor_id,
+                               target_id=project_id or domain_id, **kwargs)
 
     def _get_metadata(self, user_id=None, tenant_id=None,
                       domain_id=None, group_id=None):
         session = self.get_session()
+        refs = self._assignment_query(session, user_id, group_id, domain_id,
+                                      tenant_id).all()
+        if not refs:
+            raise exception.MetadataNotFound()
+        return {'roles': [self._role_to_dict(ref.role_id, ref.inherited)
+                          for ref in refs]}
 
+    def _check_grant_targets(self, session, role_id, domain_id, project_id):
+        role_ref = self._get_role(session, role_id)
+        if domain_id:
+            self._get_domain(session, domain_id)
+        if project_id:
+            self._get_project(session, project_id)
+        return role_ref
+
+    def _actor_filter(self, user_id, group_ids):
+        """Match the assignments of a user, of any of the groups, or both."""
+        actors = []
         if user_id:
-            if tenant_id:
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(UserDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(user_id=user_id)
-        elif group_id:
-            if tenant_id:
-                q = session.query(GroupProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(GroupDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(group_id=group_id)
-        try:
-            return q.one().data
-        except sql.NotFound:
-            raise exception.MetadataNotFound()
+            actors.append(sql.and_(RoleAssignment.actor_id == user_id,
+                                   RoleAssignment.type.in_(
+                                       AssignmentType.USER)))
+        if group_ids:
+            actors.append(sql.and_(RoleAssignment.actor_id.in_(group_ids),
+                                   RoleAssignment.type.in_(
+                                       AssignmentType.GROUP)))
+        return sql.or_(*actors)
+
+    def _actor_filters(self, user_id, group_ids):
+        """Split _actor_filter() in filters of at most IN_CLAUSE_SIZE groups.
+
+        Only the first filter matches the user, so that no assignment is
+        matched by more than one of them.
+
+        """
+        chunks = utils.chunked(group_ids or [], sql.IN_CLAUSE_SIZE) or [[]]
+        yield self._actor_filter(user_id, chunks[0])
+        for group_ids_chunk in chunks[1:]:
+            yield self._actor_filter(None, group_ids_chunk)
+
+    def list_role_ids_for_user_and_project(self, user_id, group_ids,
+                                           project_id, domain_id):
+        targets = [sql.and_(RoleAssignment.target_id == project_id,
+                            RoleAssignment.type.in_(AssignmentType.PROJECT))]
+        if CONF.os_inherit.enabled:
+            targets.append(sql.and_(RoleAssignment.target_id == domain_id,
+                                    RoleAssignment.inherited,
+                                    RoleAssignment.type.in_(
+                                        AssignmentType.DOMAIN)))
+        session = self.get_session()
+        role_ids = []
+        for actors in self._actor_filters(user_id, group_ids):
+            query = session.query(RoleAssignment.role_id)
+            query = query.filter(actors)
+            query = query.filter(sql.or_(*targets))
+            role_ids.extend(role_id for role_id, in query.all())
+        return role_ids
+
+    def list_role_ids_for_user_and_domain(self, user_id, group_ids,
+                                          domain_id):
+        session = self.get_session()
+        role_ids = []
+        for actors in self._actor_filters(user_id, group_ids):
+            query = session.query(RoleAssignment.role_id)
+            query = query.filter(actors)
+            query = query.filter(
+                RoleAssignment.type.in_(AssignmentType.DOMAIN))
+            query = query.filter_by(target_id=domain_id, inherited=False)
+            role_ids.extend(role_id for role_id, in query.all())
+        return role_ids
 
     def create_grant(self, role_id, user_id=None, group_id=None,
                      domain_id=None, project_id=None,
                      inherited_to_projects=False):
         session = self.get_session()
-        self._get_role(session, role_id)
-
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
+        self._check_grant_targets(session, role_id, domain_id, project_id)
 
         if project_id and inherited_to_projects:
             msg = _('Inherited roles can only be assigned to domains')
             raise exception.Conflict(type='role grant', details=msg)
 
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
-        metadata_ref['roles'] = self._add_role_to_role_dicts(
-            role_id, inherited_to_projects, metadata_ref.get('roles', []))
-
-        if is_new:
-            self._create_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
-        else:
-            self._update_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
+        with session.begin():
+            query = self._assignment_query(session, user_id, group_id,
+                                           domain_id, project_id,
+                                           role_id=role_id,
+                                           inherited=inherited_to_projects)
+            if query.first() is None:
+                session.add(RoleAssignment.from_grant(
+                    role_id, user_id, group_id, domain_id, project_id,
+                    inherited_to_projects))
 
     def list_grants(self, user_id=None, group_id=None,
                     domain_id=None, project_id=None,
@@ -130,35 +184,25 @@ class Assignment(sql.Base, assignment.Driver):
         if project_id:
             self._get_project(session, project_id)
 
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-
-        return [self.get_role(x) for x in
-                self._roles_from_role_dicts(metadata_ref.get('roles', []),
-                                            inherited_to_projects)]
+        query = self._assignment_query(session, user_id, group_id,
+                                       domain_id, project_id,
+                                       inherited=inherited_to_projects)
+        role_ids = query.with_entities(RoleAssignment.role_id).subquery()
+        query = session.query(Role).filter(Role.id.in_(role_ids))
+        return [ref.to_dict() for ref in query.all()]
 
     def get_grant(self, role_id, user_id=None, group_id=None,
                   domain_id=None, project_id=None,
                   inherited_to_projects=False):
         session = self.get_session()
-        role_ref = self._get_role(session, role_id)
-
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
-
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-        role_ids = set(self._roles_from_role_dicts(
-            metadata_ref.get('roles', []), inherited_to_projects))
-        if role_id not in role_ids:
+        role_ref = self._check_grant_targets(session, role_id, domain_id,
+                                             project_id)
+
+        query = self._assignment_query(session, user_id, group_id,
+                                       domain_id, project_id,
+                                       role_id=role_id,
+                                       inherited=inherited_to_projects)
+        if query.first() is None:
             raise exception.RoleNotFound(role_id=role_id)
         return role_ref.to_dict()
 
@@ -171,36 +215,15 @@ class Assignment(sql.Base, assignment.Driver):
             self.identity_api.get_group(group_id)
 
         session = self.get_session()
-        self._get_role(session, role_id)
-
-        if domain_id:
-            self._get_domain(session, domain_id)
-        if project_id:
-            self._get_project(session, project_id)
-
-        try:
-            metadata_ref = self._get_metadata(user_id, project_id,
-                                              domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
-        try:
-            metadata_ref['roles'] = self._remove_role_from_role_dicts(
-                role_id, inherited_to_projects, metadata_ref.get('roles', []))
-        except KeyError:
-            raise exception.RoleNotFound(role_id=role_id)
+        self._check_grant_targets(session, role_id, domain_id, project_id)
 
-        if is_new:
-            # TODO(henry-nash) It seems odd that you would create a new
-            # entry in response to trying to delete a role that was not
-            # assigned.  Although benign, this should probably be removed.
-            self._create_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
-        else:
-            self._update_metadata(user_id, project_id, metadata_ref,
-                                  domain_id, group_id)
+        with session.begin():
+            query = self._assignment_query(session, user_id, group_id,
+                                           domain_id, project_id,
+                                           role_id=role_id,
+                                           inherited=inherited_to_projects)
+            if not query.delete(False):
+                raise exception.RoleNotFound(role_id=role_id)
 
     def list_projects(self, domain_id=None):
         session = self.get_session()
@@ -214,177 +237,91 @@ class Assignment(sql.Base, assignment.Driver):
         return [project_ref.to_dict() for project_ref in project_refs]
 
     def list_projects_for_user(self, user_id, group_ids):
-        # NOTE(henry-nash): This method is written as a series of code blocks,
-        # rather than broken down into too many sub-functions, to prepare for
-        # SQL optimization when we rationalize the grant tables in the
-        # future.
-
-        def _list_domains_with_inherited_grants(query):
-            domain_ids = set()
-            domain_grants = query.all()
-            for domain_grant in domain_grants:
-                for grant in domain_grant.data.get('roles', []):
-                    if 'inherited_to' in grant:
-                        domain_ids.add(domain_grant.domain_id)
-            return domain_ids
-
-        # NOTE(henry-nash): The metadata management code doesn't always clean
-        # up table entries when the last role is deleted - so when checking
-        # grant entries, only include this project if there are actually roles
-        # present.
-
-        # First get a list of the projects for which the user has a direct
-        # role assigned
-        session = self.get_session()
-        query = session.query(UserProjectGrant)
-        query = query.filter_by(user_id=user_id)
-        project_grants_for_user = query.all()
-        project_ids = set(x.project_id for x in project_grants_for_user
-                          if x.data.get('roles'))
-
-        # Now find any projects with group roles and add them in
-        for group_id in group_ids:
-            query = session.query(GroupProjectGrant)
-            query = query.filter_by(group_id=group_id)
-            project_grants_for_group = query.all()
-            for project_grant in project_grants_for_group:
-                if project_grant.data.get('roles'):
-                    project_ids.add(project_grant.project_id)
-
-        if not CONF.os_inherit.enabled:
-            return [self.get_project(x) for x in project_ids]
-
-        # Inherited roles are enabled, so check to see if this user has any
-        # such roles (direct or group) on any domain, in which case we must
-        # add in all the projects in that domain.
-
-        domain_ids = set()
-
-        # First check for user roles on any domains
-        query = session.query(UserDomainGrant)
-        query = query.filter_by(user_id=user_id)
-        domain_ids.update(_list_domains_with_inherited_grants(query))
-
-        # Now for group roles on any domains
-        for group_id in group_ids:
-            query = session.query(GroupDomainGrant)
-            query = query.filter_by(group_id=group_id)
-            domain_ids.update(_list_domains_with_inherited_grants(query))
-
-        # For each domain on which the user has an inherited role, get the
-        # list of projects in that domain and add them in to the
-        # project id list
-
-        for domain_id in domain_ids:
-            query = session.query(Project)
-            query = query.filter_by(domain_id=domain_id)
-            project_refs = query.all()
-            for project_ref in project_refs:
-                project_ids.add(project_ref.id)
-
-        return [self.get_project(x) for x in project_ids]
+        session = self.get_session()
+        projects = {}
+        # The projects are fetched in a single query, unless the user is in
+        # more groups than fit in one IN clause.
+        for group_ids_chunk in (utils.chunked(group_ids, sql.IN_CLAUSE_SIZE)
+                                or [[]]):
+            actors = self._actor_filter(user_id, group_ids_chunk)
+
+            # The projects on which the user or its groups have a role
+            # assigned.
+            project_ids = session.query(RoleAssignment.target_id)
+            project_ids = project_ids.filter(actors)
+            project_ids = project_ids.filter(
+                RoleAssignment.type.in_(AssignmentType.PROJECT))
+            targets = [Project.id.in_(project_ids.subquery())]
+
+            if CONF.os_inherit.enabled:
+                # Any role inherited from a domain applies to all the
+                # projects in that domain, so add those in too.
+                domain_ids = session.query(RoleAssignment.target_id)
+                domain_ids = domain_ids.filter(actors)
+                domain_ids = domain_ids.filter_by(inherited=True)
+                targets.append(Project.domain_id.in_(domain_ids.subquery()))
+
+            query = session.query(Project).filter(sql.or_(*targets))
+            for ref in query.all():
+                projects[ref.id] = ref
+        return [ref.to_dict() for ref in projects.values()]
 
     def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
         self.identity_api.get_user(user_id)
         session = self.get_session()
         self._get_project(session, tenant_id)
         self._get_role(session, role_id)
-        try:
-            metadata_ref = self._get_metadata(user_id, tenant_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-
-        try:
-            metadata_ref['roles'] = self._add_role_to_role_dicts(
-                role_id, False, metadata_ref.get('roles', []),
-                allow_existing=False)
-        except KeyError:
-            msg = ('User %s already has role %s in tenant %s'
-                   % (user_id, role_id, tenant_id))
-            raise exception.Conflict(type='role grant', details=msg)
 
-        if is_new:
-            self._create_metadata(user_id, tenant_id, metadata_ref)
-        else:
-            self._update_metadata(user_id, tenant_id, metadata_ref)
+        with session.begin():
+            query = self._assignment_query(session, user_id=user_id,
+                                           project_id=tenant_id,
+                                           role_id=role_id)
+            if query.first() is not None:
+                msg = ('User %s already has role %s in tenant %s'
+                       % (user_id, role_id, tenant_id))
+                raise exception.Conflict(type='role grant', details=msg)
+            session.add(RoleAssignment.from_grant(role_id, user_id=user_id,
+                                                  project_id=tenant_id))
 
     def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
-        try:
-            metadata_ref = self._get_metadata(user_id, tenant_id)
-            try:
-                metadata_ref['roles'] = self._remove_role_from_role_dicts(
-                    role_id, False, metadata_ref.get('roles', []))
-            except KeyError:
+        session = self.get_session()
+        with session.begin():
+            query = self._assignment_query(session, user_id=user_id,
+                                           project_id=tenant_id,
+                                           role_id=role_id, inherited=False)
+            if not query.delete(False):
                 raise exception.RoleNotFound(message=_(
                     'Cannot remove role that has not been granted, %s') %
                     role_id)
 
-            if len(metadata_ref['roles']):
-                self._update_metadata(user_id, tenant_id, metadata_ref)
-            else:
-                session = self.get_session()
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(user_id=user_id)
-                q = q.filter_by(project_id=tenant_id)
-                q.delete()
-        except exception.MetadataNotFound:
-            msg = 'Cannot remove role that has not been granted, %s' % role_id
-            raise exception.RoleNotFound(message=msg)
-
-    def list_role_assignments(self):
-
-        # TODO(henry-nash): The current implementation is really simulating
-        # us having a common role assignment table, rather than having the
-        # four different grant tables we have today.  When we move to role
-        # assignment as a first class entity, we should create the single
-        # assignment table, simplifying the logic of this (and many other)
-        # functions.
-
-        session = self.get_session()
-        assignment_list = []
-        refs = session.query(UserDomainGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r})
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), True):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r,
-                                                'inherited_to_projects': True})
-        refs = session.query(UserProjectGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'user_id': x.user_id,
-                                                'project_id': x.project_id,
-                                                'role_id': r})
-        refs = session.query(GroupDomainGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r})
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), True):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'domain_id': x.domain_id,
-                                                'role_id': r,
-                                                'inherited_to_projects': True})
-        refs = session.query(GroupProjectGrant).all()
-        for x in refs:
-            for r in self._roles_from_role_dicts(
-                    x.data.get('roles', {}), False):
-                        assignment_list.append({'group_id': x.group_id,
-                                                'project_id': x.project_id,
-                                                'role_id': r})
-        return assignment_list
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, project_id=None,
+                              domain_id=None, inherited_to_projects=None):
+        session = self.get_session()
+        query = session.query(RoleAssignment)
+        if role_id:
+            query = query.filter_by(role_id=role_id)
+        if user_id or group_ids is not None:
+            if not (user_id or group_ids):
+                return []
+            actor_filters = list(self._actor_filters(user_id, group_ids))
+        else:
+            actor_filters = [None]
+        if project_id:
+            query = query.filter(
+                RoleAssignment.type.in_(AssignmentType.PROJECT))
+            query = query.filter_by(target_id=project_id)
+        if domain_id:
+            query = query.filter(
+                RoleAssignment.type.in_(AssignmentType.DOMAIN))
+            query = query.filter_by(target_id=domain_id)
+        if inherited_to_projects is not None:
+            query = query.filter_by(inherited=inherited_to_projects)
+        refs = []
+        for actors in actor_filters:
+            actor_query = query if actors is None else query.filter(actors)
+            refs.extend(ref.to_assignment_dict() for ref in actor_query.all())
+        return refs
 
     # CRUD
     @sql.handle_conflicts(type='project')
@@ -424,81 +361,15 @@ class Assignment(sql.Base, assignment.Driver):
         with session.begin():
             tenant_ref = self._get_project(session, tenant_id)
 
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
-            q.delete(False)
-
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
-            q.delete(False)
-
-            q = session.query(GroupProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.USER_PROJECT, AssignmentType.GROUP_PROJECT]))
+            q = q.filter_by(target_id=tenant_id)
             q.delete(False)
 
             session.delete(tenant_ref)
             session.flush()
 
-    @sql.handle_conflicts(type='metadata')
-    def _create_metadata(self, user_id, tenant_id, metadata,
-                         domain_id=None, group_id=None):
-        session = self.get_session()
-        with session.begin():
-            if user_id:
-                if tenant_id:
-                    session.add(UserProjectGrant
-                                (user_id=user_id,
-                                 project_id=tenant_id,
-                                 data=metadata))
-                elif domain_id:
-                    session.add(UserDomainGrant
-                                (user_id=user_id,
-                                 domain_id=domain_id,
-                                 data=metadata))
-            elif group_id:
-                if tenant_id:
-                    session.add(GroupProjectGrant
-                                (group_id=group_id,
-                                 project_id=tenant_id,
-                                 data=metadata))
-                elif domain_id:
-                    session.add(GroupDomainGrant
-                                (group_id=group_id,
-                                 domain_id=domain_id,
-                                 data=metadata))
-            session.flush()
-        return metadata
-
-    @sql.handle_conflicts(type='metadata')
-    def _update_metadata(self, user_id, tenant_id, metadata,
-                         domain_id=None, group_id=None):
-        session = self.get_session()
-        with session.begin():
-            if user_id:
-                if tenant_id:
-                    q = session.query(UserProjectGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(UserDomainGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(domain_id=domain_id)
-            elif group_id:
-                if tenant_id:
-                    q = session.query(GroupProjectGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(GroupDomainGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(domain_id=domain_id)
-            metadata_ref = q.first()
-            data = metadata_ref.data.copy()
-            data.update(metadata)
-            metadata_ref.data = data
-            session.flush()
-        return metadata_ref
-
     # domain crud
 
     @sql.handle_conflicts(type='domain')
@@ -554,6 +425,11 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
         with session.begin():
             ref = self._get_domain(session, domain_id)
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.USER_DOMAIN, AssignmentType.GROUP_DOMAIN]))
+            q = q.filter_by(target_id=domain_id)
+            q.delete(False)
             session.delete(ref)
             session.flush()
 
@@ -583,6 +459,17 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
         return self._get_role(session, role_id).to_dict()
 
+    def get_roles(self, role_ids):
+        if not role_ids:
+            return []
+        session = self.get_session()
+        refs = []
+        for role_ids_chunk in utils.chunked(set(role_ids),
+                                            sql.IN_CLAUSE_SIZE):
+            query = session.query(Role).filter(Role.id.in_(role_ids_chunk))
+            refs.extend(ref.to_dict() for ref in query.all())
+        return refs
+
     @sql.handle_conflicts(type='role')
     def update_role(self, role_id, role):
         session = self.get_session()
@@ -604,31 +491,8 @@ class Assignment(sql.Base, assignment.Driver):
 
         with session.begin():
             ref = self._get_role(session, role_id)
-            for metadata_ref in session.query(UserProjectGrant):
-                try:
-                    self.delete_grant(role_id, user_id=metadata_ref.user_id,
-                                      project_id=metadata_ref.project_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(UserDomainGrant):
-                try:
-                    self.delete_grant(role_id, user_id=metadata_ref.user_id,
-                                      domain_id=metadata_ref.domain_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(GroupProjectGrant):
-                try:
-                    self.delete_grant(role_id, group_id=metadata_ref.group_id,
-                                      project_id=metadata_ref.project_id)
-                except exception.RoleNotFound:
-                    pass
-            for metadata_ref in session.query(GroupDomainGrant):
-                try:
-                    self.delete_grant(role_id, group_id=metadata_ref.group_id,
-                                      domain_id=metadata_ref.domain_id)
-                except exception.RoleNotFound:
-                    pass
-
+            q = session.query(RoleAssignment).filter_by(role_id=role_id)
+            q.delete(False)
             session.delete(ref)
             session.flush()
 
@@ -636,12 +500,10 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
 
         with session.begin():
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(user_id=user_id)
-            q.delete(False)
-
-            q = session.query(UserDomainGrant)
-            q = q.filter_by(user_id=user_id)
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.USER_PROJECT, AssignmentType.USER_DOMAIN]))
+            q = q.filter_by(actor_id=user_id)
             q.delete(False)
 
             session.flush()
@@ -650,13 +512,10 @@ class Assignment(sql.Base, assignment.Driver):
         session = self.get_session()
 
         with session.begin():
-
-            q = session.query(GroupProjectGrant)
-            q = q.filter_by(group_id=group_id)
-            q.delete(False)
-
-            q = session.query(GroupDomainGrant)
-            q = q.filter_by(group_id=group_id)
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_(
+                [AssignmentType.GROUP_PROJECT, AssignmentType.GROUP_DOMAIN]))
+            q = q.filter_by(actor_id=group_id)
             q.delete(False)
 
             session.flush()
@@ -696,66 +555,77 @@ class Role(sql.ModelBase, sql.DictBase):
     __table_args__ = (sql.UniqueConstraint('name'), {})
 
 
-class BaseGrant(sql.DictBase):
-    """Base Grant class.
-
-    There are four grant tables in the current implementation, one for
-    each type of grant:
+class AssignmentType(object):
+    USER_PROJECT = 'UserProject'
+    GROUP_PROJECT = 'GroupProject'
+    USER_DOMAIN = 'UserDomain'
+    GROUP_DOMAIN = 'GroupDomain'
 
-    - User for Project
-    - User for Domain
-    - Group for Project
-    - Group for Domain
+    USER = (USER_PROJECT, USER_DOMAIN)
+    GROUP = (GROUP_PROJECT, GROUP_DOMAIN)
+    PROJECT = (USER_PROJECT, GROUP_PROJECT)
+    DOMAIN = (USER_DOMAIN, GROUP_DOMAIN)
 
-    Each is a table with the two attributes above as a combined primary key,
-    with the data field holding all roles for that combination.  The data
-    field is a list of dicts.  For regular role assignments each dict in
-    the list of of the form:
 
-    {'id': role_id}
+class RoleAssignment(sql.ModelBase, sql.DictBase):
+    """A single role granted to a user or group on a project or domain.
 
-    If the OS-INHERIT extension is enabled and the role on a domain is an
-    inherited role, the dict will be of the form:
-
-    {'id': role_id, 'inherited_to': 'projects'}
+    The type says whether the actor is a user or a group, and whether the
+    target is a project or a domain. If the OS-INHERIT extension is enabled,
+    a role on a domain may be marked as inherited to the domain's projects.
 
     """
-    def to_dict(self):
-        """Override parent to_dict() method with a simpler implementation.
-
-        Grant tables don't have non-indexed 'extra' attributes, so the
-        parent implementation is not applicable.
-        """
-        return dict(self.iteritems())
-
-
-class UserProjectGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'user_project_metadata'
-    user_id = sql.Column(sql.String(64), primary_key=True)
-    project_id = sql.Column(sql.String(64), sql.ForeignKey('project.id'),
-                            primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class UserDomainGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'user_domain_metadata'
-    user_id = sql.Column(sql.String(64), primary_key=True)
-    domain_id = sql.Column(sql.String(64), sql.ForeignKey('domain.id'),
-                           primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class GroupProjectGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'group_project_metadata'
-    group_id = sql.Column(sql.String(64), primary_key=True)
-    project_id = sql.Column(sql.String(64), sql.ForeignKey('project.id'),
-                            primary_key=True)
-    data = sql.Column(sql.JsonBlob())
-
-
-class GroupDomainGrant(sql.ModelBase, BaseGrant):
-    __tablename__ = 'group_domain_metadata'
-    group_id = sql.Column(sql.String(64), primary_key=True)
-    domain_id = sql.Column(sql.String(64), sql.ForeignKey('domain.id'),
-                           primary_key=True)
-    data = sql.Column(sql.JsonBlob())
+    __tablename__ = 'assignment'
+    attributes = ['type', 'actor_id', 'target_id', 'role_id', 'inherited']
+    type = sql.Column(
+        sql.Enum(AssignmentType.USER_PROJECT, AssignmentType.GROUP_PROJECT,
+                 AssignmentType.USER_DOMAIN, AssignmentType.GROUP_DOMAIN,
+                 name='type'),
+        nullable=False)
+    actor_id = sql.Column(sql.String(64), nullable=False)
+    target_id = sql.Column(sql.String(64), nullable=False)
+    role_id = sql.Column(sql.String(64), sql.ForeignKey('role.id'),
+                         nullable=False)
+    inherited = sql.Column(sql.Boolean, default=False, nullable=False)
+    __table_args__ = (
+        sql.PrimaryKeyConstraint('type', 'actor_id', 'target_id', 'role_id',
+                                 'inherited'),
+        sql.Index('ix_assignment_actor_id_target_id', 'actor_id',
+                  'target_id'),
+        sql.Index('ix_assignment_target_id', 'target_id'),
+        sql.Index('ix_assignment_role_id', 'role_id'),
+        {})
+
+    @classmethod
+    def from_grant(cls, role_id, user_id=None, group_id=None, domain_id=None,
+                   project_id=None, inherited_to_projects=False):
+        if user_id:
+            if project_id:
+                assignment_type = AssignmentType.USER_PROJECT
+            else:
+                assignment_type = AssignmentType.USER_DOMAIN
+        else:
+            if project_id:
+                assignment_type = AssignmentType.GROUP_PROJECT
+            else:
+                assignment_type = AssignmentType.GROUP_DOMAIN
+        return cls(type=assignment_type,
+                   actor_id=user_id or group_id,
+                   target_id=project_id or domain_id,
+                   role_id=role_id,
+                   inherited=bool(inherited_to_projects))
+
+    def to_assignment_dict(self):
+        """Return the assignment as listed by list_role_assignments()."""
+        if self.type in AssignmentType.USER:
+            assignment = {'user_id': self.actor_id}
+        else:
+            assignment = {'group_id': self.actor_id}
+        if self.type in AssignmentType.PROJECT:
+            assignment['project_id'] = self.target_id
+        else:
+            assignment['domain_id'] = self.target_id
+        assignment['role_id'] = self.role_id
+        if self.inherited:
+            assignment['inherited_to_projects'] = True
+        return assignment
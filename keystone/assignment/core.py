@@ -16,6 +16,7 @@
 
 """Main entry point into the assignment service."""
 
+import time
 
 from keystone import clean
 from keystone.common import cache
@@ -59,6 +60,9 @@ class Manager(manager.Manager):
             assignment_driver = identity_driver.default_assignment_driver()
 
         super(Manager, self).__init__(assignment_driver)
+        # The expiry time and role refs by id of the in-process role table
+        # used by get_roles()
+        self._role_table = None
 
     @notifications.created('project')
     def create_project(self, tenant_id, tenant_ref):
@@ -106,13 +110,12 @@ class Manager(manager.Manager):
                  keystone.exception.ProjectNotFound
 
         """
-        def _get_group_project_roles(user_id, project_ref):
+        def _get_group_project_roles(group_ids, project_ref):
             role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
+            for group_id in group_ids:
                 try:
                     metadata_ref = self._get_metadata(
-                        group_id=x['id'], tenant_id=project_ref['id'])
+                        group_id=group_id, tenant_id=project_ref['id'])
                     role_list += self._roles_from_role_dicts(
                         metadata_ref.get('roles', {}), False)
                 except exception.MetadataNotFound:
@@ -123,7 +126,7 @@ class Manager(manager.Manager):
                     # Now get any inherited group roles for the owning domain
                     try:
                         metadata_ref = self._get_metadata(
-                            group_id=x['id'],
+                            group_id=group_id,
                             domain_id=project_ref['domain_id'])
                         role_list += self._roles_from_role_dicts(
                             metadata_ref.get('roles', {}), True)
@@ -156,10 +159,18 @@ class Manager(manager.Manager):
             return role_list
 
         project_ref = self.get_project(tenant_id)
-        user_role_list = _get_user_project_roles(user_id, project_ref)
-        group_role_list = _get_group_project_roles(user_id, project_ref)
+        group_ids = [x['id'] for
+                     x in self.identity_api.list_groups_for_user(user_id)]
+        try:
+            role_list = self.driver.list_role_ids_for_user_and_project(
+                user_id, group_ids, project_ref['id'],
+                project_ref['domain_id'])
+        except exception.NotImplemented:
+            # Fall back to looking up each grant on its own.
+            role_list = (_get_user_project_roles(user_id, project_ref) +
+                         _get_group_project_roles(group_ids, project_ref))
         # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        return list(set(role_list))
 
     def get_roles_for_user_and_domain(self, user_id, domain_id):
         """Get the roles associated with a user within given domain.
@@ -170,12 +181,11 @@ class Manager(manager.Manager):
 
         """
 
-        def _get_group_domain_roles(user_id, domain_id):
+        def _get_group_domain_roles(group_ids, domain_id):
             role_list = []
-            group_refs = self.identity_api.list_groups_for_user(user_id)
-            for x in group_refs:
+            for group_id in group_ids:
                 try:
-                    metadata_ref = self._get_metadata(group_id=x['id'],
+                    metadata_ref = self._get_metadata(group_id=group_id,
                                                       domain_id=domain_id)
                     role_list += self._roles_from_role_dicts(
                         metadata_ref.get('roles', {}), False)
@@ -200,10 +210,17 @@ class Manager(manager.Manager):
                 metadata_ref.get('roles', {}), False)
 
         self.get_domain(domain_id)
-        user_role_list = _get_user_domain_roles(user_id, domain_id)
-        group_role_list = _get_group_domain_roles(user_id, domain_id)
+        group_ids = [x['id'] for
+                     x in self.identity_api.list_groups_for_user(user_id)]
+        try:
+            role_list = self.driver.list_role_ids_for_user_and_domain(
+                user_id, group_ids, domain_id)
+        except exception.NotImplemented:
+            # Fall back to looking up each grant on its own.
+            role_list = (_get_user_domain_roles(user_id, domain_id) +
+                         _get_group_domain_roles(group_ids, domain_id))
         # Use set() to process the list to remove any duplicates
-        return list(set(user_role_list + group_role_list))
+        return list(set(role_list))
 
     def add_user_to_project(self, tenant_id, user_id):
         """Add user to a tenant by creating a default role relationship.
@@ -266,6 +283,7 @@ class Manager(manager.Manager):
     def get_domain_by_name(self, domain_name):
         return self.driver.get_domain_by_name(domain_name)
 
+    @notifications.created('domain')
     def create_domain(self, domain_id, domain):
         ret = self.driver.create_domain(domain_id, domain)
         if SHOULD_CACHE(ret):
@@ -273,12 +291,14 @@ class Manager(manager.Manager):
             self.get_domain_by_name.set(ret, self, ret['name'])
         return ret
 
+    @notifications.updated('domain')
     def update_domain(self, domain_id, domain):
         ret = self.driver.update_domain(domain_id, domain)
         self.get_domain.invalidate(self, domain_id)
         self.get_domain_by_name.invalidate(self, ret['name'])
         return ret
 
+    @notifications.deleted('domain')
     def delete_domain(self, domain_id):
         domain = self.driver.get_domain(domain_id)
         self.driver.delete_domain(domain_id)
@@ -300,31 +320,72 @@ class Manager(manager.Manager):
     def get_role(self, role_id):
         return self.driver.get_role(role_id)
 
+    def get_roles(self, role_ids):
+        """Get the roles of a list of role ids, in the same order.
+
+        When caching is enabled the roles are read from an in-process table
+        of all of them, which is loaded in one driver call and dropped
+        whenever a role is changed through this manager or the cache time of
+        the assignment section passes. Roles not in the table are looked up
+        in a single call to the driver, or one at a time if it does not
+        implement get_roles.
+
+        :returns: a list of role_refs
+        :raises: keystone.exception.RoleNotFound
+
+        """
+        role_ids = list(role_ids)
+        if not role_ids:
+            return []
+        if SHOULD_CACHE(None):
+            roles = self._get_role_table()
+        else:
+            roles = {}
+        missing = set(role_ids).difference(roles)
+        if missing:
+            try:
+                refs = self.driver.get_roles(list(missing))
+            except exception.NotImplemented:
+                refs = [self.get_role(role_id) for role_id in missing]
+            for ref in refs:
+                roles[ref['id']] = ref
+        try:
+            return [roles[role_id].copy() for role_id in role_ids]
+        except KeyError as e:
+            raise exception.RoleNotFound(role_id=e.args[0])
+
+    def _get_role_table(self):
+        now = time.time()
+        if self._role_table is None or now >= self._role_table[0]:
+            expiration_time = (CONF.assignment.cache_time or
+                               CONF.cache.expiration_time)
+            roles = dict((ref['id'], ref) for ref in self.driver.list_roles())
+            self._role_table = (now + expiration_time, roles)
+        return self._role_table[1]
+
+    @notifications.created('role')
     def create_role(self, role_id, role):
         ret = self.driver.create_role(role_id, role)
+        self._role_table = None
         if SHOULD_CACHE(ret):
             self.get_role.set(ret, self, role_id)
         return ret
 
+    @notifications.updated('role')
     def update_role(self, role_id, role):
         ret = self.driver.update_role(role_id, role)
+        self._role_table = None
         self.get_role.invalidate(self, role_id)
         return ret
 
+    @notifications.deleted('role')
     def delete_role(self, role_id):
         self.driver.delete_role(role_id)
+        self._role_table = None
         self.get_role.invalidate(self, role_id)
 
     def list_role_assignments_for_role(self, role_id=None):
-        # NOTE(henry-nash): Currently the efficiency of the key driver
-        # implementation (SQL) of list_role_assignments is severely hampered by
-        # the existence of the multiple grant tables - hence there is little
-        # advantage in pushing the logic of this method down into the driver.
-        # Once the single assignment table is implemented, then this situation
-        # will be different, and this method should have its own driver
-        # implementation.
-        return [r for r in self.driver.list_role_assignments()
-                if r['role_id'] == role_id]
+        return self.driver.list_role_assignments(role_id=role_id)
 
 
 class Driver(object):
@@ -400,6 +461,40 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def list_role_ids_for_user_and_project(self, user_id, group_ids,
+                                           project_id, domain_id):
+        """Lists the ids of the roles a user has on a project.
+
+        This includes the roles granted to the user or to any of its groups
+        on the project, and, if the OS-INHERIT extension is enabled, the
+        roles they were granted on the project's domain that are inherited
+        to projects. Drivers should resolve these with a constant number of
+        queries, however many groups the user is a member of.
+
+        :param user_id: the user in question
+        :param group_ids: the groups this user is a member of
+        :param project_id: the project in question
+        :param domain_id: the domain owning the project
+        :returns: a list of role ids, which may contain duplicates.
+
+        """
+        raise exception.NotImplemented()
+
+    def list_role_ids_for_user_and_domain(self, user_id, group_ids,
+                                          domain_id):
+        """Lists the ids of the roles a user has on a domain.
+
+        This includes the roles granted to the user or to any of its groups
+        on the domain, but not those inherited to the domain's projects.
+
+        :param user_id: the user in question
+        :param group_ids: the groups this user is a member of
+        :param domain_id: the domain in question
+        :returns: a list of role ids, which may contain duplicates.
+
+        """
+        raise exception.NotImplemented()
+
     # assignment/grant crud
 
     def create_grant(self, role_id, user_id=None, group_id=None,
@@ -466,10 +561,51 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_role_assignments(self):
+    def list_role_assignments(self, role_id=None, user_id=None,
+                              group_ids=None, project_id=None,
+                              domain_id=None, inherited_to_projects=None):
+        """Lists role assignments, optionally filtered.
 
+        Every filter that is given must match. Passing group_ids selects
+        the assignments of those groups as well as those of user_id, so an
+        empty list with no user_id matches nothing. project_id and
+        domain_id only match assignments on that kind of target.
+
+        :returns: a list of assignment dicts, each with a role_id, a
+                  user_id or group_id, a project_id or domain_id and,
+                  for inherited assignments, inherited_to_projects.
+
+        """
         raise exception.NotImplemented()
 
+    def _filter_role_assignments(self, assignments, role_id=None,
+                                 user_id=None, group_ids=None,
+                                 project_id=None, domain_id=None,
+                                 inherited_to_projects=None):
+        """Apply the list_role_assignments() filters in Python.
+
+        For drivers that cannot filter assignments in their backend.
+
+        """
+        def matches(ref):
+            if role_id and ref['role_id'] != role_id:
+                return False
+            if user_id or group_ids is not None:
+                if not ((user_id and ref.get('user_id') == user_id) or
+                        ref.get('group_id') in (group_ids or [])):
+                    return False
+            if project_id and ref.get('project_id') != project_id:
+                return False
+            if domain_id and ref.get('domain_id') != domain_id:
+                return False
+            if (inherited_to_projects is not None and
+                    bool(ref.get('inherited_to_projects')) !=
+                    inherited_to_projects):
+                return False
+            return True
+
+        return [ref for ref in assignments if matches(ref)]
+
     # domain crud
     def create_domain(self, domain_id, domain):
         """Creates a new domain.
@@ -606,6 +742,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_roles(self, role_ids):
+        """Get the roles of a list of role ids at once.
+
+        :returns: a list of role_refs, in no particular order, for those of
+                  the ids that exist.
+
+        """
+        raise exception.NotImplemented()
+
     def update_role(self, role_id, role):
         """Updates an existing role.
 
@@ -51,9 +51,22 @@ class Endpoint(sql.ModelBase, sql.DictBase):
 
 
 class Catalog(sql.Base, catalog.Driver):
+    def __init__(self):
+        super(Catalog, self).__init__()
+        self._url_templates = {}
+
     def db_sync(self, version=None):
         migration.db_sync(version=version)
 
+    def _get_url_template(self, url):
+        """Return url compiled, binding the configuration values once."""
+        try:
+            return self._url_templates[url]
+        except KeyError:
+            template = core.compile_url(url)
+            self._url_templates[url] = template
+            return template
+
     # Services
     def list_services(self):
         session = self.get_session()
@@ -147,9 +160,7 @@ class Catalog(sql.Base, catalog.Driver):
         return ref.to_dict()
 
     def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        d = {'tenant_id': tenant_id, 'user_id': user_id}
 
         session = self.get_session()
         endpoints = (session.query(Endpoint).
@@ -168,16 +179,14 @@ class Catalog(sql.Base, catalog.Driver):
             }
             catalog.setdefault(region, {})
             catalog[region].setdefault(service_type, default_service)
-            url = core.format_url(endpoint['url'], d)
+            url = self._get_url_template(endpoint['url']).render(d)
             interface_url = '%sURL' % endpoint['interface']
             catalog[region][service_type][interface_url] = url
 
         return catalog
 
     def get_v3_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        d = {'tenant_id': tenant_id, 'user_id': user_id}
 
         session = self.get_session()
         services = (session.query(Service).
@@ -186,7 +195,8 @@ class Catalog(sql.Base, catalog.Driver):
 
         def make_v3_endpoint(endpoint):
             del endpoint['service_id']
-            endpoint['url'] = core.format_url(endpoint['url'], d)
+            url_template = self._get_url_template(endpoint['url'])
+            endpoint['url'] = url_template.render(d)
             return endpoint
 
         catalog = [{'endpoints': [make_v3_endpoint(ep.to_dict())
@@ -106,17 +106,32 @@ class TemplatedCatalog(kvs.Catalog):
             LOG.critical(_('Unable to open template file %s') % template_file)
             raise
 
-    def get_catalog(self, user_id, tenant_id, metadata=None):
+    @property
+    def templates(self):
+        return self._templates
+
+    @templates.setter
+    def templates(self, templates):
+        # The templates are compiled as they are loaded, binding the
+        # configuration values once rather than on every request.
         d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
+        self._templates = templates
+        self._compiled = dict(
+            (region, dict(
+                (service, dict((k, core.compile_url(v, d))
+                               for k, v in service_ref.iteritems()))
+                for service, service_ref in region_ref.iteritems()))
+            for region, region_ref in templates.iteritems())
+
+    def get_catalog(self, user_id, tenant_id, metadata=None):
+        d = {'tenant_id': tenant_id, 'user_id': user_id}
 
         o = {}
-        for region, region_ref in self.templates.iteritems():
-            o[region] = {}
+        for region, region_ref in self._compiled.iteritems():
+            o[region] = region_o = {}
             for service, service_ref in region_ref.iteritems():
-                o[region][service] = {}
+                region_o[service] = service_o = {}
                 for k, v in service_ref.iteritems():
-                    o[region][service][k] = core.format_url(v, d)
+                    service_o[k] = v.render(d)
 
         return o
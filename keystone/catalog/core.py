@@ -17,6 +17,10 @@
 
 """Main entry point into the Catalog service."""
 
+import re
+import uuid
+
+from keystone.common import cache
 from keystone.common import dependency
 from keystone.common import manager
 from keystone import config
@@ -26,6 +30,7 @@ from keystone.openstack.common import log as logging
 
 CONF = config.CONF
 LOG = logging.getLogger(__name__)
+SHOULD_CACHE = cache.should_cache_fn('catalog')
 
 
 def format_url(url, data):
@@ -52,6 +57,90 @@ def format_url(url, data):
     return result
 
 
+# The variables that are only known when a catalog is requested, every other
+# variable of an endpoint URL is bound to its configuration value.
+REQUEST_VARIABLES = ('tenant_id', 'user_id')
+
+_URL_PART = re.compile(r'%\((\w+)\)([#0 +-]*\d*(?:\.\d+)?[diouxXeEfFgGcrs])'
+                       r'|%%')
+
+
+class UrlTemplate(object):
+    """An endpoint URL compiled once for rendering on every request.
+
+    Configuration values are bound at compile time, leaving a format string
+    of the request variables alone, or just a string if the URL has none. A
+    URL that does not compile, such as a malformed one, is left to
+    format_url() when rendered, which reports the error then.
+
+    """
+
+    def __init__(self, url, data):
+        """Compile url, binding any variable except the request ones.
+
+        :param data: the configuration values, as a dict.
+
+        """
+        self.url = url
+        self.variables = frozenset()
+        self._data = None
+        self._format = None
+        self._constant = None
+        try:
+            template = url.replace('$(', '%(')
+        except AttributeError:
+            return
+        self.variables = frozenset(re.findall(r'%\((\w+)\)', template))
+        try:
+            self._format = self._compile(template, data)
+        except (KeyError, TypeError, ValueError):
+            self._data = data
+            return
+        if not self.variables.intersection(REQUEST_VARIABLES):
+            self._constant = self._format % {}
+
+    @staticmethod
+    def _compile(template, data):
+        parts = []
+        position = 0
+        for match in _URL_PART.finditer(template):
+            literal = template[position:match.start()]
+            if '%' in literal:
+                raise ValueError(template)
+            parts.append(literal)
+            name, spec = match.groups()
+            if name is None or name in REQUEST_VARIABLES:
+                parts.append(match.group(0))
+            else:
+                value = ('%' + spec) % data[name]
+                parts.append(value.replace('%', '%%'))
+            position = match.end()
+        literal = template[position:]
+        if '%' in literal:
+            raise ValueError(template)
+        parts.append(literal)
+        return ''.join(parts)
+
+    def render(self, data):
+        """Return the URL for the request variables in data."""
+        if self._constant is not None:
+            return self._constant
+        if self._format is not None:
+            return self._format % data
+        if self._data is None:
+            return None
+        values = dict(self._data)
+        values.update(data)
+        return format_url(self.url, values)
+
+
+def compile_url(url, data=None):
+    """Compile url into a UrlTemplate, binding the configuration values."""
+    if data is None:
+        data = dict(CONF.iteritems())
+    return UrlTemplate(url, data)
+
+
 @dependency.provider('catalog_api')
 class Manager(manager.Manager):
     """Default pivot point for the Catalog backend.
@@ -63,6 +152,13 @@ class Manager(manager.Manager):
 
     def __init__(self):
         super(Manager, self).__init__(CONF.catalog.driver)
+        self._catalog_lookups = 0
+        self._catalog_misses = 0
+
+    def create_service(self, service_id, service_ref):
+        ret = self.driver.create_service(service_id, service_ref)
+        self.invalidate_catalog()
+        return ret
 
     def get_service(self, service_id):
         try:
@@ -70,24 +166,40 @@ class Manager(manager.Manager):
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
 
+    def update_service(self, service_id, service_ref):
+        ret = self.driver.update_service(service_id, service_ref)
+        self.invalidate_catalog()
+        return ret
+
     def delete_service(self, service_id):
         try:
-            return self.driver.delete_service(service_id)
+            ret = self.driver.delete_service(service_id)
         except exception.NotFound:
             raise exception.ServiceNotFound(service_id=service_id)
+        self.invalidate_catalog()
+        return ret
 
     def create_endpoint(self, endpoint_id, endpoint_ref):
         try:
-            return self.driver.create_endpoint(endpoint_id, endpoint_ref)
+            ret = self.driver.create_endpoint(endpoint_id, endpoint_ref)
         except exception.NotFound:
             service_id = endpoint_ref.get('service_id')
             raise exception.ServiceNotFound(service_id=service_id)
+        self.invalidate_catalog()
+        return ret
+
+    def update_endpoint(self, endpoint_id, endpoint_ref):
+        ret = self.driver.update_endpoint(endpoint_id, endpoint_ref)
+        self.invalidate_catalog()
+        return ret
 
     def delete_endpoint(self, endpoint_id):
         try:
-            return self.driver.delete_endpoint(endpoint_id)
+            ret = self.driver.delete_endpoint(endpoint_id)
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
+        self.invalidate_catalog()
+        return ret
 
     def get_endpoint(self, endpoint_id):
         try:
@@ -95,12 +207,59 @@ class Manager(manager.Manager):
         except exception.NotFound:
             raise exception.EndpointNotFound(endpoint_id=endpoint_id)
 
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.catalog.cache_time)
+    def get_catalog_version(self):
+        """Return the current version of the catalog.
+
+        Rendered catalogs are cached under the version they were rendered
+        from, so changing the version retires all of them at once, in every
+        process sharing the cache backend.
+
+        """
+        return uuid.uuid4().hex
+
+    def invalidate_catalog(self):
+        """Retire every cached catalog, following a change to the catalog."""
+        self.get_catalog_version.invalidate(self)
+
     def get_catalog(self, user_id, tenant_id, metadata=None):
+        # NOTE: metadata is not passed to the driver, none of the catalog
+        # drivers use it and it would make for a poor cache key.
+        self._catalog_lookups += 1
         try:
-            return self.driver.get_catalog(user_id, tenant_id, metadata)
+            return self._get_catalog(self.get_catalog_version(),
+                                     user_id, tenant_id)
         except exception.NotFound:
             raise exception.NotFound('Catalog not found for user and tenant')
 
+    def get_v3_catalog(self, user_id, tenant_id, metadata=None):
+        self._catalog_lookups += 1
+        return self._get_v3_catalog(self.get_catalog_version(),
+                                    user_id, tenant_id)
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.catalog.cache_time)
+    def _get_catalog(self, version, user_id, tenant_id):
+        self._catalog_misses += 1
+        return self.driver.get_catalog(user_id, tenant_id)
+
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.catalog.cache_time)
+    def _get_v3_catalog(self, version, user_id, tenant_id):
+        self._catalog_misses += 1
+        return self.driver.get_v3_catalog(user_id, tenant_id)
+
+    def get_catalog_cache_stats(self):
+        """Return the catalog cache hits and misses of this process.
+
+        Lookups that fail, or that happen with caching disabled, are
+        counted as misses.
+
+        """
+        return {'hits': self._catalog_lookups - self._catalog_misses,
+                'misses': self._catalog_misses}
+
 
 class Driver(object):
     """Interface description for an Catalog driver."""
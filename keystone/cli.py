@@ -17,6 +17,7 @@
 from __future__ import absolute_import
 
 import os
+import time
 
 from migrate import exceptions
 
@@ -182,10 +183,51 @@ class TokenFlush(BaseApp):
 
     name = 'token_flush'
 
+    @classmethod
+    def add_argument_parser(cls, subparsers):
+        parser = super(TokenFlush, cls).add_argument_parser(subparsers)
+        parser.add_argument('--batch-size', default=None, type=int,
+                            help=('Delete the expired tokens in batches of '
+                                  'this many tokens, committing each batch '
+                                  'on its own. If not provided, all expired '
+                                  'tokens are deleted at once.'))
+        parser.add_argument('--sleep', default=0, type=float,
+                            help='Seconds to wait between two batches.')
+        parser.add_argument('--max-runtime', default=None, type=float,
+                            help=('Stop starting new batches after this many '
+                                  'seconds. The remaining expired tokens are '
+                                  'left for the next run.'))
+        return parser
+
     @classmethod
     def main(cls):
         token_manager = token.Manager()
-        token_manager.driver.flush_expired_tokens()
+        batch_size = CONF.command.batch_size
+        if not batch_size:
+            token_manager.driver.flush_expired_tokens()
+            return
+
+        max_runtime = CONF.command.max_runtime
+        start = time.time()
+        total = 0
+        while True:
+            batch_start = time.time()
+            count = token_manager.driver.flush_expired_tokens_batch(
+                batch_size)
+            now = time.time()
+            total += count
+            print(_('Deleted %(count)d expired tokens (%(rate).1f tokens/s), '
+                    '%(total)d in total') %
+                  {'count': count,
+                   'rate': count / max(now - batch_start, 1e-6),
+                   'total': total})
+            if count < batch_size:
+                break
+            if max_runtime is not None and now - start >= max_runtime:
+                print(_('Stopped after reaching the maximum runtime of '
+                        '%s seconds') % max_runtime)
+                break
+            time.sleep(CONF.command.sleep)
 
 
 CMDS = [
@@ -199,4 +199,26 @@ def function_key_generator(namespace, fn, to_str=key_generate_to_str):
 
 REGION = dogpile.cache.make_region(
     function_key_generator=function_key_generator)
-on_arguments = REGION.cache_on_arguments
+
+
+def on_arguments(namespace=None, **kwargs):
+    """Cache the return value of a function per set of arguments.
+
+    This is ``REGION.cache_on_arguments``. In addition the decorated function
+    has a ``key_generator`` attribute returning the cache key for a set of
+    arguments, so that the entries for many argument sets can be removed with
+    a single ``invalidate_multi`` call.
+
+    """
+    def decorator(fn):
+        decorated = REGION.cache_on_arguments(namespace=namespace,
+                                              **kwargs)(fn)
+        decorated.key_generator = REGION.function_key_generator(namespace, fn)
+        return decorated
+    return decorator
+
+
+def invalidate_multi(keys):
+    """Remove the given cache keys in a single call to the backend."""
+    if keys:
+        REGION.delete_multi(keys)
@@ -14,35 +14,385 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import hashlib
+import os
 
 from keystone.common import environment
+from keystone import config
+from keystone.openstack.common import importutils
 from keystone.openstack.common import log as logging
 
+try:
+    from cryptography.hazmat import backends as crypto_backends
+    from cryptography.hazmat.bindings.openssl import binding as crypto_binding
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives import serialization
+    from cryptography import x509
+except ImportError:
+    x509 = None
 
+
+CONF = config.CONF
 LOG = logging.getLogger(__name__)
 PKI_ANS1_PREFIX = 'MII'
 
+SUBPROCESS_ENGINE = 'keystone.common.cms.SubprocessEngine'
+
+# signing engines, keyed by (engine path, certificate, key, CA) so that the
+# certificate and key files are only loaded once per process.
+_ENGINES = {}
+
+
+class EngineUnavailable(Exception):
+    """The signing engine cannot be used in this environment."""
+    pass
+
+
+def _get_engine(signing_cert_file_name, signing_key_file_name=None,
+                ca_file_name=None):
+    """Return the configured signing engine for the given files.
+
+    Falls back to the ``openssl`` subprocess engine if the configured engine
+    cannot be loaded (for example, if its crypto library is not installed).
+
+    """
+    engine_path = CONF.signing.engine or SUBPROCESS_ENGINE
+    key = (engine_path, signing_cert_file_name, signing_key_file_name,
+           ca_file_name)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        try:
+            engine = importutils.import_object(engine_path,
+                                               signing_cert_file_name,
+                                               signing_key_file_name,
+                                               ca_file_name)
+        except EngineUnavailable as e:
+            LOG.warning(_('CMS signing engine %(engine)s is unavailable, '
+                          'falling back to openssl subprocesses: %(err)s'),
+                        {'engine': engine_path, 'err': e})
+            engine = SubprocessEngine(signing_cert_file_name,
+                                      signing_key_file_name,
+                                      ca_file_name)
+        _ENGINES[key] = engine
+    return engine
+
+
+def reset_engines():
+    """Forget all loaded engines, e.g. after the signing files change."""
+    for engine in _ENGINES.values():
+        engine.close()
+    _ENGINES.clear()
+
+
+class Engine(object):
+    """Interface description for a CMS signing engine.
+
+    An engine is bound to a signing certificate and, optionally, the
+    private key used to sign and the CA certificate used to verify. Engines
+    report failures by raising ``subprocess.CalledProcessError`` so that
+    callers do not need to care which engine is in use.
+
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name=None,
+                 ca_file_name=None):
+        self.signing_cert_file_name = signing_cert_file_name
+        self.signing_key_file_name = signing_key_file_name
+        self.ca_file_name = ca_file_name
+
+    def sign(self, text):
+        """Sign ``text``, returning a PEM formatted CMS document."""
+        raise NotImplementedError()
+
+    def verify(self, formatted):
+        """Verify a PEM formatted CMS document, returning its content."""
+        raise NotImplementedError()
+
+    def close(self):
+        """Release any resources held by the engine."""
+        pass
+
+
+class SubprocessEngine(Engine):
+    """Signs and verifies by running ``openssl cms`` for every call."""
+
+    def _verify_args(self):
+        return ["cms", "-verify",
+                "-certfile", self.signing_cert_file_name,
+                "-CAfile", self.ca_file_name,
+                "-inform", "PEM",
+                "-nosmimecap", "-nodetach",
+                "-nocerts", "-noattr"]
+
+    def _sign_args(self):
+        return ["cms", "-sign",
+                "-signer", self.signing_cert_file_name,
+                "-inkey", self.signing_key_file_name,
+                "-outform", "PEM",
+                "-nosmimecap", "-nodetach",
+                "-nocerts", "-noattr"]
+
+    def verify(self, formatted):
+        process = environment.subprocess.Popen(
+            ["openssl"] + self._verify_args(),
+            stdin=environment.subprocess.PIPE,
+            stdout=environment.subprocess.PIPE,
+            stderr=environment.subprocess.PIPE)
+        output, err = process.communicate(formatted)
+        retcode = process.poll()
+        if retcode:
+            LOG.error(_('Verify error: %s') % err)
+            raise environment.subprocess.CalledProcessError(retcode,
+                                                            "openssl",
+                                                            output=err)
+        return output
+
+    def sign(self, text):
+        process = environment.subprocess.Popen(
+            ["openssl"] + self._sign_args(),
+            stdin=environment.subprocess.PIPE,
+            stdout=environment.subprocess.PIPE,
+            stderr=environment.subprocess.PIPE)
+        output, err = process.communicate(text)
+        retcode = process.poll()
+        if retcode or "Error" in err:
+            if retcode == 3:
+                LOG.error(_("Signing error: Unable to load certificate - "
+                          "ensure you've configured PKI with "
+                          "'keystone-manage pki_setup'"))
+            else:
+                LOG.error(_('Signing error: %s') % err)
+            raise environment.subprocess.CalledProcessError(retcode,
+                                                            "openssl")
+        return output
+
+
+def _der(tag, content):
+    """Encode a DER TLV with a definite length."""
+    length = len(content)
+    if length < 0x80:
+        encoded_length = chr(length)
+    else:
+        encoded_length = ''
+        while length:
+            encoded_length = chr(length & 0xff) + encoded_length
+            length >>= 8
+        encoded_length = chr(0x80 | len(encoded_length)) + encoded_length
+    return chr(tag) + encoded_length + content
+
+
+def _der_integer(value):
+    encoded = ''
+    while True:
+        encoded = chr(value & 0xff) + encoded
+        value >>= 8
+        if not value and not ord(encoded[0]) & 0x80:
+            break
+    return _der(0x02, encoded)
+
+
+def _der_oid(dotted):
+    arcs = [int(arc) for arc in dotted.split('.')]
+    encoded = chr(arcs[0] * 40 + arcs[1])
+    for arc in arcs[2:]:
+        chunk = chr(arc & 0x7f)
+        arc >>= 7
+        while arc:
+            chunk = chr(0x80 | (arc & 0x7f)) + chunk
+            arc >>= 7
+        encoded += chunk
+    return _der(0x06, encoded)
+
+
+def _der_sequence(*items):
+    return _der(0x30, ''.join(items))
+
+
+def _der_set(*items):
+    return _der(0x31, ''.join(items))
+
+
+def _der_explicit(number, content):
+    return _der(0xa0 | number, content)
+
+
+_OID_DATA = _der_oid('1.2.840.113549.1.7.1')
+_OID_SIGNED_DATA = _der_oid('1.2.840.113549.1.7.2')
+_OID_RSA_ENCRYPTION = _der_oid('1.2.840.113549.1.1.1')
+_OID_SHA256 = _der_oid('2.16.840.1.101.3.4.2.1')
+_DER_NULL = '\x05\x00'
+
+
+def _canonicalize_text(text):
+    """Convert line endings to CRLF, as ``openssl cms`` does for text."""
+    lines = text.split('\n')
+    canonical = [line.rstrip('\r') + '\r\n' for line in lines[:-1]]
+    canonical.append(lines[-1].rstrip('\r'))
+    return ''.join(canonical)
+
+
+def _pem(der, label):
+    encoded = base64.b64encode(der)
+    lines = [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+    return ('-----BEGIN %(label)s-----\n%(body)s\n-----END %(label)s-----\n'
+            % {'label': label, 'body': '\n'.join(lines)})
+
+
+def _unpem(formatted):
+    lines = [line.strip() for line in formatted.strip().splitlines()]
+    return base64.b64decode(''.join(lines[1:-1]))
+
+
+class CryptographyEngine(Engine):
+    """Signs and verifies in-process using the ``cryptography`` library.
+
+    The certificate and key are loaded once when the engine is created.
+    Signed documents are byte for byte identical to the output of
+    ``openssl cms -sign -nosmimecap -nodetach -nocerts -noattr`` with the
+    default SHA-256 digest. Verification uses the OpenSSL bindings shipped
+    with ``cryptography``, so certificate chains are checked exactly as
+    ``openssl cms -verify`` would check them.
+
+    Only RSA signing keys are supported.
+
+    """
+
+    def __init__(self, signing_cert_file_name, signing_key_file_name=None,
+                 ca_file_name=None):
+        if x509 is None:
+            raise EngineUnavailable(_('cryptography is not installed'))
+        super(CryptographyEngine, self).__init__(signing_cert_file_name,
+                                                 signing_key_file_name,
+                                                 ca_file_name)
+        self._backend = crypto_backends.default_backend()
+        binding = crypto_binding.Binding()
+        self._lib = binding.lib
+        self._ffi = binding.ffi
+
+        try:
+            with open(signing_cert_file_name, 'rb') as f:
+                cert_pem = f.read()
+            key_pem = None
+            if signing_key_file_name:
+                with open(signing_key_file_name, 'rb') as f:
+                    key_pem = f.read()
+        except IOError as e:
+            # The engine is not cached when this is raised, so the files
+            # are picked up once they have been created.
+            LOG.error(_("Signing error: Unable to load certificate - "
+                      "ensure you've configured PKI with "
+                      "'keystone-manage pki_setup'"))
+            raise environment.subprocess.CalledProcessError(3, 'cms',
+                                                            output=str(e))
+
+        cert = x509.load_pem_x509_certificate(cert_pem, self._backend)
+        self._signer_identifier = _der_sequence(
+            cert.issuer.public_bytes(self._backend),
+            _der_integer(cert.serial_number))
+        self._cert = self._load_x509(cert_pem)
+
+        self._key = None
+        if key_pem is not None:
+            self._key = serialization.load_pem_private_key(key_pem, None,
+                                                           self._backend)
+            if not isinstance(self._key, rsa.RSAPrivateKey):
+                raise EngineUnavailable(_('only RSA signing keys are '
+                                          'supported'))
+
+        self._store = None
+        if ca_file_name:
+            self._store = self._ffi.gc(self._lib.X509_STORE_new(),
+                                       self._lib.X509_STORE_free)
+            if not self._lib.X509_STORE_load_locations(self._store,
+                                                       ca_file_name,
+                                                       self._ffi.NULL):
+                self._lib.ERR_clear_error()
+                raise EngineUnavailable(_('unable to load CA certificates '
+                                          'from %s') % ca_file_name)
+
+    def _load_x509(self, pem):
+        bio = self._ffi.gc(self._lib.BIO_new_mem_buf(pem, len(pem)),
+                           self._lib.BIO_free)
+        cert = self._lib.PEM_read_bio_X509(bio, self._ffi.NULL,
+                                           self._ffi.NULL, self._ffi.NULL)
+        if cert == self._ffi.NULL:
+            self._lib.ERR_clear_error()
+            raise EngineUnavailable(_('unable to load certificate from %s')
+                                    % self.signing_cert_file_name)
+        return self._ffi.gc(cert, self._lib.X509_free)
+
+    def sign(self, text):
+        if self._key is None:
+            LOG.error(_('Signing error: no signing key configured'))
+            raise environment.subprocess.CalledProcessError(1, 'cms -sign')
+
+        content = _canonicalize_text(text)
+        try:
+            signature = self._key.sign(content, padding.PKCS1v15(),
+                                       hashes.SHA256())
+        except Exception as e:
+            LOG.error(_('Signing error: %s') % e)
+            raise environment.subprocess.CalledProcessError(1, 'cms -sign')
+
+        digest_algorithm = _der_sequence(_OID_SHA256)
+        signer_info = _der_sequence(
+            _der_integer(1),
+            self._signer_identifier,
+            digest_algorithm,
+            _der_sequence(_OID_RSA_ENCRYPTION, _DER_NULL),
+            _der(0x04, signature))
+        signed_data = _der_sequence(
+            _der_integer(1),
+            _der_set(digest_algorithm),
+            _der_sequence(_OID_DATA, _der_explicit(0, _der(0x04, content))),
+            _der_set(signer_info))
+        content_info = _der_sequence(_OID_SIGNED_DATA,
+                                     _der_explicit(0, signed_data))
+        return _pem(content_info, 'CMS')
+
+    def verify(self, formatted):
+        lib, ffi = self._lib, self._ffi
+        try:
+            der = _unpem(formatted)
+        except (TypeError, ValueError) as e:
+            LOG.error(_('Verify error: %s') % e)
+            raise environment.subprocess.CalledProcessError(1, 'cms -verify')
+
+        in_bio = ffi.gc(lib.BIO_new_mem_buf(der, len(der)), lib.BIO_free)
+        p7 = lib.d2i_PKCS7_bio(in_bio, ffi.NULL)
+        if p7 == ffi.NULL:
+            lib.ERR_clear_error()
+            LOG.error(_('Verify error: unable to parse CMS document'))
+            raise environment.subprocess.CalledProcessError(1, 'cms -verify')
+        p7 = ffi.gc(p7, lib.PKCS7_free)
+
+        certs = ffi.gc(lib.sk_X509_new_null(), lib.sk_X509_free)
+        lib.sk_X509_push(certs, self._cert)
+        store = self._store if self._store is not None else ffi.NULL
+        flags = 0 if self._store is not None else lib.PKCS7_NOVERIFY
+        out_bio = ffi.gc(lib.BIO_new(lib.BIO_s_mem()), lib.BIO_free)
+        if lib.PKCS7_verify(p7, certs, store, ffi.NULL, out_bio, flags) != 1:
+            error = lib.ERR_get_error()
+            lib.ERR_clear_error()
+            buf = ffi.new('char[]', 256)
+            lib.ERR_error_string_n(error, buf, len(buf))
+            err = ffi.string(buf)
+            LOG.error(_('Verify error: %s') % err)
+            raise environment.subprocess.CalledProcessError(1, 'cms -verify',
+                                                            output=err)
+
+        data = ffi.new('char **')
+        length = lib.BIO_get_mem_data(out_bio, data)
+        return ffi.buffer(data[0], length)[:]
+
 
 def cms_verify(formatted, signing_cert_file_name, ca_file_name):
     """Verifies the signature of the contents IAW CMS syntax."""
-    process = environment.subprocess.Popen(["openssl", "cms", "-verify",
-                                            "-certfile",
-                                            signing_cert_file_name,
-                                            "-CAfile", ca_file_name,
-                                            "-inform", "PEM",
-                                            "-nosmimecap", "-nodetach",
-                                            "-nocerts", "-noattr"],
-                                           stdin=environment.subprocess.PIPE,
-                                           stdout=environment.subprocess.PIPE,
-                                           stderr=environment.subprocess.PIPE)
-    output, err = process.communicate(formatted)
-    retcode = process.poll()
-    if retcode:
-        LOG.error(_('Verify error: %s') % err)
-        raise environment.subprocess.CalledProcessError(retcode,
-                                                        "openssl", output=err)
-    return output
+    engine = _get_engine(signing_cert_file_name, ca_file_name=ca_file_name)
+    return engine.verify(formatted)
 
 
 def token_to_cms(signed_text):
@@ -118,26 +468,8 @@ def cms_sign_text(text, signing_cert_file_name, signing_key_file_name):
     Produces a Base64 encoding of a DER formatted CMS Document
     http://en.wikipedia.org/wiki/Cryptographic_Message_Syntax
     """
-    process = environment.subprocess.Popen(["openssl", "cms", "-sign",
-                                            "-signer", signing_cert_file_name,
-                                            "-inkey", signing_key_file_name,
-                                            "-outform", "PEM",
-                                            "-nosmimecap", "-nodetach",
-                                            "-nocerts", "-noattr"],
-                                           stdin=environment.subprocess.PIPE,
-                                           stdout=environment.subprocess.PIPE,
-                                           stderr=environment.subprocess.PIPE)
-    output, err = process.communicate(text)
-    retcode = process.poll()
-    if retcode or "Error" in err:
-        if retcode == 3:
-            LOG.error(_("Signing error: Unable to load certificate - "
-                      "ensure you've configured PKI with "
-                      "'keystone-manage pki_setup'"))
-        else:
-            LOG.error(_('Signing error: %s') % err)
-        raise environment.subprocess.CalledProcessError(retcode, "openssl")
-    return output
+    engine = _get_engine(signing_cert_file_name, signing_key_file_name)
+    return engine.sign(text)
 
 
 def cms_sign_token(text, signing_cert_file_name, signing_key_file_name):
@@ -55,7 +55,9 @@ FILE_OPTIONS = {
         cfg.StrOpt('driver',
                    default=('keystone.identity.backends'
                             '.sql.Identity')),
-        cfg.IntOpt('max_password_length', default=4096)],
+        cfg.IntOpt('max_password_length', default=4096),
+        cfg.IntOpt('password_hash_workers', default=0),
+        cfg.StrOpt('password_hash_pool', default='process')],
     'trust': [
         cfg.BoolOpt('enabled', default=True),
         cfg.StrOpt('driver',
@@ -71,7 +73,10 @@ FILE_OPTIONS = {
                    default='keystone.token.backends.sql.Token'),
         cfg.BoolOpt('caching', default=True),
         cfg.IntOpt('revocation_cache_time', default=3600),
-        cfg.IntOpt('cache_time', default=None)],
+        cfg.IntOpt('cache_time', default=None),
+        cfg.IntOpt('expiry_bucket_size', default=3600),
+        cfg.IntOpt('token_data_cache_size', default=1000),
+        cfg.IntOpt('token_data_cache_time', default=60)],
     'cache': [
         cfg.StrOpt('config_prefix', default='cache.keystone'),
         cfg.IntOpt('expiration_time', default=600),
@@ -108,6 +113,8 @@ FILE_OPTIONS = {
                    default='/C=US/ST=Unset/L=Unset/O=Unset/CN=localhost')],
     'signing': [
         cfg.StrOpt('token_format', default=None),
+        cfg.StrOpt('engine',
+                   default='keystone.common.cms.CryptographyEngine'),
         cfg.StrOpt('certfile',
                    default="/etc/keystone/ssl/certs/signing_cert.pem"),
         cfg.StrOpt('keyfile',
@@ -143,7 +150,8 @@ FILE_OPTIONS = {
         cfg.IntOpt('access_token_duration', default=86400)],
     'policy': [
         cfg.StrOpt('driver',
-                   default='keystone.policy.backends.sql.Policy')],
+                   default='keystone.policy.backends.sql.Policy'),
+        cfg.IntOpt('file_check_interval', default=5)],
     'ec2': [
         cfg.StrOpt('driver',
                    default='keystone.contrib.ec2.backends.kvs.Ec2')],
@@ -167,6 +175,17 @@ FILE_OPTIONS = {
         cfg.StrOpt('query_scope', default='one'),
         cfg.IntOpt('page_size', default=0),
         cfg.StrOpt('alias_dereferencing', default='default'),
+        cfg.BoolOpt('use_pool', default=False),
+        cfg.IntOpt('pool_size', default=10),
+        cfg.IntOpt('pool_retry_max', default=3),
+        cfg.FloatOpt('pool_retry_delay', default=0.1),
+        cfg.IntOpt('pool_connection_lifetime', default=600),
+        cfg.FloatOpt('pool_connection_timeout', default=30),
+        cfg.BoolOpt('use_auth_pool', default=False),
+        cfg.IntOpt('auth_pool_size', default=100),
+        cfg.IntOpt('auth_pool_connection_lifetime', default=60),
+        cfg.IntOpt('entry_cache_size', default=1000),
+        cfg.IntOpt('entry_cache_time', default=60),
 
         cfg.StrOpt('user_tree_dn', default=None),
         cfg.StrOpt('user_filter', default=None),
@@ -188,6 +207,7 @@ FILE_OPTIONS = {
         cfg.StrOpt('user_enabled_emulation_dn', default=None),
         cfg.ListOpt('user_additional_attribute_mapping',
                     default=None),
+        cfg.BoolOpt('user_cache_enabled', default=False),
 
         cfg.StrOpt('tenant_tree_dn', default=None),
         cfg.StrOpt('tenant_filter', default=None),
@@ -207,6 +227,7 @@ FILE_OPTIONS = {
         cfg.StrOpt('tenant_enabled_emulation_dn', default=None),
         cfg.ListOpt('tenant_additional_attribute_mapping',
                     default=None),
+        cfg.BoolOpt('tenant_cache_enabled', default=False),
 
         cfg.StrOpt('role_tree_dn', default=None),
         cfg.StrOpt('role_filter', default=None),
@@ -220,6 +241,7 @@ FILE_OPTIONS = {
         cfg.BoolOpt('role_allow_delete', default=True),
         cfg.ListOpt('role_additional_attribute_mapping',
                     default=None),
+        cfg.BoolOpt('role_cache_enabled', default=False),
 
         cfg.StrOpt('group_tree_dn', default=None),
         cfg.StrOpt('group_filter', default=None),
@@ -234,6 +256,7 @@ FILE_OPTIONS = {
         cfg.BoolOpt('group_allow_delete', default=True),
         cfg.ListOpt('group_additional_attribute_mapping',
                     default=None),
+        cfg.BoolOpt('group_cache_enabled', default=False),
 
         cfg.StrOpt('tls_cacertfile', default=None),
         cfg.StrOpt('tls_cacertdir', default=None),
@@ -261,12 +284,16 @@ FILE_OPTIONS = {
         cfg.StrOpt('config_file', default=None)],
     'memcache': [
         cfg.StrOpt('servers', default='localhost:11211'),
-        cfg.IntOpt('max_compare_and_set_retry', default=16)],
+        cfg.IntOpt('max_compare_and_set_retry', default=16),
+        cfg.IntOpt('token_index_window', default=3600),
+        cfg.IntOpt('token_index_bucket_size', default=500)],
     'catalog': [
         cfg.StrOpt('template_file',
                    default='default_catalog.templates'),
         cfg.StrOpt('driver',
-                   default='keystone.catalog.backends.sql.Catalog')]}
+                   default='keystone.catalog.backends.sql.Catalog'),
+        cfg.BoolOpt('caching', default=True),
+        cfg.IntOpt('cache_time', default=None)]}
 
 
 CONF = cfg.CONF
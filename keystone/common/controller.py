@@ -34,15 +34,12 @@ def _build_policy_check_credentials(self, action, context, kwargs):
         'action': action,
         'kwargs': ', '.join(['%s=%s' % (k, kwargs[k]) for k in kwargs])})
 
-    try:
-        token_ref = self.token_api.get_token(context['token_id'])
-    except exception.TokenNotFound:
-        LOG.warning(_('RBAC: Invalid token'))
-        raise exception.Unauthorized()
+    auth_context = wsgi.get_auth_context(context)
+    if auth_context.credentials is not None:
+        return auth_context.credentials.copy()
 
-    # NOTE(jamielennox): whilst this maybe shouldn't be within this function
-    # it would otherwise need to reload the token_ref from backing store.
-    wsgi.validate_token_bind(context, token_ref)
+    # The bind of the token is validated as it is loaded.
+    token_ref = auth_context.get_token_ref(self.token_api, context)
 
     creds = {'is_delegated_auth': False}
     if 'token_data' in token_ref and 'token' in token_ref['token_data']:
@@ -63,9 +60,7 @@ def _build_policy_check_credentials(self, action, context, kwargs):
             creds['domain_id'] = token_data['domain']['id']
 
         if 'roles' in token_data:
-            creds['roles'] = []
-            for role in token_data['roles']:
-                creds['roles'].append(role['name'])
+            creds['roles'] = auth_context.get_role_names(self.identity_api)
 
         trust = token_data.get('OS-TRUST:trust')
         if trust is None:
@@ -101,9 +96,7 @@ def _build_policy_check_credentials(self, action, context, kwargs):
             creds['project_id'] = token_ref['tenant'].get('id')
         except AttributeError:
             LOG.debug(_('RBAC: Proceeding without tenant'))
-        # NOTE(vish): this is pretty inefficient
-        creds['roles'] = [self.identity_api.get_role(role)['name']
-                          for role in creds.get('roles', [])]
+        creds['roles'] = auth_context.get_role_names(self.identity_api)
         trust = token_ref.get('trust')
         if trust is None:
             creds['trust_id'] = None
@@ -115,7 +108,8 @@ def _build_policy_check_credentials(self, action, context, kwargs):
             creds['trustee_id'] = trust.get('trustee_id')
             creds['is_delegated_auth'] = True
 
-    return creds
+    auth_context.credentials = creds
+    return creds.copy()
 
 
 def flatten(d, parent_key=''):
@@ -176,8 +170,9 @@ def protected(callback=None):
                         policy_dict['target'] = {self.member_name: ref}
 
                 if context.get('subject_token_id') is not None:
-                    token_ref = self.token_api.get_token(
-                        context['subject_token_id'])
+                    auth_context = wsgi.get_auth_context(context)
+                    token_ref = auth_context.get_subject_token_ref(
+                        self.token_api)
                     policy_dict.setdefault('target', {})
                     policy_dict['target'].setdefault(self.member_name, {})
                     policy_dict['target'][self.member_name]['user_id'] = (
@@ -464,18 +459,10 @@ class V3Controller(V2Controller):
         if context['is_admin']:
             return DEFAULT_DOMAIN_ID
 
-        # Fish the domain_id out of the token
-        #
-        # We could make this more efficient by loading the domain_id
-        # into the context in the wrapper function above (since
-        # this version of normalize_domain will only be called inside
-        # a v3 protected call).  However, this optimization is probably not
-        # worth the duplication of state
-        try:
-            token_ref = self.token_api.get_token(context['token_id'])
-        except exception.TokenNotFound:
-            LOG.warning(_('Invalid token in _get_domain_id_for_request'))
-            raise exception.Unauthorized()
+        # Fish the domain_id out of the token, which the protected wrapper
+        # this is called within has already loaded into the auth context.
+        auth_context = wsgi.get_auth_context(context)
+        token_ref = auth_context.get_token_ref(self.token_api, context)
 
         if 'domain' in token_ref:
             return token_ref['domain']['id']
@@ -24,13 +24,16 @@ CONF = config.CONF
 LOG = logging.getLogger(__name__)
 
 
-__all__ = ['Server', 'httplib', 'subprocess']
+__all__ = ['Server', 'httplib', 'queue', 'subprocess', 'execute']
 
 _configured = False
 
 Server = None
 httplib = None
+queue = None
 subprocess = None
+# Calls a function in a native thread, only blocking the calling greenthread
+execute = None
 
 
 def configure_once(name):
@@ -60,7 +63,7 @@ def configure_once(name):
 
 @configure_once('eventlet')
 def use_eventlet(monkeypatch_thread=None):
-    global httplib, subprocess, Server
+    global httplib, queue, subprocess, execute, Server
 
     # This must be set before the initial import of eventlet because if
     # dnspython is present in your environment then eventlet monkeypatches
@@ -70,6 +73,8 @@ def use_eventlet(monkeypatch_thread=None):
     import eventlet
     from eventlet.green import httplib as _httplib
     from eventlet.green import subprocess as _subprocess
+    from eventlet import queue as _queue
+    from eventlet import tpool as _tpool
     from keystone.common.environment import eventlet_server
 
     if monkeypatch_thread is None:
@@ -89,15 +94,25 @@ def use_eventlet(monkeypatch_thread=None):
 
     Server = eventlet_server.Server
     httplib = _httplib
+    queue = _queue
     subprocess = _subprocess
+    execute = _tpool.execute
+
+
+def _execute(func, *args, **kwargs):
+    return func(*args, **kwargs)
 
 
 @configure_once('stdlib')
 def use_stdlib():
-    global httplib, subprocess
+    global httplib, queue, subprocess, execute
 
     import httplib as _httplib
+    import Queue as _queue
     import subprocess as _subprocess
 
     httplib = _httplib
+    queue = _queue
     subprocess = _subprocess
+    # requests already run in native threads
+    execute = _execute
@@ -14,12 +14,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import itertools
 import os.path
+import time
 
 import ldap
 from ldap import filter as ldap_filter
 
+from keystone.common import environment
 from keystone.common.ldap import fakeldap
+from keystone.common import utils
 from keystone import exception
 from keystone.openstack.common import log as logging
 
@@ -38,6 +42,8 @@ LDAP_DEREF = {'always': ldap.DEREF_ALWAYS,
 LDAP_TLS_CERTS = {'never': ldap.OPT_X_TLS_NEVER,
                   'demand': ldap.OPT_X_TLS_DEMAND,
                   'allow': ldap.OPT_X_TLS_ALLOW}
+# Most ids matched by the OR filter of a single search
+OR_FILTER_SIZE = 100
 
 
 def py2ldap(val):
@@ -100,6 +106,222 @@ def ldap_scope(scope):
                 'options': ', '.join(LDAP_SCOPES.keys())})
 
 
+# The caches of the kinds of objects that have caching enabled, shared by all
+# BaseLdap instances and keyed by the url, tree dn and object class they read
+_CACHES = {}
+# Tells a cache miss apart from a cached None
+_MISSING = object()
+
+# The connection pools shared by all BaseLdap instances, keyed by the url,
+# bind user and password of their connections and whether they are auth pools
+_POOLS = {}
+
+
+def get_pool_metrics():
+    """Return the metrics of each connection pool, with its url and user."""
+    metrics = []
+    for (url, user, password, auth), pool in _POOLS.items():
+        pool_metrics = pool.get_metrics()
+        pool_metrics.update(url=url, user=user, auth=auth)
+        metrics.append(pool_metrics)
+    return metrics
+
+
+class ConnectionPool(object):
+    """A bounded pool of open connections to one LDAP server.
+
+    The pool holds up to ``size`` slots, each either an idle connection or
+    an empty slot that is connected on demand, so no more than ``size``
+    connections are ever open. When all of them are checked out callers wait
+    on a queue, which only parks the calling greenthread under eventlet, for
+    up to ``timeout`` seconds. Connections older than ``lifetime`` seconds
+    are closed and replaced when they are next checked out.
+
+    """
+
+    def __init__(self, connector, size, lifetime=None, retry_max=0,
+                 retry_delay=0, timeout=None):
+        self.connector = connector
+        self.size = max(size, 1)
+        self.lifetime = lifetime
+        self.retry_max = retry_max
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        # most recently returned connections are reused first, so that empty
+        # slots are only connected when there is no idle connection left
+        self._idle = environment.queue.LifoQueue()
+        for i in range(self.size):
+            self._idle.put(None)
+        self._metrics = {'checkouts': 0,
+                         'in_use': 0,
+                         'waits': 0,
+                         'wait_time': 0.0,
+                         'connects': 0,
+                         'retired': 0,
+                         'reconnects': 0}
+
+    def get_metrics(self):
+        metrics = dict(self._metrics, size=self.size)
+        if metrics['waits']:
+            metrics['average_wait_time'] = (metrics['wait_time'] /
+                                            metrics['waits'])
+        return metrics
+
+    def connect(self):
+        conn = self.connector()
+        self._metrics['connects'] += 1
+        return conn, time.time()
+
+    def close(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def checkout(self):
+        try:
+            slot = self._idle.get(block=False)
+        except environment.queue.Empty:
+            started = time.time()
+            try:
+                slot = self._idle.get(timeout=self.timeout)
+            except environment.queue.Empty:
+                # every connection is checked out; most likely some were
+                # never returned with unbind_s
+                raise exception.UnexpectedError(
+                    _('Timed out waiting for a connection from the LDAP '
+                      'connection pool (%(size)s connections, all in use)') %
+                    {'size': self.size})
+            finally:
+                self._metrics['waits'] += 1
+                self._metrics['wait_time'] += time.time() - started
+        self._metrics['checkouts'] += 1
+        self._metrics['in_use'] += 1
+
+        if slot is not None:
+            conn, created_at = slot
+            if self.lifetime and time.time() - created_at > self.lifetime:
+                self._metrics['retired'] += 1
+                self.close(conn)
+                slot = None
+        if slot is None:
+            try:
+                slot = self.connect()
+            except Exception:
+                self.checkin(None)
+                raise
+        return PooledConnection(self, *slot)
+
+    def checkin(self, slot):
+        self._metrics['in_use'] -= 1
+        self._idle.put(slot)
+
+
+class PooledConnection(object):
+    """A connection checked out of a ConnectionPool.
+
+    Behaves like the connection it wraps, except that an operation failing
+    with SERVER_DOWN is retried on a new connection, and that unbind_s
+    returns the connection to the pool instead of closing it.
+
+    """
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(name, args, kwargs)
+        return call
+
+    def _get_conn(self):
+        if self._conn is None:
+            self._conn, self._created_at = self._pool.connect()
+        return self._conn
+
+    def _server_down(self, name, retries):
+        """Drop the connection, and wait to retry name if retries are left.
+
+        Reraises the SERVER_DOWN being handled otherwise.
+
+        """
+        if self._conn is not None:
+            self._pool.close(self._conn)
+            self._conn = None
+        if retries <= 0:
+            raise
+        self._pool._metrics['reconnects'] += 1
+        LOG.warning(_('LDAP server is down, reconnecting to retry %s'), name)
+        time.sleep(self._pool.retry_delay)
+
+    def _call(self, name, args, kwargs):
+        retries = self._pool.retry_max
+        while True:
+            try:
+                return getattr(self._get_conn(), name)(*args, **kwargs)
+            except ldap.SERVER_DOWN:
+                self._server_down(name, retries)
+                retries -= 1
+
+    def search_iter(self, *args, **kwargs):
+        # a search can only be retried until its first entry is yielded
+        retries = self._pool.retry_max
+        while True:
+            yielded = False
+            try:
+                for entry in self._get_conn().search_iter(*args, **kwargs):
+                    yielded = True
+                    yield entry
+                return
+            except ldap.SERVER_DOWN:
+                if yielded:
+                    retries = 0
+                self._server_down('search_iter', retries)
+                retries -= 1
+
+    def unbind_s(self):
+        if self._released:
+            return
+        self._released = True
+        if self._conn is None:
+            self._pool.checkin(None)
+        else:
+            self._pool.checkin((self._conn, self._created_at))
+
+
+class CacheClearingConnection(object):
+    """Clears a cache of entries whenever anything is written through conn.
+
+    Otherwise behaves like the connection it wraps.
+
+    """
+
+    WRITES = ('add_s', 'modify_s', 'delete_s', 'delete_ext_s')
+
+    def __init__(self, conn, cache):
+        self._conn = conn
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+        if name not in self.WRITES:
+            return attr
+
+        def write(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._cache.clear()
+        return write
+
+
 class BaseLdap(object):
     DEFAULT_SUFFIX = "dc=example,dc=com"
     DEFAULT_OU = None
@@ -129,7 +351,18 @@ class BaseLdap(object):
         self.tls_cacertfile = conf.ldap.tls_cacertfile
         self.tls_cacertdir = conf.ldap.tls_cacertdir
         self.tls_req_cert = parse_tls_cert(conf.ldap.tls_req_cert)
+        self.use_pool = conf.ldap.use_pool
+        self.pool_size = conf.ldap.pool_size
+        self.pool_retry_max = conf.ldap.pool_retry_max
+        self.pool_retry_delay = conf.ldap.pool_retry_delay
+        self.pool_connection_lifetime = conf.ldap.pool_connection_lifetime
+        self.pool_connection_timeout = conf.ldap.pool_connection_timeout
+        self.use_auth_pool = conf.ldap.use_auth_pool
+        self.auth_pool_size = conf.ldap.auth_pool_size
+        self.auth_pool_connection_lifetime = (
+            conf.ldap.auth_pool_connection_lifetime)
         self.attribute_mapping = {}
+        self._cache = None
 
         if self.options_name is not None:
             self.suffix = conf.ldap.suffix
@@ -176,6 +409,14 @@ class BaseLdap(object):
             attribute_ignore = '%s_attribute_ignore' % self.options_name
             self.attribute_ignore = getattr(conf.ldap, attribute_ignore)
 
+            cache_enabled = '%s_cache_enabled' % self.options_name
+            if getattr(conf.ldap, cache_enabled):
+                key = (self.LDAP_URL, self.tree_dn, self.object_class)
+                if key not in _CACHES:
+                    _CACHES[key] = utils.LRUCache(conf.ldap.entry_cache_size,
+                                                  conf.ldap.entry_cache_time)
+                self._cache = _CACHES[key]
+
         self.use_dumb_member = getattr(conf.ldap, 'use_dumb_member')
         self.dumb_member = (getattr(conf.ldap, 'dumb_member') or
                             self.DUMB_MEMBER_DN)
@@ -209,30 +450,96 @@ class BaseLdap(object):
             mapping[ldap_attr] = attr_map
         return mapping
 
-    def get_connection(self, user=None, password=None):
+    def _connect(self):
         if self.LDAP_URL.startswith('fake://'):
-            conn = fakeldap.FakeLdap(self.LDAP_URL)
+            return fakeldap.FakeLdap(self.LDAP_URL)
+        return LdapWrapper(self.LDAP_URL,
+                           self.page_size,
+                           alias_dereferencing=self.alias_dereferencing,
+                           use_tls=self.use_tls,
+                           tls_cacertfile=self.tls_cacertfile,
+                           tls_cacertdir=self.tls_cacertdir,
+                           tls_req_cert=self.tls_req_cert)
+
+    def _bind(self, conn, user, password):
+        # not all LDAP servers require authentication, so we don't bind
+        # if we don't have any user/pass
+        if user and password:
+            conn.simple_bind_s(user, password)
+        return conn
+
+    def _get_pool(self, user, password, end_user_auth):
+        key = (self.LDAP_URL, user, password, end_user_auth)
+        try:
+            return _POOLS[key]
+        except KeyError:
+            pass
+        if end_user_auth:
+            # connections of the auth pool are bound by each checkout
+            pool = ConnectionPool(self._connect,
+                                  self.auth_pool_size,
+                                  self.auth_pool_connection_lifetime,
+                                  self.pool_retry_max,
+                                  self.pool_retry_delay,
+                                  self.pool_connection_timeout)
         else:
-            conn = LdapWrapper(self.LDAP_URL,
-                               self.page_size,
-                               alias_dereferencing=self.alias_dereferencing,
-                               use_tls=self.use_tls,
-                               tls_cacertfile=self.tls_cacertfile,
-                               tls_cacertdir=self.tls_cacertdir,
-                               tls_req_cert=self.tls_req_cert)
+            pool = ConnectionPool(
+                lambda: self._bind(self._connect(), user, password),
+                self.pool_size,
+                self.pool_connection_lifetime,
+                self.pool_retry_max,
+                self.pool_retry_delay,
+                self.pool_connection_timeout)
+        return _POOLS.setdefault(key, pool)
+
+    def _cached(self, key, func, *args):
+        """Return func(*args), reading through the cache if it is enabled.
+
+        None results, which stand for objects that do not exist, are cached
+        like any other.
+
+        """
+        if self._cache is None:
+            return func(*args)
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = func(*args)
+            self._cache.set(key, value)
+        return value
+
+    def get_connection(self, user=None, password=None, end_user_auth=False):
+        """Return a connection bound as user, by default the service user.
+
+        Pass end_user_auth when binding as an end user to check their
+        password. With pooling enabled the connection comes from a pool, so
+        it must always be released with unbind_s(). Writing through the
+        connection clears the cache of this kind of object.
+
+        """
+        conn = self._get_connection(user, password, end_user_auth)
+        if self._cache is not None:
+            conn = CacheClearingConnection(conn, self._cache)
+        return conn
 
+    def _get_connection(self, user, password, end_user_auth):
         if user is None:
             user = self.LDAP_USER
 
         if password is None:
             password = self.LDAP_PASSWORD
 
-        # not all LDAP servers require authentication, so we don't bind
-        # if we don't have any user/pass
-        if user and password:
-            conn.simple_bind_s(user, password)
+        if end_user_auth and self.use_auth_pool:
+            conn = self._get_pool(None, None, True).checkout()
+            try:
+                return self._bind(conn, user, password)
+            except Exception:
+                conn.unbind_s()
+                raise
 
-        return conn
+        if self.use_pool and not end_user_auth:
+            return self._get_pool(user, password, False).checkout()
+
+        return self._bind(self._connect(), user, password)
 
     def _id_to_dn_string(self, id):
         return '%s=%s,%s' % (self.id_attr,
@@ -242,6 +549,9 @@ class BaseLdap(object):
     def _id_to_dn(self, id):
         if self.LDAP_SCOPE == ldap.SCOPE_ONELEVEL:
             return self._id_to_dn_string(id)
+        return self._cached(('dn', id), self._search_dn, id)
+
+    def _search_dn(self, id):
         conn = self.get_connection()
         try:
             search_result = conn.search_s(
@@ -307,6 +617,9 @@ class BaseLdap(object):
             action = _('LDAP %s create') % self.options_name
             raise exception.ForbiddenAction(action=action)
 
+        # under subtree scope the DN is searched for, which takes a
+        # connection of its own, so it is looked up before checking one out
+        dn = self._id_to_dn(values['id'])
         conn = self.get_connection()
         object_classes = self.structural_classes + [self.object_class]
         attrs = [('objectClass', object_classes)]
@@ -326,12 +639,15 @@ class BaseLdap(object):
         if 'groupOfNames' in object_classes and self.use_dumb_member:
             attrs.append(('member', [self.dumb_member]))
         try:
-            conn.add_s(self._id_to_dn(values['id']), attrs)
+            conn.add_s(dn, attrs)
         finally:
             conn.unbind_s()
         return values
 
     def _ldap_get(self, id, filter=None):
+        return self._cached(('get', id, filter), self._ldap_search, id, filter)
+
+    def _ldap_search(self, id, filter=None):
         conn = self.get_connection()
         query = ('(&(%(id_attr)s=%(id)s)'
                  '%(filter)s'
@@ -354,17 +670,53 @@ class BaseLdap(object):
             return None
 
     def _ldap_get_all(self, filter=None):
+        return list(self._ldap_iter_all(filter))
+
+    def _ldap_iter_all(self, filter=None):
+        # the searches are closed explicitly, so that a search stopped early
+        # is ended before its connection goes back to the pool
+        if self._cache is None:
+            search = self._ldap_search_all(filter)
+            try:
+                for entry in search:
+                    yield entry
+            finally:
+                search.close()
+            return
+
+        key = ('all', filter)
+        entries = self._cache.get(key)
+        if entries is None:
+            entries = []
+            search = self._ldap_search_all(filter)
+            try:
+                for entry in search:
+                    entries.append(entry)
+                    yield entry
+            finally:
+                search.close()
+            # only complete results are cached, not those of a search
+            # stopped early
+            self._cache.set(key, entries)
+        else:
+            for entry in entries:
+                yield entry
+
+    def _ldap_search_all(self, filter=None):
         conn = self.get_connection()
         query = '(&%s(objectClass=%s))' % (filter or self.filter or '',
                                            self.object_class)
+        entries = conn.search_iter(self.tree_dn,
+                                   self.LDAP_SCOPE,
+                                   query,
+                                   self.attribute_mapping.values())
         try:
-            return conn.search_s(self.tree_dn,
-                                 self.LDAP_SCOPE,
-                                 query,
-                                 self.attribute_mapping.values())
+            for entry in entries:
+                yield entry
         except ldap.NO_SUCH_OBJECT:
-            return []
+            return
         finally:
+            entries.close()
             conn.unbind_s()
 
     def get(self, id, filter=None):
@@ -377,15 +729,54 @@ class BaseLdap(object):
     def get_by_name(self, name, filter=None):
         query = ('(%s=%s)' % (self.attribute_mapping['name'],
                               ldap_filter.escape_filter_chars(name)))
-        res = self.get_all(query)
+        res = self.get_all(query, limit=1)
         try:
             return res[0]
         except IndexError:
             raise self._not_found(name)
 
-    def get_all(self, filter=None):
-        return [self._ldap_res_to_model(x)
-                for x in self._ldap_get_all(filter)]
+    def get_all(self, filter=None, limit=None, marker=None):
+        return list(self.iter_all(filter, limit, marker))
+
+    def iter_all(self, filter=None, limit=None, marker=None):
+        """Yield the objects matching filter as the directory returns them.
+
+        Only the objects after the one with the marker id are yielded, and
+        no more than limit of them; the search is stopped as soon as the
+        limit is reached. Objects come in the order of the directory, and an
+        unknown marker yields no objects at all.
+
+        A connection is held until the iteration ends, so nothing else should
+        be read from the directory while iterating.
+
+        """
+        entries = self._ldap_iter_all(filter)
+        try:
+            if marker is not None:
+                for dn, attrs in entries:
+                    if self._dn_to_id(dn) == marker:
+                        break
+            for entry in itertools.islice(entries, limit):
+                yield self._ldap_res_to_model(entry)
+        finally:
+            entries.close()
+
+    def get_list(self, ids):
+        """Get the objects of any of the ids with OR filtered searches.
+
+        Ids are searched for OR_FILTER_SIZE at a time, and those which do not
+        exist are skipped.
+
+        """
+        objects = []
+        for chunk in utils.chunked(set(ids), OR_FILTER_SIZE):
+            query = '(&%s(|%s))' % (
+                self.filter or '',
+                ''.join('(%s=%s)' % (self.id_attr,
+                                     ldap_filter.escape_filter_chars(str(id)))
+                        for id in chunk))
+            objects.extend(self.get_all(query))
+        return objects
 
     def update(self, id, values, old_obj=None):
         if not self.allow_update:
@@ -425,9 +816,10 @@ class BaseLdap(object):
                 modlist.append((op, self.attribute_mapping.get(k, k), [v]))
 
         if modlist:
+            dn = self._id_to_dn(id)
             conn = self.get_connection()
             try:
-                conn.modify_s(self._id_to_dn(id), modlist)
+                conn.modify_s(dn, modlist)
             except ldap.NO_SUCH_OBJECT:
                 raise self._not_found(id)
             finally:
@@ -440,22 +832,23 @@ class BaseLdap(object):
             action = _('LDAP %s delete') % self.options_name
             raise exception.ForbiddenAction(action=action)
 
+        dn = self._id_to_dn(id)
         conn = self.get_connection()
         try:
-            conn.delete_s(self._id_to_dn(id))
+            conn.delete_s(dn)
         except ldap.NO_SUCH_OBJECT:
             raise self._not_found(id)
         finally:
             conn.unbind_s()
 
     def deleteTree(self, id):
+        dn = self._id_to_dn(id)
         conn = self.get_connection()
         tree_delete_control = ldap.controls.LDAPControl(CONTROL_TREEDELETE,
                                                         0,
                                                         None)
         try:
-            conn.delete_ext_s(self._id_to_dn(id),
-                              serverctrls=[tree_delete_control])
+            conn.delete_ext_s(dn, serverctrls=[tree_delete_control])
         except ldap.NO_SUCH_OBJECT:
             raise self._not_found(id)
         finally:
@@ -552,6 +945,16 @@ class LdapWrapper(object):
         return self.conn.add_s(dn, ldap_attrs)
 
     def search_s(self, dn, scope, query, attrlist=None):
+        return list(self.search_iter(dn, scope, query, attrlist))
+
+    def search_iter(self, dn, scope, query, attrlist=None):
+        """Yield the entries found by a search as they are received.
+
+        With paging enabled only one page of entries is held at a time, and
+        the values of each entry are only converted from their LDAP form as
+        it is yielded.
+
+        """
         # NOTE(morganfainberg): Remove "None" singletons from this list, which
         # allows us to set mapped attributes to "None" as defaults in config.
         # Without this filtering, the ldap query would raise a TypeError since
@@ -566,18 +969,23 @@ class LdapWrapper(object):
                 'query': query,
                 'attrlist': attrlist})
         if self.page_size:
-            res = self.paged_search_s(dn, scope, query, attrlist)
+            res = self.paged_search_iter(dn, scope, query, attrlist)
         else:
             res = self.conn.search_s(dn, scope, query, attrlist)
 
-        o = []
-        for dn, attrs in res:
-            o.append((dn, dict((kind, [ldap2py(x) for x in values])
-                               for kind, values in attrs.iteritems())))
-        return o
+        try:
+            for dn, attrs in res:
+                yield (dn, dict((kind, [ldap2py(x) for x in values])
+                                for kind, values in attrs.iteritems()))
+        finally:
+            if hasattr(res, 'close'):
+                # ends a paged search stopped before its last page
+                res.close()
 
     def paged_search_s(self, dn, scope, query, attrlist=None):
-        res = []
+        return list(self.paged_search_iter(dn, scope, query, attrlist))
+
+    def paged_search_iter(self, dn, scope, query, attrlist=None):
         lc = ldap.controls.SimplePagedResultsControl(
             controlType=ldap.LDAP_CONTROL_PAGE_OID,
             criticality=True,
@@ -591,13 +999,23 @@ class LdapWrapper(object):
         while True:
             # Request to the ldap server a page with 'page_size' entries
             rtype, rdata, rmsgid, serverctrls = self.conn.result3(msgid)
-            # Receive the data
-            res.extend(rdata)
             pctrls = [c for c in serverctrls
                       if c.controlType == ldap.LDAP_CONTROL_PAGE_OID]
+            cookie = pctrls and pctrls[0].controlValue[1]
+            # Receive the data
+            try:
+                for entry in rdata:
+                    yield entry
+            except GeneratorExit:
+                if cookie:
+                    # The search is stopped before its last page, so let
+                    # the server drop its state, as some servers only allow
+                    # a few paged searches at a time on a connection.
+                    self._abandon_paged_search(dn, scope, query, attrlist,
+                                               lc, cookie)
+                raise
             if pctrls:
                 # LDAP server supports pagination
-                est, cookie = pctrls[0].controlValue
                 if cookie:
                     # There is more data still on the server
                     # so we request another page
@@ -616,7 +1034,19 @@ class LdapWrapper(object):
                               'avoid this message.'))
                 self._disable_paging()
                 break
-        return res
+
+    def _abandon_paged_search(self, dn, scope, query, attrlist, lc, cookie):
+        """Ask for a page of size 0, which ends the paged search."""
+        lc.controlValue = (0, cookie)
+        try:
+            msgid = self.conn.search_ext(dn,
+                                         scope,
+                                         query,
+                                         attrlist,
+                                         serverctrls=[lc])
+            self.conn.result3(msgid)
+        except ldap.LDAPError as e:
+            LOG.debug(_('LDAP paged search not ended: %s'), e)
 
     def modify_s(self, dn, modlist):
         ldap_modlist = [
@@ -675,9 +1105,13 @@ class EnabledEmuMixIn(BaseLdap):
                                          (self.options_name, self.tree_dn))
 
     def _get_enabled(self, object_id):
-        conn = self.get_connection()
+        return self._cached(('enabled', object_id),
+                            self._search_enabled, object_id)
+
+    def _search_enabled(self, object_id):
         dn = self._id_to_dn(object_id)
         query = '(member=%s)' % dn
+        conn = self.get_connection()
         try:
             enabled_value = conn.search_s(self.enabled_emulation_dn,
                                           ldap.SCOPE_BASE,
@@ -691,16 +1125,17 @@ class EnabledEmuMixIn(BaseLdap):
 
     def _add_enabled(self, object_id):
         if not self._get_enabled(object_id):
+            dn = self._id_to_dn(object_id)
             conn = self.get_connection()
             modlist = [(ldap.MOD_ADD,
                         'member',
-                        [self._id_to_dn(object_id)])]
+                        [dn])]
             try:
                 conn.modify_s(self.enabled_emulation_dn, modlist)
             except ldap.NO_SUCH_OBJECT:
                 attr_list = [('objectClass', ['groupOfNames']),
                              ('member',
-                             [self._id_to_dn(object_id)])]
+                             [dn])]
                 if self.use_dumb_member:
                     attr_list[1][1].append(self.dumb_member)
                 conn.add_s(self.enabled_emulation_dn, attr_list)
@@ -708,10 +1143,11 @@ class EnabledEmuMixIn(BaseLdap):
                 conn.unbind_s()
 
     def _remove_enabled(self, object_id):
+        dn = self._id_to_dn(object_id)
         conn = self.get_connection()
         modlist = [(ldap.MOD_DELETE,
                     'member',
-                    [self._id_to_dn(object_id)])]
+                    [dn])]
         try:
             conn.modify_s(self.enabled_emulation_dn, modlist)
         except (ldap.NO_SUCH_OBJECT, ldap.NO_SUCH_ATTRIBUTE):
@@ -737,17 +1173,27 @@ class EnabledEmuMixIn(BaseLdap):
             ref['enabled'] = self._get_enabled(object_id)
         return ref
 
-    def get_all(self, filter=None):
+    def _ldap_iter_all(self, filter=None):
+        entries = super(EnabledEmuMixIn, self)._ldap_iter_all(filter)
+        try:
+            for entry in entries:
+                if entry[0] != self.enabled_emulation_dn:
+                    yield entry
+        finally:
+            entries.close()
+
+    def iter_all(self, filter=None, limit=None, marker=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
-            # had to copy BaseLdap.get_all here to filter by DN
-            tenant_list = [self._ldap_res_to_model(x)
-                           for x in self._ldap_get_all(filter)
-                           if x[0] != self.enabled_emulation_dn]
+            # the enabled flags can only be looked up once the search is
+            # over and its connection has been released
+            tenant_list = list(super(EnabledEmuMixIn, self).iter_all(
+                filter, limit, marker))
             for tenant_ref in tenant_list:
                 tenant_ref['enabled'] = self._get_enabled(tenant_ref['id'])
-            return tenant_list
+            return iter(tenant_list)
         else:
-            return super(EnabledEmuMixIn, self).get_all(filter)
+            return super(EnabledEmuMixIn, self).iter_all(filter, limit,
+                                                         marker)
 
     def update(self, object_id, values, old_obj=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
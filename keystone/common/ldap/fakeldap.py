@@ -72,10 +72,14 @@ def _match_query(query, attrs):
     """
     # cut off the parentheses
     inner = query[1:-1]
-    if inner.startswith(('&', '|')):
-        # cut off the & or |
+    if inner.startswith('&'):
+        # cut off the &
         groups = _paren_groups(inner[1:])
         return all(_match_query(group, attrs) for group in groups)
+    if inner.startswith('|'):
+        # cut off the |
+        groups = _paren_groups(inner[1:])
+        return any(_match_query(group, attrs) for group in groups)
     if inner.startswith('!'):
         # cut off the ! and the nested parentheses
         return not _match_query(query[2:-1], attrs)
@@ -346,10 +350,16 @@ class FakeLdap(object):
             match_attrs = attrs.copy()
             match_attrs[id_attr] = [id_val]
             if not query or _match_query(query, match_attrs):
-                # filter the attributes by fields
-                attrs = dict([(k, v) for k, v in attrs.iteritems()
+                # filter the attributes by fields, copying their values as
+                # a real server's results share nothing with the directory
+                attrs = dict([(k, list(v)) for k, v in attrs.iteritems()
                               if not fields or k in fields])
                 objects.append((dn, attrs))
 
         LOG.debug('FakeLdap search result: %s', objects)
         return objects
+
+    def search_iter(self, dn, scope, query=None, fields=None):
+        """Yield the objects search_s would return."""
+        for obj in self.search_s(dn, scope, query, fields):
+            yield obj
@@ -36,6 +36,11 @@ from keystone.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
+# Most values bound into a single IN clause; longer lists are queried for
+# in chunks, to stay well within the parameter limits of the databases
+# (e.g. 999 for SQLite).
+IN_CLAUSE_SIZE = 500
+
 # maintain a single engine reference for sqlalchemy engine
 GLOBAL_ENGINE = None
 GLOBAL_ENGINE_CALLBACKS = set()
@@ -50,12 +55,18 @@ Index = sql.Index
 String = sql.String
 ForeignKey = sql.ForeignKey
 DateTime = sql.DateTime
+Integer = sql.Integer
 IntegrityError = sql.exc.IntegrityError
 OperationalError = sql.exc.OperationalError
 NotFound = sql.orm.exc.NoResultFound
 Boolean = sql.Boolean
 Text = sql.Text
+Enum = sql.Enum
 UniqueConstraint = sql.UniqueConstraint
+PrimaryKeyConstraint = sql.PrimaryKeyConstraint
+func = sql.func
+and_ = sql.and_
+or_ = sql.or_
 relationship = sql.orm.relationship
 joinedload = sql.orm.joinedload
 
@@ -0,0 +1,57 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlalchemy as sql
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    revocation_log_table = sql.Table(
+        'token_revocation_log',
+        meta,
+        sql.Column('seq', sql.Integer, primary_key=True, autoincrement=True),
+        sql.Column('token_id', sql.String(64), nullable=False),
+        sql.Column('expires', sql.DateTime(), default=None),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    revocation_log_table.create(migrate_engine, checkfirst=True)
+    idx = sql.Index('ix_token_revocation_log_expires',
+                    revocation_log_table.c.expires)
+    idx.create(migrate_engine)
+
+    sequence_table = sql.Table(
+        'token_revocation_sequence',
+        meta,
+        sql.Column('id', sql.Integer, primary_key=True, autoincrement=False),
+        sql.Column('seq', sql.Integer, nullable=False),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    sequence_table.create(migrate_engine, checkfirst=True)
+    migrate_engine.execute(sequence_table.insert(), {'id': 1, 'seq': 0})
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    sequence_table = sql.Table('token_revocation_sequence', meta,
+                               autoload=True)
+    sequence_table.drop(migrate_engine, checkfirst=True)
+    revocation_log_table = sql.Table('token_revocation_log', meta,
+                                     autoload=True)
+    revocation_log_table.drop(migrate_engine, checkfirst=True)
@@ -0,0 +1,59 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import sqlalchemy as sql
+
+from keystone.common import utils
+from keystone import config
+
+
+CONF = config.CONF
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    bucket = sql.Column('bucket', sql.DateTime(), default=None)
+    token.create_column(bucket)
+    # Fill one bucket per statement, walking ix_token_expires and skipping
+    # the empty windows, so that each update only locks the rows it sets.
+    size = CONF.token.expiry_bucket_size
+    next_expires = sql.select([sql.func.min(token.c.expires)])
+    start = migrate_engine.execute(next_expires).scalar()
+    while start is not None:
+        end = datetime.datetime.utcfromtimestamp(
+            (utils.unixtime(start) // size + 1) * size)
+        migrate_engine.execute(
+            token.update().
+            where(token.c.expires >= start).
+            where(token.c.expires < end).
+            values(bucket=end))
+        start = migrate_engine.execute(
+            next_expires.where(token.c.expires >= end)).scalar()
+    idx = sql.Index('ix_token_bucket', token.c.bucket)
+    idx.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    idx = sql.Index('ix_token_bucket', token.c.bucket)
+    idx.drop(migrate_engine)
+    token.drop_column('bucket')
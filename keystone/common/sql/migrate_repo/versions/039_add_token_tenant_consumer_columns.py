@@ -0,0 +1,97 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import sqlalchemy as sql
+
+
+# Number of tokens read into memory at a time.
+BATCH_SIZE = 1000
+
+
+def _token_batches(token_table, migrate_engine):
+    """Yield the tokens in batches, walking the primary key."""
+    last_id = None
+    while True:
+        query = sql.select([token_table.c.id, token_table.c.extra])
+        if last_id is not None:
+            query = query.where(token_table.c.id > last_id)
+        query = query.order_by(token_table.c.id).limit(BATCH_SIZE)
+        tokens = migrate_engine.execute(query).fetchall()
+        if not tokens:
+            return
+        yield tokens
+        last_id = tokens[-1].id
+
+
+def migrate_tenant_and_consumer_from_extra_json(token_table, migrate_engine):
+    for tokens in _token_batches(token_table, migrate_engine):
+        for token in tokens:
+            _migrate_token(token_table, migrate_engine, token)
+
+
+def _migrate_token(token_table, migrate_engine, token):
+    try:
+        data = json.loads(token.extra)
+    except (ValueError, TypeError):
+        # The token is broken beyond what this migration can repair, so
+        # it is left for the expiry flush to remove.
+        return
+
+    values = {}
+    tenant = data.get('tenant')
+    if tenant:
+        values['tenant_id'] = tenant.get('id')
+    try:
+        oauth = data['token_data']['token'].get('OS-OAUTH1')
+        if oauth:
+            values['consumer_id'] = oauth.get('consumer_id')
+    except (KeyError, AttributeError, TypeError):
+        pass
+
+    if values:
+        update = token_table.update().where(
+            token_table.c.id == token.id).values(values)
+        migrate_engine.execute(update)
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    token.create_column(sql.Column('tenant_id', sql.String(64)))
+    token.create_column(sql.Column('consumer_id', sql.String(64)))
+    migrate_tenant_and_consumer_from_extra_json(token, migrate_engine)
+    sql.Index('ix_token_tenant_id', token.c.tenant_id).create(migrate_engine)
+    sql.Index('ix_token_consumer_id',
+              token.c.consumer_id).create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    sql.Index('ix_token_consumer_id', token.c.consumer_id).drop(migrate_engine)
+    sql.Index('ix_token_tenant_id', token.c.tenant_id).drop(migrate_engine)
+
+    # Reflect the table again without the dropped indexes, or sqlite will try
+    # to drop them once more while it recreates the table.
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+    token = sql.Table('token', meta, autoload=True)
+    token.drop_column('consumer_id')
+    token.drop_column('tenant_id')
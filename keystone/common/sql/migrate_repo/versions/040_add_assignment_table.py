@@ -0,0 +1,171 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import sqlalchemy as sql
+
+from keystone.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Number of grants read into memory at a time.
+BATCH_SIZE = 1000
+
+# The grant tables, each with the assignment type stored for its rows and
+# the names of its actor and target columns.
+GRANT_TABLES = [
+    ('user_project_metadata', 'UserProject', 'user_id', 'project_id',
+     'project.id'),
+    ('user_domain_metadata', 'UserDomain', 'user_id', 'domain_id',
+     'domain.id'),
+    ('group_project_metadata', 'GroupProject', 'group_id', 'project_id',
+     'project.id'),
+    ('group_domain_metadata', 'GroupDomain', 'group_id', 'domain_id',
+     'domain.id'),
+]
+
+
+def _grant_batches(grant_table, actor, target, migrate_engine):
+    """Yield the grants in batches, walking the primary key."""
+    actor_column = grant_table.c[actor]
+    target_column = grant_table.c[target]
+    last = None
+    while True:
+        query = grant_table.select()
+        if last is not None:
+            query = query.where(sql.or_(
+                actor_column > last[actor],
+                sql.and_(actor_column == last[actor],
+                         target_column > last[target])))
+        query = query.order_by(actor_column, target_column).limit(BATCH_SIZE)
+        grants = migrate_engine.execute(query).fetchall()
+        if not grants:
+            return
+        yield grants
+        last = grants[-1]
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    role_table = sql.Table('role', meta, autoload=True)
+    assignment_table = sql.Table(
+        'assignment',
+        meta,
+        sql.Column('type',
+                   sql.Enum('UserProject', 'GroupProject', 'UserDomain',
+                            'GroupDomain', name='type'),
+                   nullable=False),
+        sql.Column('actor_id', sql.String(64), nullable=False),
+        sql.Column('target_id', sql.String(64), nullable=False),
+        sql.Column('role_id', sql.String(64), sql.ForeignKey('role.id'),
+                   nullable=False),
+        sql.Column('inherited', sql.Boolean, default=False, nullable=False),
+        sql.PrimaryKeyConstraint('type', 'actor_id', 'target_id', 'role_id',
+                                 'inherited'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8')
+    assignment_table.create(migrate_engine, checkfirst=True)
+    sql.Index('ix_assignment_actor_id_target_id',
+              assignment_table.c.actor_id,
+              assignment_table.c.target_id).create(migrate_engine)
+    sql.Index('ix_assignment_target_id',
+              assignment_table.c.target_id).create(migrate_engine)
+    sql.Index('ix_assignment_role_id',
+              assignment_table.c.role_id).create(migrate_engine)
+
+    # Grants were not cleaned up when their roles were deleted, and the
+    # assignments of such roles would break the foreign key.
+    role_ids = set(role_id for role_id, in migrate_engine.execute(
+        sql.select([role_table.c.id])))
+
+    for table_name, assignment_type, actor, target, fk in GRANT_TABLES:
+        grant_table = sql.Table(table_name, meta, autoload=True)
+        for grants in _grant_batches(grant_table, actor, target,
+                                     migrate_engine):
+            # Each actor and target has a single grant, so duplicates can
+            # only come from within one.
+            assignments = set()
+            for grant in grants:
+                try:
+                    roles = json.loads(grant.data).get('roles', [])
+                except (ValueError, TypeError, AttributeError):
+                    # The grant was broken before this migration, so there
+                    # is no role to carry over.
+                    continue
+                for role in roles:
+                    if role['id'] not in role_ids:
+                        LOG.warning('Dropping the %(type)s assignment of '
+                                    '%(actor)s on %(target)s to the '
+                                    'deleted role %(role)s',
+                                    {'type': assignment_type,
+                                     'actor': grant[actor],
+                                     'target': grant[target],
+                                     'role': role['id']})
+                        continue
+                    assignments.add((grant[actor], grant[target],
+                                     role['id'], 'inherited_to' in role))
+            if assignments:
+                migrate_engine.execute(
+                    assignment_table.insert(),
+                    [{'type': assignment_type, 'actor_id': actor_id,
+                      'target_id': target_id, 'role_id': role_id,
+                      'inherited': inherited}
+                     for actor_id, target_id, role_id, inherited
+                     in assignments])
+        grant_table.drop(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    sql.Table('project', meta, autoload=True)
+    sql.Table('domain', meta, autoload=True)
+    assignment_table = sql.Table('assignment', meta, autoload=True)
+
+    for table_name, assignment_type, actor, target, fk in GRANT_TABLES:
+        grant_table = sql.Table(
+            table_name,
+            meta,
+            sql.Column(actor, sql.String(64), primary_key=True),
+            sql.Column(target, sql.String(64), sql.ForeignKey(fk),
+                       primary_key=True),
+            sql.Column('data', sql.Text()),
+            mysql_engine='InnoDB',
+            mysql_charset='utf8')
+        grant_table.create(migrate_engine, checkfirst=True)
+
+        grants = {}
+        query = assignment_table.select().where(
+            assignment_table.c.type == assignment_type)
+        for assignment in migrate_engine.execute(query):
+            role = {'id': assignment.role_id}
+            if assignment.inherited:
+                role['inherited_to'] = 'projects'
+            key = (assignment.actor_id, assignment.target_id)
+            grants.setdefault(key, []).append(role)
+        if grants:
+            migrate_engine.execute(
+                grant_table.insert(),
+                [{actor: actor_id, target: target_id,
+                  'data': json.dumps({'roles': roles})}
+                 for (actor_id, target_id), roles in grants.items()])
+
+    assignment_table.drop(migrate_engine)
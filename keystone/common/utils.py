@@ -19,11 +19,14 @@
 #    under the License.
 
 import calendar
+import collections
 import grp
 import hashlib
 import json
+import multiprocessing
 import os
 import pwd
+import time
 
 import passlib.hash
 
@@ -109,9 +112,16 @@ def hash_password(password):
     password_utf8 = trunc_password(password).encode('utf-8')
     if passlib.hash.sha512_crypt.identify(password_utf8):
         return password_utf8
-    h = passlib.hash.sha512_crypt.encrypt(password_utf8,
-                                          rounds=CONF.crypt_strength)
-    return h
+    return _run_password_hash(_sha512_crypt_encrypt,
+                              password_utf8, CONF.crypt_strength)
+
+
+def _sha512_crypt_encrypt(password_utf8, rounds):
+    return passlib.hash.sha512_crypt.encrypt(password_utf8, rounds=rounds)
+
+
+def _sha512_crypt_verify(password_utf8, hashed):
+    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
 
 
 def ldap_hash_password(password):
@@ -138,7 +148,177 @@ def check_password(password, hashed):
     if password is None or hashed is None:
         return False
     password_utf8 = trunc_password(password).encode('utf-8')
-    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
+    return _run_password_hash(_sha512_crypt_verify, password_utf8, hashed)
+
+
+_PASSWORD_HASH_POOL = None
+
+
+def _run_password_hash(func, *args):
+    """Call func with args on the password hash pool, if one is configured."""
+    pool = _get_password_hash_pool()
+    if pool is None:
+        return func(*args)
+    return pool.run(func, *args)
+
+
+def _get_password_hash_pool():
+    global _PASSWORD_HASH_POOL
+    size = CONF.identity.password_hash_workers
+    kind = CONF.identity.password_hash_pool
+    pool = _PASSWORD_HASH_POOL
+    if pool is not None and (pool.size, pool.kind) != (size, kind):
+        pool.close()
+        pool = _PASSWORD_HASH_POOL = None
+    if pool is None and size > 0:
+        pool = _PASSWORD_HASH_POOL = PasswordHashPool(size, kind)
+    return pool
+
+
+def get_password_hash_metrics():
+    """Return the metrics of the password hash pool, if one is configured."""
+    if _PASSWORD_HASH_POOL is None:
+        return None
+    return _PASSWORD_HASH_POOL.get_metrics()
+
+
+class PasswordHashPool(object):
+    """Hashes and verifies passwords with a pool of native workers.
+
+    Password hashing is slow by design and would otherwise block every other
+    request served by the same eventlet hub. Here the calling greenthread
+    only waits, for one of ``size`` workers to be free and then for its
+    result. Workers are either native threads, which only run one hash at a
+    time while a hash holds the interpreter lock, or processes, which are
+    started on demand, replaced when they die and can use as many cores.
+
+    """
+
+    KINDS = ('thread', 'process')
+
+    def __init__(self, size, kind):
+        if kind not in self.KINDS:
+            msg = _('Invalid password hash pool: %(kind)s. '
+                    'Choose one of: %(kinds)s')
+            raise ValueError(msg % {'kind': kind,
+                                    'kinds': ', '.join(self.KINDS)})
+        self.size = size
+        self.kind = kind
+        self.closed = False
+        # the slots hold process workers once they have been started
+        self._idle = environment.queue.LifoQueue()
+        for i in range(self.size):
+            self._idle.put(None)
+        self._metrics = {'calls': 0,
+                         'queued': 0,
+                         'max_queued': 0,
+                         'running': 0,
+                         'wait_time': 0.0,
+                         'run_time': 0.0,
+                         'max_time': 0.0}
+
+    def get_metrics(self):
+        metrics = dict(self._metrics, size=self.size, kind=self.kind)
+        if metrics['calls']:
+            metrics['average_wait_time'] = (metrics['wait_time'] /
+                                            metrics['calls'])
+            metrics['average_run_time'] = (metrics['run_time'] /
+                                           metrics['calls'])
+        return metrics
+
+    def run(self, func, *args):
+        metrics = self._metrics
+        queued_at = time.time()
+        metrics['queued'] += 1
+        metrics['max_queued'] = max(metrics['max_queued'], metrics['queued'])
+        try:
+            worker = self._idle.get()
+        finally:
+            metrics['queued'] -= 1
+        started_at = time.time()
+        metrics['running'] += 1
+        try:
+            if self.kind == 'thread':
+                return environment.execute(func, *args)
+            if worker is None or not worker.is_alive():
+                worker = _PasswordHashWorker()
+            try:
+                return environment.execute(worker.run, func, args)
+            except (EOFError, IOError, OSError):
+                # the worker died under us; the next call replaces it
+                worker.close()
+                worker = None
+                raise
+        finally:
+            finished_at = time.time()
+            if self.closed and worker is not None:
+                # the pool was replaced while the worker was busy; calls
+                # still queued on it get an empty slot instead
+                worker.close()
+                worker = None
+            self._idle.put(worker)
+            metrics['running'] -= 1
+            metrics['calls'] += 1
+            metrics['wait_time'] += started_at - queued_at
+            metrics['run_time'] += finished_at - started_at
+            metrics['max_time'] = max(metrics['max_time'],
+                                      finished_at - queued_at)
+
+    def close(self):
+        """Stop all process workers, the busy ones once they are done."""
+        self.closed = True
+        while True:
+            try:
+                worker = self._idle.get(block=False)
+            except environment.queue.Empty:
+                return
+            if worker is not None:
+                worker.close()
+
+
+class _PasswordHashWorker(object):
+    """A process calling the functions it is sent, one at a time."""
+
+    def __init__(self):
+        # NOTE: one way pipes are plain os pipes, while duplex ones would be
+        # sockets made non-blocking by eventlet's monkey patching.
+        requests, self._requests = multiprocessing.Pipe(duplex=False)
+        self._results, results = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=_password_hash_worker, args=(requests, results))
+        self.process.daemon = True
+        self.process.start()
+        requests.close()
+        results.close()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def run(self, func, args):
+        self._requests.send((func, args))
+        succeeded, result = self._results.recv()
+        if not succeeded:
+            raise result
+        return result
+
+    def close(self):
+        self._requests.close()
+        self._results.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+
+def _password_hash_worker(requests, results):
+    while True:
+        try:
+            func, args = requests.recv()
+        except EOFError:
+            return
+        try:
+            results.send((True, func(*args)))
+        except Exception as e:
+            results.send((False, e))
 
 
 # From python 2.7
@@ -516,3 +696,119 @@ def make_dirs(path, mode=None, user=None, group=None, log=None):
             raise EnvironmentError("makedirs('%s'): %s" % (path, exc.strerror))
 
     set_permissions(path, mode, user, group, log)
+
+
+def chunked(values, size):
+    """Split an iterable into lists of at most size values."""
+    values = list(values)
+    return [values[i:i + size] for i in xrange(0, len(values), size)]
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError('%s object is immutable' % type(self).__name__)
+
+
+class FrozenDict(dict):
+    """A dict that can not be modified once it has been built.
+
+    Use :func:`freeze` to build one, so that the values are frozen as well.
+    ``copy()`` returns a regular, modifiable dict sharing the same values.
+
+    """
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class FrozenList(list):
+    """A list that can not be modified once it has been built."""
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _immutable
+    __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = reverse = sort = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (list(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    """Return an immutable version of a structure of dicts and lists.
+
+    Frozen structures can be shared, e.g. between a backend and the cache,
+    without being copied. Values that are already frozen are returned as is.
+
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict([(k, freeze(v)) for k, v in value.iteritems()])
+    if isinstance(value, list):
+        return FrozenList([freeze(v) for v in value])
+    return value
+
+
+def thaw(value):
+    """Return a modifiable copy of a structure of dicts and lists."""
+    if isinstance(value, dict):
+        return dict((k, thaw(v)) for k, v in value.iteritems())
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+
+class LRUCache(object):
+    """A size bounded, in-process cache whose entries expire.
+
+    Once the cache is full, setting a new entry evicts the least recently
+    used one. Nothing is cached unless both the size and the time to live, in
+    seconds, are positive.
+
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._entries.pop(key)
+        except KeyError:
+            return default
+        if expires <= time.time():
+            return default
+        # Move the entry to the most recently used end.
+        self._entries[key] = (expires, value)
+        return value
+
+    def set(self, key, value):
+        if self.size <= 0 or self.ttl <= 0:
+            return
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.size:
+            self._entries.popitem(last=False)
+        self._entries[key] = (time.time() + self.ttl, value)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
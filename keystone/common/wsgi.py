@@ -46,6 +46,10 @@ CONTEXT_ENV = 'openstack.context'
 PARAMS_ENV = 'openstack.params'
 
 
+# Key of the request context holding the auth context of the request
+AUTH_CONTEXT_ENV = 'keystone.auth_context'
+
+
 _RE_PASS = re.compile(r'([\'"].*?password[\'"]\s*:\s*u?[\'"]).*?([\'"])',
                       re.DOTALL)
 
@@ -123,6 +127,74 @@ def validate_token_bind(context, token_ref):
             raise exception.Unauthorized()
 
 
+class AuthContext(object):
+    """What is known about the caller of a single request.
+
+    The token auth middleware keeps one in the context of each request. It
+    starts out with just the token ids, and the first consumer to need the
+    token loads it and validates its bind; the token, its role names and the
+    policy credentials built from it are then shared by every later consumer
+    of the same request rather than each going back to the token API.
+
+    """
+
+    def __init__(self, token_id=None, subject_token_id=None):
+        self.token_id = token_id
+        self.subject_token_id = subject_token_id
+        # The policy credentials, as built by the controllers
+        self.credentials = None
+        self._token_ref = None
+        self._subject_token_ref = None
+        self._role_names = None
+
+    def get_token_ref(self, token_api, context):
+        """Return the token of the request, with its bind validated."""
+        if self._token_ref is None:
+            try:
+                token_ref = token_api.get_token(self.token_id)
+            except exception.TokenNotFound as e:
+                LOG.warning(_('RBAC: Invalid token'))
+                raise exception.Unauthorized(e)
+            validate_token_bind(context, token_ref)
+            self._token_ref = token_ref
+        return self._token_ref
+
+    def get_subject_token_ref(self, token_api):
+        """Return the token named by the subject token header."""
+        if self._subject_token_ref is None:
+            self._subject_token_ref = token_api.get_token(
+                self.subject_token_id)
+        return self._subject_token_ref
+
+    def get_role_names(self, identity_api):
+        """Return the names of the roles of the loaded token."""
+        if self._role_names is None:
+            token_ref = self._token_ref
+            token_data = (token_ref.get('token_data') or {}).get('token')
+            if token_data is not None:
+                roles = token_data.get('roles', [])
+                self._role_names = [role['name'] for role in roles]
+            else:
+                role_ids = token_ref.get('metadata', {}).get('roles', [])
+                self._role_names = [role['name'] for role
+                                    in identity_api.get_roles(role_ids)]
+        return list(self._role_names)
+
+
+def get_auth_context(context):
+    """Return the auth context of the request context.
+
+    Contexts that were not built by the token auth middleware, such as those
+    of controllers called directly, get a new auth context on every call.
+
+    """
+    auth_context = context.get(AUTH_CONTEXT_ENV)
+    if auth_context is None:
+        auth_context = AuthContext(context.get('token_id'),
+                                   context.get('subject_token_id'))
+    return auth_context
+
+
 class Request(webob.Request):
     def best_match_language(self):
         """Determines the best available locale from the Accept-Language
@@ -282,12 +354,9 @@ class Application(BaseApplication):
 
     def assert_admin(self, context):
         if not context['is_admin']:
-            try:
-                user_token_ref = self.token_api.get_token(context['token_id'])
-            except exception.TokenNotFound as e:
-                raise exception.Unauthorized(e)
-
-            validate_token_bind(context, user_token_ref)
+            auth_context = get_auth_context(context)
+            user_token_ref = auth_context.get_token_ref(self.token_api,
+                                                        context)
             creds = user_token_ref['metadata'].copy()
 
             try:
@@ -302,9 +371,7 @@ class Application(BaseApplication):
                 LOG.debug('Invalid tenant')
                 raise exception.Unauthorized()
 
-            # NOTE(vish): this is pretty inefficient
-            creds['roles'] = [self.identity_api.get_role(role)['name']
-                              for role in creds.get('roles', [])]
+            creds['roles'] = auth_context.get_role_names(self.identity_api)
             # Accept either is_admin or the admin role
             self.policy_api.enforce(creds, 'admin_required', {})
 
@@ -15,7 +15,6 @@
 # under the License.
 
 from keystone.catalog.backends import sql
-from keystone.catalog import core as catalog_core
 from keystone.common import dependency
 from keystone import config
 from keystone import exception
@@ -26,8 +25,7 @@ CONF = config.CONF
 @dependency.requires('endpoint_filter_api')
 class EndpointFilterCatalog(sql.Catalog):
     def get_v3_catalog(self, user_id, project_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': project_id, 'user_id': user_id})
+        d = {'tenant_id': project_id, 'user_id': user_id}
 
         services = {}
 
@@ -47,8 +45,8 @@ class EndpointFilterCatalog(sql.Catalog):
                     self.get_service(service_id))
                 service = services[service_id]
                 del endpoint['service_id']
-                endpoint['url'] = catalog_core.format_url(
-                    endpoint['url'], d)
+                endpoint['url'] = self._get_url_template(
+                    endpoint['url']).render(d)
                 # populate filtered endpoints
                 if 'endpoints' in services[service_id]:
                     service['endpoints'].append(endpoint)
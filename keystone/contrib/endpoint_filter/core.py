@@ -47,6 +47,7 @@ extension.register_admin_extension(extension_data['alias'], extension_data)
 
 
 @dependency.provider('endpoint_filter_api')
+@dependency.requires('catalog_api')
 class Manager(manager.Manager):
     """Default pivot point for the Endpoint Filter backend.
 
@@ -58,6 +59,17 @@ class Manager(manager.Manager):
     def __init__(self):
         super(Manager, self).__init__(CONF.endpoint_filter.driver)
 
+    def add_endpoint_to_project(self, endpoint_id, project_id):
+        ret = self.driver.add_endpoint_to_project(endpoint_id, project_id)
+        self.catalog_api.invalidate_catalog()
+        return ret
+
+    def remove_endpoint_from_project(self, endpoint_id, project_id):
+        ret = self.driver.remove_endpoint_from_project(endpoint_id,
+                                                       project_id)
+        self.catalog_api.invalidate_catalog()
+        return ret
+
 
 class Driver(object):
     """Interface description for an Endpoint Filter driver."""
@@ -79,7 +79,7 @@ class UserController(identity.controllers.User):
                                                       update_dict)
 
         token_id = uuid.uuid4().hex
-        new_token_ref = copy.copy(token_ref)
+        new_token_ref = token_ref.copy()
         new_token_ref['id'] = token_id
         self.token_api.create_token(token_id, new_token_ref)
         LOG.debug('TOKEN_REF %s', new_token_ref)
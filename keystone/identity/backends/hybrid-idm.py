@@ -52,9 +52,12 @@ class Identity(sql.Identity):
             return super(Identity, self).authenticate(user_ref.get('id'), password)
 
         try:
-            conn = self.ldap_identity_api.user.get_connection(self._resolve_cn_suffix(user_ref.get('name')), password)
+            conn = self.ldap_identity_api.user.get_connection(
+                self._resolve_cn_suffix(user_ref.get('name')), password,
+                end_user_auth=True)
             if not conn:
                 raise AssertionError('Invalid user / password')
+            conn.unbind_s()
         except Exception as error:
             LOG.info("EXCEPTION Trace: %s" % error.message)
             raise AssertionError('Invalid user / password')
@@ -126,7 +129,11 @@ class Identity(sql.Identity):
         baseDN = self._resolve_baseDN(username)
         query = "(&({}={})(objectClass={}))".format(LDAP_USER_ID_ATTRIBUTE,username,LDAP_USER_OBJECT_CLASS)
         attrlist = [LDAP_USER_ID_ATTRIBUTE]
-        o = conn.search_s(baseDN, core.LDAP_SCOPES.get('one'), query, attrlist)
+        try:
+            o = conn.search_s(baseDN, core.LDAP_SCOPES.get('one'), query,
+                              attrlist)
+        finally:
+            conn.unbind_s()
         return (o[0][1])[LDAP_USER_ID_ATTRIBUTE][0]
 
 
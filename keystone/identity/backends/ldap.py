@@ -67,7 +67,7 @@ class Identity(identity.Driver):
         conn = None
         try:
             conn = self.user.get_connection(self.user._id_to_dn(user_id),
-                                            password)
+                                            password, end_user_auth=True)
             if not conn:
                 raise AssertionError('Invalid user / password')
         except Exception:
@@ -159,12 +159,19 @@ class Identity(identity.Driver):
 
     def list_users_in_group(self, group_id):
         self.get_group(group_id)
+        user_dns = self.group.list_group_users(group_id)
+        # the members are looked up with a few OR filtered searches rather
+        # than one search each
+        user_refs = dict(
+            (user_ref['id'].lower(), user_ref) for user_ref
+            in self.user.get_list(self.user._dn_to_id(user_dn)
+                                  for user_dn in user_dns))
         users = []
-        for user_dn in self.group.list_group_users(group_id):
+        for user_dn in user_dns:
             user_id = self.user._dn_to_id(user_dn)
             try:
-                users.append(self.user.get_filtered(user_id))
-            except exception.UserNotFound:
+                users.append(identity.filter_user(user_refs[user_id.lower()]))
+            except KeyError:
                 LOG.debug(_("Group member '%(user_dn)s' not found in"
                             " '%(group_id)s'. The user should be removed"
                             " from the group. The user will be ignored.") %
@@ -174,13 +181,8 @@ class Identity(identity.Driver):
     def check_user_in_group(self, user_id, group_id):
         self.get_user(user_id)
         self.get_group(group_id)
-        user_refs = self.list_users_in_group(group_id)
-        found = False
-        for x in user_refs:
-            if x['id'] == user_id:
-                found = True
-                break
-        return found
+        user_dn = self.user._id_to_dn(user_id)
+        return self.group.has_user(user_dn, group_id)
 
 
 # TODO(termie): turn this into a data object and move logic to driver
@@ -241,7 +243,7 @@ class UserApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap):
         return identity.filter_user(user)
 
     def get_all_filtered(self):
-        return [identity.filter_user(user) for user in self.get_all()]
+        return [identity.filter_user(user) for user in self.iter_all()]
 
 
 class GroupApi(common_ldap.BaseLdap):
@@ -298,10 +300,11 @@ class GroupApi(common_ldap.BaseLdap):
         return super(GroupApi, self).update(id, values, old_obj)
 
     def add_user(self, user_dn, group_id, user_id):
+        dn = self._id_to_dn(group_id)
         conn = self.get_connection()
         try:
             conn.modify_s(
-                self._id_to_dn(group_id),
+                dn,
                 [(ldap.MOD_ADD,
                   self.member_attribute,
                   user_dn)])
@@ -313,10 +316,11 @@ class GroupApi(common_ldap.BaseLdap):
             conn.unbind_s()
 
     def remove_user(self, user_dn, group_id, user_id):
+        dn = self._id_to_dn(group_id)
         conn = self.get_connection()
         try:
             conn.modify_s(
-                self._id_to_dn(group_id),
+                dn,
                 [(ldap.MOD_DELETE,
                   self.member_attribute,
                   user_dn)])
@@ -336,11 +340,27 @@ class GroupApi(common_ldap.BaseLdap):
         memberships = self.get_all(query)
         return memberships
 
+    def has_user(self, user_dn, group_id):
+        """Whether the user is a member of a group, asking the server."""
+        query = '(&(objectClass=%s)(%s=%s))' % (
+            self.object_class,
+            self.member_attribute,
+            ldap.filter.escape_filter_chars(user_dn))
+        group_dn = self._id_to_dn(group_id)
+        conn = self.get_connection()
+        try:
+            return bool(conn.search_s(group_dn, ldap.SCOPE_BASE,
+                                      query, ['1.1']))
+        except ldap.NO_SUCH_OBJECT:
+            return False
+        finally:
+            conn.unbind_s()
+
     def list_group_users(self, group_id):
         """Return a list of user dns which are members of a group."""
         query = '(objectClass=%s)' % self.object_class
-        conn = self.get_connection()
         group_dn = self._id_to_dn(group_id)
+        conn = self.get_connection()
         try:
             attrs = conn.search_s(group_dn,
                                   ldap.SCOPE_BASE,
@@ -16,7 +16,6 @@
 
 """Workflow Logic the Identity service."""
 
-import copy
 import urllib
 import urlparse
 import uuid
@@ -314,8 +313,7 @@ class Role(controller.V2Controller):
 
         roles = self.identity_api.get_roles_for_user_and_project(
             user_id, tenant_id)
-        return {'roles': [self.identity_api.get_role(x)
-                          for x in roles]}
+        return {'roles': self.identity_api.get_roles(roles)}
 
     # CRUD extension
     def get_role(self, context, role_id):
@@ -1079,6 +1077,21 @@ class RoleAssignmentV3(controller.V3Controller):
         additional link to that membership.
 
         """
+        def _copy_entry(entry):
+            """Copy an entity, deep enough to safely rework its parts.
+
+            The builders below only replace values within the top level
+            dicts of an entity, so there is no need for a deepcopy of
+            each one of what can be a very large number of entities.
+
+            """
+            new_entry = {}
+            for key, value in entry.iteritems():
+                if isinstance(value, dict):
+                    value = value.copy()
+                new_entry[key] = value
+            return new_entry
+
         def _get_group_members(ref):
             """Get a list of group members.
 
@@ -1121,7 +1134,7 @@ class RoleAssignmentV3(controller.V3Controller):
             user's membership of this group.
 
             """
-            user_entry = copy.deepcopy(template)
+            user_entry = _copy_entry(template)
             user_entry['user'] = {'id': user['id']}
             user_entry['links']['membership'] = (
                 self.base_url('/groups/%s/users/%s' %
@@ -1137,7 +1150,7 @@ class RoleAssignmentV3(controller.V3Controller):
             to match.
 
             """
-            project_entry = copy.deepcopy(template)
+            project_entry = _copy_entry(template)
             project_entry['scope']['project'] = {'id': project_id}
             project_entry['links']['assignment'] = (
                 self.base_url(
@@ -1156,7 +1169,7 @@ class RoleAssignmentV3(controller.V3Controller):
             to match.
 
             """
-            project_entry = copy.deepcopy(template)
+            project_entry = _copy_entry(template)
             project_entry['user'] = {'id': user_id}
             project_entry['scope']['project'] = {'id': project_id}
             project_entry['links']['assignment'] = (
@@ -1192,18 +1205,19 @@ class RoleAssignmentV3(controller.V3Controller):
                 project_ids = (
                     [x['id'] for x in self.assignment_api.list_projects(
                         r['scope']['domain']['id'])])
-                base_entry = copy.deepcopy(r)
+                base_entry = _copy_entry(r)
                 domain_id = base_entry['scope']['domain']['id']
                 base_entry['scope'].pop('domain')
+                # If it's a group assignment, then create equivalent user
+                # roles based on membership of the group
+                if 'group' in base_entry:
+                    members = _get_group_members(base_entry)
+                    sub_entry = _copy_entry(base_entry)
+                    group_id = sub_entry['group']['id']
+                    sub_entry.pop('group')
                 # For each project, create an equivalent role assignment
                 for p in project_ids:
-                    # If it's a group assignment, then create equivalent user
-                    # roles based on membership of the group
                     if 'group' in base_entry:
-                        members = _get_group_members(base_entry)
-                        sub_entry = copy.deepcopy(base_entry)
-                        group_id = sub_entry['group']['id']
-                        sub_entry.pop('group')
                         for m in members:
                             new_entry = (
                                 _build_project_equivalent_of_group_domain_role(
@@ -1222,7 +1236,7 @@ class RoleAssignmentV3(controller.V3Controller):
 
                 # Now replace that group role assignment entry with an
                 # equivalent user role assignment for each of the group members
-                base_entry = copy.deepcopy(r)
+                base_entry = _copy_entry(r)
                 group_id = base_entry['group']['id']
                 base_entry.pop('group')
                 for m in members:
@@ -1266,25 +1280,60 @@ class RoleAssignmentV3(controller.V3Controller):
                                 'scope.OS-INHERIT:inherited_to', 'user.id')
     def list_role_assignments(self, context, filters):
 
-        # TODO(henry-nash): This implementation uses the standard filtering
-        # in the V3.wrap_collection. Given the large number of individual
-        # assignments, this is pretty inefficient.  An alternative would be
-        # to pass the filters into the driver call, so that the list size is
-        # kept a minimum.
+        # The filters are passed into the driver call, so that the list size
+        # is kept to a minimum, and then applied again by the standard
+        # filtering in V3.wrap_collection, so the driver only has to narrow
+        # the list down.
+
+        query = context['query_string']
+        effective = ('effective' in query and
+                     self._query_filter_is_true(query['effective']))
+        driver_filters = self._driver_filters(query, effective)
 
-        refs = self.assignment_api.list_role_assignments()
+        refs = self.assignment_api.list_role_assignments(**driver_filters)
         formatted_refs = (
             [self._format_entity(x) for x in refs
              if self._filter_inherited(x)])
 
-        if ('effective' in context['query_string'] and
-                self._query_filter_is_true(
-                    context['query_string']['effective'])):
-
+        if effective:
             formatted_refs = self._expand_indirect_assignments(formatted_refs)
 
         return self.wrap_collection(context, formatted_refs, filters)
 
+    def _driver_filters(self, query, effective):
+        """Translate the query filters into list_role_assignments() ones.
+
+        When listing effective assignments, a user's assignments include
+        those of the groups it belongs to, and the scope of an inherited
+        assignment is only known once it has been expanded, so only the
+        actor and role filters can be passed down.
+
+        """
+        driver_filters = {}
+        if query.get('role.id'):
+            driver_filters['role_id'] = query['role.id']
+        if query.get('user.id'):
+            driver_filters['user_id'] = query['user.id']
+            if effective:
+                try:
+                    groups = self.identity_api.list_groups_for_user(
+                        query['user.id'])
+                except exception.UserNotFound:
+                    groups = []
+                driver_filters['group_ids'] = [x['id'] for x in groups]
+        if query.get('group.id'):
+            driver_filters.setdefault('group_ids', []).append(
+                query['group.id'])
+        if effective:
+            return driver_filters
+        if query.get('scope.project.id'):
+            driver_filters['project_id'] = query['scope.project.id']
+        if query.get('scope.domain.id'):
+            driver_filters['domain_id'] = query['scope.domain.id']
+        if query.get('scope.OS-INHERIT:inherited_to') == 'projects':
+            driver_filters['inherited_to_projects'] = True
+        return driver_filters
+
     @controller.protected()
     def get_role_assignment(self, context):
         raise exception.NotImplemented()
@@ -464,6 +464,9 @@ class Manager(manager.Manager):
     def get_role(self, role_id):
         return self.assignment_api.get_role(role_id)
 
+    def get_roles(self, role_ids):
+        return self.assignment_api.get_roles(role_ids)
+
     def list_roles(self):
         return self.assignment_api.list_roles()
 
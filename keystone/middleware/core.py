@@ -44,6 +44,10 @@ CONTEXT_ENV = wsgi.CONTEXT_ENV
 PARAMS_ENV = wsgi.PARAMS_ENV
 
 
+# Key of the request context holding the auth context of the request
+AUTH_CONTEXT_ENV = wsgi.AUTH_CONTEXT_ENV
+
+
 class TokenAuthMiddleware(wsgi.Middleware):
     def process_request(self, request):
         token = request.headers.get(AUTH_TOKEN_HEADER)
@@ -52,6 +56,8 @@ class TokenAuthMiddleware(wsgi.Middleware):
         if SUBJECT_TOKEN_HEADER in request.headers:
             context['subject_token_id'] = (
                 request.headers.get(SUBJECT_TOKEN_HEADER))
+        context[AUTH_CONTEXT_ENV] = wsgi.AuthContext(
+            token, context.get('subject_token_id'))
         request.environ[CONTEXT_ENV] = context
 
 
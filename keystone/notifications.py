@@ -22,6 +22,10 @@ from keystone.openstack.common.notifier import api as notifier_api
 
 LOG = log.getLogger(__name__)
 
+# In-process callbacks by operation and resource type, see
+# register_event_callback()
+_SUBSCRIBERS = {}
+
 
 class ManagerNotificationWrapper(object):
     """Send event notifications for ``Manager`` methods.
@@ -45,10 +49,13 @@ class ManagerNotificationWrapper(object):
             except Exception:
                 raise
             else:
+                resource_id = args[1]  # f(self, resource_id, ...)
+                _notify_event_callbacks(self.operation, self.resource_type,
+                                        resource_id)
                 _send_notification(
                     self.operation,
                     self.resource_type,
-                    args[1],  # f(self, resource_id, ...)
+                    resource_id,
                     self.host)
             return result
 
@@ -70,6 +77,29 @@ def deleted(*args, **kwargs):
     return ManagerNotificationWrapper('deleted', *args, **kwargs)
 
 
+def register_event_callback(operation, resource_type, callback):
+    """Call back whenever an operation succeeds on a type of resource.
+
+    Callbacks are made within the process, before the notification is sent,
+    with the operation, the resource type and the resource ID, and are
+    expected not to raise.
+
+    :param operation: operation to subscribe to (created, updated, deleted)
+    :param resource_type: type of resource to subscribe to
+    :param callback: callable to call
+    """
+    if operation not in ('created', 'updated', 'deleted'):
+        raise ValueError(_('Unknown operation %s') % operation)
+    subscribers = _SUBSCRIBERS.setdefault(operation, {})
+    subscribers.setdefault(resource_type, []).append(callback)
+
+
+def _notify_event_callbacks(operation, resource_type, resource_id):
+    callbacks = _SUBSCRIBERS.get(operation, {}).get(resource_type, [])
+    for callback in callbacks:
+        callback(operation, resource_type, resource_id)
+
+
 def _send_notification(operation, resource_type, resource_id, host=None):
     """Send notification to inform observers about the affected resource.
 
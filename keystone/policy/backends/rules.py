@@ -18,6 +18,9 @@
 """Policy engine for keystone"""
 
 import os.path
+import time
+
+import six
 
 from keystone.common import utils
 from keystone import config
@@ -34,15 +37,23 @@ LOG = logging.getLogger(__name__)
 _ENFORCER = None
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# The rules of _ENFORCER compiled by an _Evaluator, replaced as a whole
+# whenever the rules are.
+_EVALUATOR = None
+
+# The memo key for the set of lower case role names of the credentials.
+_ROLES = ('roles',)
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
     global _ENFORCER
+    global _EVALUATOR
     _POLICY_PATH = None
     _POLICY_CACHE = {}
     _ENFORCER = None
+    _EVALUATOR = None
 
 
 def init():
@@ -55,16 +66,207 @@ def init():
             _POLICY_PATH = CONF.find_file(_POLICY_PATH)
     if not _ENFORCER:
         _ENFORCER = common_policy.Enforcer(policy_file=_POLICY_PATH)
+    # Rather than on every request, the policy file is only looked at for
+    # changes once the check interval has passed since it last was.
+    now = time.time()
+    if _POLICY_CACHE and now < _POLICY_CACHE.get('next_check', 0):
+        return
     utils.read_cached_file(_POLICY_PATH,
                            _POLICY_CACHE,
                            reload_func=_set_rules)
+    _POLICY_CACHE['next_check'] = now + CONF.policy.file_check_interval
 
 
 def _set_rules(data):
     global _ENFORCER
+    global _EVALUATOR
     default_rule = CONF.policy_default_rule
     _ENFORCER.set_rules(common_policy.Rules.load_json(
         data, default_rule))
+    _EVALUATOR = _Evaluator(_ENFORCER)
+
+
+def _get_evaluator():
+    """Return the evaluator of the current rules of the enforcer."""
+    global _EVALUATOR
+    evaluator = _EVALUATOR
+    if evaluator is None or evaluator.rules is not _ENFORCER.rules:
+        # The rules were set on the enforcer directly.
+        evaluator = _Evaluator(_ENFORCER)
+        _EVALUATOR = evaluator
+    return evaluator
+
+
+class _Evaluator(object):
+    """The rules of an enforcer compiled into plain functions.
+
+    Each rule becomes a function of the target, the credentials and a memo
+    dict, with the same results as the tree of Check objects it is compiled
+    from. References to rules that only depend on the credentials, such as
+    role checks, are evaluated once per enforce() call and then read from
+    the memo. Checks of any kind this does not know about are called as
+    they are.
+
+    """
+
+    def __init__(self, enforcer):
+        self.enforcer = enforcer
+        self.rules = enforcer.rules
+        self._functions = {}
+        self._pure = {}
+        for name in self.rules.keys():
+            self._get_function(name)
+
+    def enforce(self, rule, target, creds):
+        if not self.rules:
+            # No rules to reference means we're going to fail closed
+            return False
+        function = self._get_function(rule)
+        if function is None:
+            LOG.debug(_('Rule [%s] doesn\'t exist') % rule)
+            return False
+        try:
+            return function(target, creds, {})
+        except KeyError:
+            LOG.debug(_('Rule [%s] doesn\'t exist') % rule)
+            return False
+
+    def _lookup(self, name):
+        try:
+            return self.rules[name]
+        except KeyError:
+            return None
+
+    def _get_function(self, name):
+        try:
+            return self._functions[name]
+        except KeyError:
+            check = self._lookup(name)
+            if check is None:
+                return None
+            function = self._compile(check)
+            self._functions[name] = function
+            return function
+
+    def _is_pure(self, check, seen=()):
+        """Whether the result of check only depends on the credentials."""
+        if isinstance(check, (common_policy.TrueCheck,
+                              common_policy.FalseCheck)):
+            return True
+        if isinstance(check, common_policy.NotCheck):
+            return self._is_pure(check.rule, seen)
+        if isinstance(check, (common_policy.AndCheck,
+                              common_policy.OrCheck)):
+            return all(self._is_pure(rule, seen) for rule in check.rules)
+        if type(check) is common_policy.RoleCheck:
+            return True
+        if type(check) is common_policy.GenericCheck:
+            return '%' not in check.match
+        if type(check) is common_policy.RuleCheck:
+            return self._is_pure_rule(check.match, seen)
+        return False
+
+    def _is_pure_rule(self, name, seen=()):
+        if name not in self._pure:
+            if name in seen:
+                return False
+            rule = self._lookup(name)
+            self._pure[name] = (rule is None or
+                                self._is_pure(rule, seen + (name,)))
+        return self._pure[name]
+
+    def _compile(self, check):
+        if isinstance(check, common_policy.TrueCheck):
+            return lambda target, creds, memo: True
+        if isinstance(check, common_policy.FalseCheck):
+            return lambda target, creds, memo: False
+        if isinstance(check, common_policy.NotCheck):
+            negated = self._compile(check.rule)
+            return lambda target, creds, memo: not negated(target, creds,
+                                                           memo)
+        if isinstance(check, common_policy.AndCheck):
+            return self._compile_and([self._compile(rule)
+                                      for rule in check.rules])
+        if isinstance(check, common_policy.OrCheck):
+            return self._compile_or([self._compile(rule)
+                                     for rule in check.rules])
+        if type(check) is common_policy.RuleCheck:
+            return self._compile_rule_reference(check.match)
+        if type(check) is common_policy.RoleCheck:
+            return self._compile_role(check.match.lower())
+        if type(check) is common_policy.GenericCheck:
+            return self._compile_generic(check.kind, check.match)
+        enforcer = self.enforcer
+        return lambda target, creds, memo: check(target, creds, enforcer)
+
+    def _compile_and(self, rules):
+        def and_check(target, creds, memo):
+            for rule in rules:
+                if not rule(target, creds, memo):
+                    return False
+            return True
+        return and_check
+
+    def _compile_or(self, rules):
+        def or_check(target, creds, memo):
+            for rule in rules:
+                if rule(target, creds, memo):
+                    return True
+            return False
+        return or_check
+
+    def _compile_rule_reference(self, name):
+        # Rules are looked up when evaluated, so that they can refer to
+        # each other in any order.
+        def rule_check(target, creds, memo):
+            function = self._get_function(name)
+            if function is None:
+                # We don't have any matching rule; fail closed
+                return False
+            try:
+                return function(target, creds, memo)
+            except KeyError:
+                return False
+
+        if not self._is_pure_rule(name):
+            return rule_check
+
+        def pure_rule_check(target, creds, memo):
+            try:
+                return memo[name]
+            except KeyError:
+                result = memo[name] = rule_check(target, creds, memo)
+                return result
+        return pure_rule_check
+
+    def _compile_role(self, role):
+        def role_check(target, creds, memo):
+            try:
+                roles = memo[_ROLES]
+            except KeyError:
+                roles = memo[_ROLES] = set(x.lower() for x in creds['roles'])
+            return role in roles
+        return role_check
+
+    def _compile_generic(self, kind, match):
+        if '%' not in match:
+            def constant_check(target, creds, memo):
+                if kind in creds:
+                    return match == six.text_type(creds[kind])
+                return False
+            return constant_check
+
+        def generic_check(target, creds, memo):
+            try:
+                value = match % target
+            except KeyError:
+                # While doing GenericCheck if key not
+                # present in Target return false
+                return False
+            if kind in creds:
+                return value == six.text_type(creds[kind])
+            return False
+        return generic_check
 
 
 def enforce(credentials, action, target, do_raise=True):
@@ -86,13 +288,10 @@ def enforce(credentials, action, target, do_raise=True):
     """
     init()
 
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.ForbiddenAction, action=action,
-                     do_raise=do_raise)
-
-    return _ENFORCER.enforce(action, target, credentials, **extra)
+    result = _get_evaluator().enforce(action, target, credentials)
+    if do_raise and not result:
+        raise exception.ForbiddenAction(action=action)
+    return result
 
 
 class Policy(policy.Driver):
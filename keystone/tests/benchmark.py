@@ -0,0 +1,461 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""In-process benchmarks for token issuance and validation.
+
+Each scenario loads a token backend and a token provider exactly the way the
+test suite does, loads the default fixtures and then drives the v2 and v3
+token controllers directly, without any WSGI overhead. Protected calls go
+through the real RBAC path using an admin token. The ``create_token`` and
+``get_token`` operations store and load a v3 token reference through the
+token API and the token driver alone.
+
+Run every scenario and write the results as JSON::
+
+    python -m keystone.tests.benchmark --output results.json
+
+The ``--catalog`` option runs the catalog benchmark instead. It renders a
+templated catalog of 50 services in each of 20 regions, once by formatting
+every endpoint URL against the whole configuration the way catalogs used to
+be rendered, and once from the precompiled URL templates.
+
+The ``--policy`` option runs the policy benchmark instead. It enforces
+``identity:get_user`` of ``policy.v3cloudsample.json``, once by walking the
+tree of Check objects after checking the policy file for changes the way
+it used to be enforced, and once with the compiled rules.
+
+Every result records the number of iterations, operations per second, the
+mean, median (p50) and 99th percentile (p99) latency in milliseconds, and
+``gc_objects_retained_per_call``: the number of garbage collected objects
+(dicts, lists, model instances, ...) that each call leaves alive, such as
+cache entries and in-memory backend records. This is the net growth of the
+collector's youngest generation, so objects that are allocated and freed
+within a call, such as copies, are not counted. Python 2 offers no way to
+count those; only when ``tracemalloc`` is available (Python 3.4 and later,
+or a patched Python 2.7) are the peak and net number of bytes allocated by a
+single call reported as well. The ``notes`` of the JSON document repeat
+these limitations.
+
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import timeit
+import uuid
+
+from keystone.auth import controllers as auth_controllers
+from keystone.catalog.backends import templated
+from keystone.catalog import core as catalog_core
+from keystone.common import sql
+from keystone.common import utils
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import policy as common_policy
+from keystone.policy.backends import rules
+from keystone import tests
+from keystone.tests import default_fixtures
+from keystone.tests import test_backend_memcache
+from keystone.token.backends import memcache as token_memcache
+from keystone.token import controllers as token_controllers
+from keystone.token import provider
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+NOTES = {
+    'gc_objects_retained_per_call': (
+        'net number of garbage collected objects each call leaves alive; '
+        'objects allocated and freed within the call are not counted'),
+    'alloc_peak_bytes_per_call': (
+        'only reported when tracemalloc is available'
+        if tracemalloc is not None else
+        'not reported: tracemalloc is not available, so allocations '
+        'within a call are not measured'),
+}
+
+
+CONF = config.CONF
+
+BACKENDS = ['sql', 'kvs', 'memcache']
+PROVIDERS = {'uuid': provider.UUID_PROVIDER,
+             'pki': provider.PKI_PROVIDER}
+OPERATIONS = ['v2_authenticate', 'v3_authenticate',
+              'v2_validate_token', 'v2_check_token',
+              'v3_validate_token', 'v3_check_token',
+              'revocation_list', 'create_token', 'get_token']
+
+# tokens revoked before the revocation list is measured, so that it is not
+# signing an empty document.
+REVOKED_TOKENS = 10
+
+CATALOG_OPERATIONS = ['catalog_format_url', 'catalog_render']
+CATALOG_SERVICES = 50
+CATALOG_REGIONS = 20
+
+POLICY_OPERATIONS = ['policy_enforce_check_tree', 'policy_enforce']
+POLICY_FILE = 'policy.v3cloudsample.json'
+POLICY_ACTION = 'identity:get_user'
+
+
+class Scenario(tests.TestCase, sql.Base):
+    """A loaded token backend and provider that operations run against."""
+
+    def __init__(self, backend, provider_name):
+        super(Scenario, self).__init__('runTest')
+        self.backend = backend
+        self.provider_name = provider_name
+
+    def runTest(self):
+        pass
+
+    def setUp(self):
+        super(Scenario, self).setUp()
+        if self.backend == 'sql':
+            self.db_file = tests.tmpdir('benchmark.db')
+            self.config([tests.etcdir('keystone.conf.sample'),
+                         tests.testsdir('test_overrides.conf'),
+                         tests.testsdir('backend_sql.conf')])
+            self.opt_in_group('sql',
+                              connection='sqlite:///%s' % self.db_file)
+        self.opt_in_group('token', provider=PROVIDERS[self.provider_name])
+        self.opt_in_group(
+            'signing',
+            certfile=tests.rootdir('examples/pki/certs/signing_cert.pem'),
+            keyfile=tests.rootdir('examples/pki/private/signing_key.pem'),
+            ca_certs=tests.rootdir('examples/pki/certs/cacert.pem'))
+
+        self.load_backends()
+        # auth plugins keep references to the backends they were loaded with
+        auth_controllers.AUTH_METHODS = {}
+        if self.backend == 'sql':
+            self.engine = self.get_engine()
+            sql.ModelBase.metadata.create_all(bind=self.engine)
+        elif self.backend == 'memcache':
+            self.token_api.driver = token_memcache.Token(
+                client=test_backend_memcache.MemcacheClient())
+        self.load_fixtures(default_fixtures)
+        try:
+            self.assignment_api.add_role_to_user_and_project(
+                self.user_foo['id'], self.tenant_bar['id'],
+                self.role_admin['id'])
+        except exception.Conflict:
+            # some backends already grant it through the default fixtures
+            pass
+
+        self.v2_controller = token_controllers.Auth()
+        self.v3_controller = auth_controllers.Auth()
+
+        self.v2_auth = {
+            'passwordCredentials': {'userId': self.user_foo['id'],
+                                    'password': self.user_foo['password']},
+            'tenantId': self.tenant_bar['id']}
+        self.v3_auth = {
+            'identity': {
+                'methods': ['password'],
+                'password': {'user': {'id': self.user_foo['id'],
+                                      'password': self.user_foo['password']}}},
+            'scope': {'project': {'id': self.tenant_bar['id']}}}
+
+        self.v2_token_id = self.v2_authenticate()['access']['token']['id']
+        self.v3_token_id = self.v3_authenticate().headers['X-Subject-Token']
+        for i in range(REVOKED_TOKENS):
+            self.token_api.delete_token(
+                self.v2_authenticate()['access']['token']['id'])
+        self.v3_unique_id = self.token_api.unique_id(self.v3_token_id)
+        self.v3_token_ref = utils.thaw(
+            self.token_api.get_token(self.v3_token_id))
+
+    def tearDown(self):
+        if self.backend == 'sql':
+            sql.ModelBase.metadata.drop_all(bind=self.engine)
+            self.engine.dispose()
+            sql.set_global_engine(None)
+            if os.path.exists(self.db_file):
+                os.unlink(self.db_file)
+        super(Scenario, self).tearDown()
+
+    def _admin_context(self, subject_token_id=None):
+        context = {'token_id': self.v2_token_id, 'is_admin': False,
+                   'query_string': {}}
+        if subject_token_id is not None:
+            context['subject_token_id'] = subject_token_id
+        return context
+
+    def v2_authenticate(self):
+        return self.v2_controller.authenticate({}, self.v2_auth)
+
+    def v3_authenticate(self):
+        return self.v3_controller.authenticate_for_token(
+            {'query_string': {}}, self.v3_auth)
+
+    def v2_validate_token(self):
+        return self.v2_controller.validate_token(self._admin_context(),
+                                                 self.v2_token_id)
+
+    def v2_check_token(self):
+        return self.v2_controller.validate_token_head(self._admin_context(),
+                                                      self.v2_token_id)
+
+    def v3_validate_token(self):
+        return self.v3_controller.validate_token(
+            self._admin_context(self.v3_token_id))
+
+    def v3_check_token(self):
+        return self.v3_controller.check_token(
+            self._admin_context(self.v3_token_id))
+
+    def revocation_list(self):
+        return self.v2_controller.revocation_list(self._admin_context())
+
+    def create_token(self):
+        token_id = uuid.uuid4().hex
+        return self.token_api.create_token(
+            token_id, dict(self.v3_token_ref, id=token_id))
+
+    def get_token(self):
+        # The driver is called directly, the token API would use the cache.
+        return self.token_api.driver.get_token(self.v3_unique_id)
+
+
+class CatalogScenario(tests.TestCase):
+    """A templated catalog of many services across many regions."""
+
+    def __init__(self, services=CATALOG_SERVICES, regions=CATALOG_REGIONS):
+        super(CatalogScenario, self).__init__('runTest')
+        self.services = services
+        self.regions = regions
+
+    def runTest(self):
+        pass
+
+    def setUp(self):
+        super(CatalogScenario, self).setUp()
+        templates = {}
+        for region in range(self.regions):
+            region_ref = templates.setdefault('Region%d' % region, {})
+            for service in range(self.services):
+                url = ('http://service%d.region%d:$(public_port)s'
+                       '/v2/$(tenant_id)s' % (service, region))
+                region_ref['service%d' % service] = {
+                    'publicURL': url,
+                    'internalURL': url,
+                    'adminURL': url.replace('public_port', 'admin_port'),
+                    'name': 'Service %d' % service,
+                    'id': '%d' % service}
+        self.driver = templated.TemplatedCatalog(templates=templates)
+        self.user_id = uuid.uuid4().hex
+        self.tenant_id = uuid.uuid4().hex
+
+    def catalog_format_url(self):
+        d = dict(CONF.iteritems())
+        d.update({'tenant_id': self.tenant_id, 'user_id': self.user_id})
+        o = {}
+        for region, region_ref in self.driver.templates.iteritems():
+            o[region] = {}
+            for service, service_ref in region_ref.iteritems():
+                o[region][service] = dict(
+                    (k, catalog_core.format_url(v, d))
+                    for k, v in service_ref.iteritems())
+        return o
+
+    def catalog_render(self):
+        return self.driver.get_catalog(self.user_id, self.tenant_id)
+
+
+class PolicyScenario(tests.TestCase):
+    """A domain admin reading a user of their domain."""
+
+    def __init__(self):
+        super(PolicyScenario, self).__init__('runTest')
+
+    def runTest(self):
+        pass
+
+    def setUp(self):
+        super(PolicyScenario, self).setUp()
+        rules.reset()
+        self.opt(policy_file=tests.etcdir(POLICY_FILE))
+        rules.init()
+        self.enforcer = common_policy.Enforcer(policy_file=rules._POLICY_PATH)
+        self.policy_cache = {}
+        domain_id = uuid.uuid4().hex
+        self.credentials = {'user_id': uuid.uuid4().hex,
+                            'domain_id': domain_id,
+                            'roles': ['member', 'admin']}
+        self.target = {'target.user.domain_id': domain_id}
+
+    def tearDown(self):
+        rules.reset()
+        super(PolicyScenario, self).tearDown()
+
+    def policy_enforce_check_tree(self):
+        utils.read_cached_file(rules._POLICY_PATH, self.policy_cache)
+        return self.enforcer.enforce(POLICY_ACTION, self.target,
+                                     self.credentials, do_raise=True,
+                                     exc=exception.ForbiddenAction,
+                                     action=POLICY_ACTION)
+
+    def policy_enforce(self):
+        return rules.enforce(self.credentials, POLICY_ACTION, self.target)
+
+
+def _percentile(ordered, fraction):
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(func, iterations, warmup=0):
+    """Call ``func`` repeatedly and summarize the cost of each call."""
+    for i in range(warmup):
+        func()
+
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        gc_before = gc.get_count()[0]
+        for i in range(iterations):
+            start = timeit.default_timer()
+            func()
+            timings.append(timeit.default_timer() - start)
+        gc_objects = gc.get_count()[0] - gc_before
+    finally:
+        gc.enable()
+
+    result = {}
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result['alloc_peak_bytes_per_call'] = peak - before
+        result['alloc_net_bytes_per_call'] = current - before
+
+    ordered = sorted(timings)
+    total = sum(timings)
+    result.update({
+        'iterations': iterations,
+        'ops_per_sec': iterations / total if total else None,
+        'mean_ms': total / iterations * 1000,
+        'p50_ms': _percentile(ordered, 0.50) * 1000,
+        'p99_ms': _percentile(ordered, 0.99) * 1000,
+        'gc_objects_retained_per_call': float(gc_objects) / iterations,
+    })
+    return result
+
+
+def run(backends=None, providers=None, operations=None, iterations=200,
+        warmup=20):
+    """Run the benchmark matrix and return a list of result dicts."""
+    results = []
+    for backend in backends or BACKENDS:
+        for provider_name in providers or sorted(PROVIDERS):
+            scenario = Scenario(backend, provider_name)
+            scenario.setUp()
+            try:
+                for operation in operations or OPERATIONS:
+                    result = measure(getattr(scenario, operation),
+                                     iterations, warmup)
+                    result.update({'backend': backend,
+                                   'provider': provider_name,
+                                   'operation': operation})
+                    results.append(result)
+            finally:
+                scenario.tearDown()
+    return results
+
+
+def _run_scenario(scenario, operations, iterations, warmup, **details):
+    results = []
+    scenario.setUp()
+    try:
+        for operation in operations:
+            result = measure(getattr(scenario, operation), iterations,
+                             warmup)
+            result.update(details, operation=operation)
+            results.append(result)
+    finally:
+        scenario.tearDown()
+    return results
+
+
+def run_catalog(operations=None, iterations=200, warmup=20,
+                services=CATALOG_SERVICES, regions=CATALOG_REGIONS):
+    """Run the catalog benchmark and return a list of result dicts."""
+    return _run_scenario(CatalogScenario(services, regions),
+                         operations or CATALOG_OPERATIONS, iterations,
+                         warmup, services=services, regions=regions)
+
+
+def run_policy(operations=None, iterations=200, warmup=20):
+    """Run the policy benchmark and return a list of result dicts."""
+    return _run_scenario(PolicyScenario(), operations or POLICY_OPERATIONS,
+                         iterations, warmup, policy_file=POLICY_FILE,
+                         action=POLICY_ACTION)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='token backend to run (default: all)')
+    parser.add_argument('--provider', action='append',
+                        choices=sorted(PROVIDERS),
+                        help='token provider to run (default: all)')
+    parser.add_argument('--operation', action='append',
+                        choices=(OPERATIONS + CATALOG_OPERATIONS +
+                                 POLICY_OPERATIONS),
+                        help='operation to measure (default: all)')
+    parser.add_argument('--catalog', action='store_true',
+                        help='run the catalog benchmark instead')
+    parser.add_argument('--policy', action='store_true',
+                        help='run the policy benchmark instead')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--output', help='file to write the JSON results '
+                                         'to (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.catalog:
+        results = run_catalog(args.operation, args.iterations, args.warmup)
+    elif args.policy:
+        results = run_policy(args.operation, args.iterations, args.warmup)
+    else:
+        results = run(args.backend, args.provider, args.operation,
+                      args.iterations, args.warmup)
+    document = {'python': platform.python_version(),
+                'platform': platform.platform(),
+                'notes': NOTES,
+                'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
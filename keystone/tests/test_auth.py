@@ -14,9 +14,11 @@
 
 import copy
 import datetime
+import json
 import uuid
 
 from keystone import auth
+from keystone.common import cms
 from keystone import config
 from keystone import exception
 from keystone import identity
@@ -438,6 +440,106 @@ class AuthWithToken(AuthTest):
             token_id=token_id)
 
 
+class RevocationListTest(AuthTest):
+    def setUp(self):
+        super(RevocationListTest, self).setUp()
+        self.opt_in_group(
+            'signing',
+            certfile=tests.rootdir('examples/pki/certs/signing_cert.pem'),
+            keyfile=tests.rootdir('examples/pki/private/signing_key.pem'),
+            ca_certs=tests.rootdir('examples/pki/certs/cacert.pem'))
+
+    def _revoke_token(self):
+        body_dict = _build_user_auth(username='FOO', password='foo2')
+        token = self.controller.authenticate({}, body_dict)
+        token_id = token['access']['token']['id']
+        self.token_api.delete_token(token_id)
+        return self.token_api.unique_id(token_id)
+
+    def _revocation_list(self, since=None):
+        context = dict(is_admin=True, query_string={})
+        if since is not None:
+            context['query_string']['since'] = since
+        signed_text = self.controller.revocation_list(context)['signed']
+        return json.loads(cms.cms_verify(signed_text,
+                                         CONF.signing.certfile,
+                                         CONF.signing.ca_certs))
+
+    def test_revocation_list_since(self):
+        sequence = self._revocation_list()['sequence']
+        token_id = self._revoke_token()
+        token2_id = self._revoke_token()
+
+        revocation_list = self._revocation_list()
+        revoked = [x['id'] for x in revocation_list['revoked']]
+        self.assertIn(token_id, revoked)
+        self.assertIn(token2_id, revoked)
+
+        revocation_list = self._revocation_list(since=str(sequence))
+        self.assertEqual(
+            sorted(x['id'] for x in revocation_list['revoked']),
+            sorted([token_id, token2_id]))
+
+        sequence = revocation_list['sequence']
+        self.assertEqual(self._revocation_list(since=sequence)['revoked'], [])
+        token3_id = self._revoke_token()
+        revocation_list = self._revocation_list(since=sequence)
+        self.assertEqual([x['id'] for x in revocation_list['revoked']],
+                         [token3_id])
+        self.assertTrue(revocation_list['sequence'] > sequence)
+
+    def test_revocation_list_since_unknown_sequence(self):
+        token_id = self._revoke_token()
+        sequence = self._revocation_list()['sequence']
+        revocation_list = self._revocation_list(since=sequence + 10)
+        self.assertIn(token_id,
+                      [x['id'] for x in revocation_list['revoked']])
+
+    def test_revocation_list_invalid_since(self):
+        self.assertRaises(exception.ValidationError,
+                          self._revocation_list, since='invalid')
+
+    def test_revocation_list_without_driver_sequence(self):
+        driver = self.token_api.driver
+        list_revoked_tokens = driver.list_revoked_tokens
+
+        def get_revocation_sequence():
+            raise exception.NotImplemented()
+
+        def list_all_revoked_tokens():
+            return list_revoked_tokens()
+        self.stubs.Set(driver, 'get_revocation_sequence',
+                       get_revocation_sequence)
+        self.stubs.Set(driver, 'list_revoked_tokens', list_all_revoked_tokens)
+
+        token_id = self._revoke_token()
+        revocation_list = self._revocation_list(since=5)
+        self.assertEqual(revocation_list['sequence'], 0)
+        self.assertEqual([x['id'] for x in revocation_list['revoked']],
+                         [token_id])
+        token2_id = self._revoke_token()
+        revoked = [x['id'] for x in self._revocation_list()['revoked']]
+        self.assertEqual(sorted(revoked), sorted([token_id, token2_id]))
+
+    def test_revocation_list_signed_once_per_sequence(self):
+        sign_calls = []
+        cms_sign_text = cms.cms_sign_text
+
+        def counting_sign_text(text, *args, **kwargs):
+            if 'revoked' in json.loads(text):
+                sign_calls.append(text)
+            return cms_sign_text(text, *args, **kwargs)
+
+        self.stubs.Set(cms, 'cms_sign_text', counting_sign_text)
+        self._revoke_token()
+        self._revocation_list()
+        self._revocation_list()
+        self.assertEqual(len(sign_calls), 1)
+        self._revoke_token()
+        self._revocation_list()
+        self.assertEqual(len(sign_calls), 2)
+
+
 class AuthWithPasswordCredentials(AuthTest):
     def setUp(self):
         super(AuthWithPasswordCredentials, self).setUp()
@@ -218,6 +218,34 @@ class IdentityTests(object):
                           self.identity_api.get_role,
                           uuid.uuid4().hex)
 
+    def test_get_roles(self):
+        role_refs = self.assignment_api.get_roles(
+            [self.role_member['id'], self.role_admin['id'],
+             self.role_member['id']])
+        self.assertEqual([ref['id'] for ref in role_refs],
+                         [self.role_member['id'], self.role_admin['id'],
+                          self.role_member['id']])
+        self.assertEqual(role_refs[1]['name'], self.role_admin['name'])
+        self.assertEqual(self.assignment_api.get_roles([]), [])
+
+    def test_get_roles_404(self):
+        self.assertRaises(exception.RoleNotFound,
+                          self.assignment_api.get_roles,
+                          [self.role_admin['id'], uuid.uuid4().hex])
+
+    def test_get_roles_without_driver_support(self):
+        def get_roles(role_ids):
+            raise exception.NotImplemented()
+        self.stubs.Set(self.assignment_api.driver, 'get_roles', get_roles)
+
+        role_refs = self.assignment_api.get_roles(
+            [self.role_member['id'], self.role_admin['id']])
+        self.assertEqual([ref['id'] for ref in role_refs],
+                         [self.role_member['id'], self.role_admin['id']])
+        self.assertRaises(exception.RoleNotFound,
+                          self.assignment_api.get_roles,
+                          [self.role_admin['id'], uuid.uuid4().hex])
+
     def test_create_duplicate_role_name_fails(self):
         role = {'id': 'fake1',
                 'name': 'fake1name'}
@@ -545,6 +573,58 @@ class IdentityTests(object):
             role_id=uuid.uuid4().hex)
         self.assertEqual(assignment_list, [])
 
+    def test_list_role_assignments_filtered(self):
+        new_domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.identity_api.create_domain(new_domain['id'], new_domain)
+        new_user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                    'password': uuid.uuid4().hex, 'enabled': True,
+                    'domain_id': new_domain['id']}
+        self.identity_api.create_user(new_user['id'], new_user)
+        new_group = {'id': uuid.uuid4().hex, 'domain_id': new_domain['id'],
+                     'name': uuid.uuid4().hex}
+        self.identity_api.create_group(new_group['id'], new_group)
+        new_project = {'id': uuid.uuid4().hex,
+                       'name': uuid.uuid4().hex,
+                       'domain_id': new_domain['id']}
+        self.assignment_api.create_project(new_project['id'], new_project)
+
+        user_domain = {'user_id': new_user['id'],
+                       'domain_id': new_domain['id'], 'role_id': 'member'}
+        user_project = {'user_id': new_user['id'],
+                        'project_id': new_project['id'], 'role_id': 'other'}
+        group_domain = {'group_id': new_group['id'],
+                        'domain_id': new_domain['id'], 'role_id': 'admin'}
+        group_project = {'group_id': new_group['id'],
+                         'project_id': new_project['id'], 'role_id': 'admin'}
+        for assignment in (user_domain, user_project, group_domain,
+                           group_project):
+            self.identity_api.create_grant(**assignment)
+
+        def assertAssignments(expected, **filters):
+            assignment_list = self.assignment_api.list_role_assignments(
+                **filters)
+            self.assertEqual(len(assignment_list), len(expected))
+            for assignment in expected:
+                self.assertIn(assignment, assignment_list)
+
+        assertAssignments([user_domain, user_project],
+                          user_id=new_user['id'])
+        assertAssignments([group_domain, group_project],
+                          group_ids=[new_group['id']])
+        assertAssignments([user_domain, user_project, group_domain,
+                           group_project],
+                          user_id=new_user['id'],
+                          group_ids=[new_group['id']])
+        assertAssignments([user_project, group_project],
+                          user_id=new_user['id'],
+                          group_ids=[new_group['id']],
+                          project_id=new_project['id'])
+        assertAssignments([group_domain], domain_id=new_domain['id'],
+                          role_id='admin')
+        assertAssignments([], group_ids=[])
+        assertAssignments([], user_id=new_user['id'],
+                          inherited_to_projects=True)
+
     def test_add_duplicate_role_grant(self):
         roles_ref = self.identity_api.get_roles_for_user_and_project(
             self.user_foo['id'], self.tenant_bar['id'])
@@ -2566,6 +2646,25 @@ class IdentityTests(object):
                           self.assignment_api.get_project,
                           project_id)
 
+    def test_cache_layer_get_roles(self):
+        role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        role_id = role['id']
+        self.assignment_api.create_role(role_id, role)
+        self.assertEqual(self.assignment_api.get_roles([role_id]), [role])
+        updated_role = {'id': role_id, 'name': uuid.uuid4().hex}
+        # Update role, bypassing the assignment api manager
+        self.assignment_api.driver.update_role(role_id, updated_role)
+        # Verify get_roles still returns the old ref from the role table
+        self.assertEqual(self.assignment_api.get_roles([role_id]), [role])
+        # Update role back via the assignment api manager
+        self.assignment_api.update_role(role_id, role)
+        self.assertEqual(self.assignment_api.get_roles([role_id]), [role])
+        # Delete role via the assignment api manager
+        self.assignment_api.delete_role(role_id)
+        self.assertRaises(exception.RoleNotFound,
+                          self.assignment_api.get_roles,
+                          [role_id])
+
     def test_cache_layer_role_crud(self):
         role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
         role_id = role['id']
@@ -2623,7 +2722,7 @@ class TokenTests(object):
         data = {'id': token_id, 'a': 'b',
                 'trust_id': None,
                 'user': {'id': 'testuserid'}}
-        data_ref = self.token_api.create_token(token_id, data)
+        data_ref = self.token_api.create_token(token_id, data).copy()
         expires = data_ref.pop('expires')
         data_ref.pop('user_id')
         self.assertTrue(isinstance(expires, datetime.datetime))
@@ -2631,7 +2730,7 @@ class TokenTests(object):
         data.pop('id')
         self.assertDictEqual(data_ref, data)
 
-        new_data_ref = self.token_api.get_token(token_id)
+        new_data_ref = self.token_api.get_token(token_id).copy()
         expires = new_data_ref.pop('expires')
         self.assertTrue(isinstance(expires, datetime.datetime))
         new_data_ref.pop('user_id')
@@ -2645,6 +2744,18 @@ class TokenTests(object):
         self.assertRaises(exception.TokenNotFound,
                           self.token_api.delete_token, token_id)
 
+    def test_token_ref_is_frozen(self):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': {'b': ['c']},
+                'user': {'id': 'testuserid'}}
+        data_ref = self.token_api.create_token(token_id, data)
+        data['a']['b'].append('d')
+
+        for token_ref in (data_ref, self.token_api.get_token(token_id)):
+            self.assertEqual(token_ref['a'], {'b': ['c']})
+            self.assertRaises(TypeError, token_ref.__setitem__, 'a', 'b')
+            self.assertRaises(TypeError, token_ref['a']['b'].append, 'd')
+
     def create_token_sample_data(self, tenant_id=None, trust_id=None,
                                  user_id='testuserid',
                                  trustee_user_id='testuserid2'):
@@ -2778,7 +2889,7 @@ class TokenTests(object):
                 'expires': expire_time,
                 'trust_id': None,
                 'user': {'id': 'testuserid'}}
-        data_ref = self.token_api.create_token(token_id, data)
+        data_ref = self.token_api.create_token(token_id, data).copy()
         data_ref.pop('user_id')
         self.assertDictEqual(data_ref, data)
         self.assertRaises(exception.TokenNotFound,
@@ -2788,9 +2899,9 @@ class TokenTests(object):
         token_id = uuid.uuid4().hex
         data = {'id': token_id, 'id_hash': token_id, 'a': 'b', 'expires': None,
                 'user': {'id': 'testuserid'}}
-        data_ref = self.token_api.create_token(token_id, data)
+        data_ref = self.token_api.create_token(token_id, data).copy()
         self.assertIsNotNone(data_ref['expires'])
-        new_data_ref = self.token_api.get_token(token_id)
+        new_data_ref = self.token_api.get_token(token_id).copy()
 
         # MySQL doesn't store microseconds, so discard them before testing
         data_ref['expires'] = data_ref['expires'].replace(microsecond=0)
@@ -2838,7 +2949,7 @@ class TokenTests(object):
                 'expires': expire_time,
                 'trust_id': None,
                 'user': {'id': 'testuserid'}}
-        data_ref = self.token_api.create_token(token_id, data)
+        data_ref = self.token_api.create_token(token_id, data).copy()
         data_ref.pop('user_id')
         self.assertDictEqual(data_ref, data)
 
@@ -2848,7 +2959,7 @@ class TokenTests(object):
                 'expires': expire_time,
                 'trust_id': None,
                 'user': {'id': 'testuserid'}}
-        data_ref = self.token_api.create_token(token_id, data)
+        data_ref = self.token_api.create_token(token_id, data).copy()
         data_ref.pop('user_id')
         self.assertDictEqual(data_ref, data)
 
@@ -2892,6 +3003,30 @@ class TokenTests(object):
         self.assertIn(token_id, revoked_tokens)
         self.assertIn(token2_id, revoked_tokens)
 
+    def test_list_revoked_tokens_since(self):
+        token_id = self.create_token_sample_data()
+        token2_id = self.create_token_sample_data()
+        token3_id = self.create_token_sample_data(tenant_id='testtenantid')
+        sequence = self.token_api.get_revocation_sequence()
+
+        self.token_api.delete_token(token_id)
+        after_first = self.token_api.get_revocation_sequence()
+        self.assertTrue(after_first > sequence)
+        self.token_api.delete_tokens('testuserid', tenant_id='testtenantid')
+        after_second = self.token_api.get_revocation_sequence()
+        self.assertTrue(after_second > after_first)
+
+        revoked = [x['id'] for x in
+                   self.token_api.driver.list_revoked_tokens(since=sequence)]
+        self.assertEqual(sorted(revoked), sorted([token_id, token3_id]))
+        revoked = [x['id'] for x in self.token_api.driver.list_revoked_tokens(
+            since=after_first)]
+        self.assertEqual(revoked, [token3_id])
+        self.assertEqual(
+            self.token_api.driver.list_revoked_tokens(since=after_second), [])
+        self.assertNotIn(token2_id, [x['id'] for x in
+                                     self.token_api.list_revoked_tokens()])
+
     def test_predictable_revoked_pki_token_id(self):
         token_id = self._create_token_id()
         token_id_hash = hashlib.md5(token_id).hexdigest()
@@ -3142,6 +3277,31 @@ class CommonHelperTests(tests.TestCase):
                           "http://%(foo)",
                           {"foo": "1"})
 
+    def test_url_template_binds_configuration_values(self):
+        template = core.compile_url(
+            'http://$(host)s:$(port)d/v1/$(tenant_id)s/$(user_id)s?a=%%20',
+            {'host': 'localhost', 'port': 8774})
+        self.assertEqual(template.variables,
+                         frozenset(['host', 'port', 'tenant_id', 'user_id']))
+        self.assertEqual(template.render({'tenant_id': 't', 'user_id': 'u'}),
+                         'http://localhost:8774/v1/t/u?a=%20')
+        self.assertEqual(
+            template.render({'tenant_id': 't2', 'user_id': 'u2'}),
+            core.format_url(template.url, {'host': 'localhost', 'port': 8774,
+                                           'tenant_id': 't2',
+                                           'user_id': 'u2'}))
+
+    def test_url_template_raises_malformed_when_rendered(self):
+        template = core.compile_url('http://$(foo)s/$(bar)s', {'foo': '1'})
+        self.assertRaises(exception.MalformedEndpoint,
+                          template.render,
+                          {'tenant_id': 't', 'user_id': 'u'})
+
+    def test_url_template_of_no_url(self):
+        template = core.compile_url(None, {})
+        self.assertIsNone(template.render({'tenant_id': 't',
+                                           'user_id': 'u'}))
+
 
 class CatalogTests(object):
     def test_service_crud(self):
@@ -23,7 +23,6 @@ import memcache
 from keystone.common import utils
 from keystone import config
 from keystone import exception
-from keystone.openstack.common import jsonutils
 from keystone.openstack.common import timeutils
 from keystone import tests
 from keystone.tests import default_fixtures
@@ -43,18 +42,27 @@ class MemcacheClient(object):
         self.cache = {}
         self.reject_cas = False
 
-    def add(self, key, value):
+    def add(self, key, value, time=0):
         if self.get(key):
             return False
-        return self.set(key, value)
+        return self.set(key, value, time=time)
 
     def append(self, key, value):
         existing_value = self.get(key)
         if existing_value:
-            self.set(key, existing_value + value)
+            # Like memcache, appending does not change the expiration time.
+            self.set(key, existing_value + value, time=self.cache[key][1])
             return True
         return False
 
+    def incr(self, key, delta=1):
+        value = self.get(key)
+        if value is None:
+            return None
+        value = int(value) + delta
+        self.set(key, str(value), time=self.cache[key][1])
+        return value
+
     def check_key(self, key):
         if not isinstance(key, str):
             raise memcache.Client.MemcachedStringEncodingError()
@@ -79,6 +87,17 @@ class MemcacheClient(object):
             data_copy = copy.deepcopy(obj[0])
             return data_copy
 
+    def get_multi(self, keys):
+        """Retrieves the values for the keys that are set."""
+        # Call the class methods so that tests stubbing get() on an instance
+        # only see the calls made by the code under test.
+        values = {}
+        for key in keys:
+            value = MemcacheClient.get(self, key)
+            if value is not None:
+                values[key] = value
+        return values
+
     def set(self, key, value, time=0):
         """Sets the value for a key."""
         self.check_key(key)
@@ -111,6 +130,11 @@ class MemcacheClient(object):
             #NOTE(bcwaldon): python-memcached always returns the same value
             pass
 
+    def delete_multi(self, keys):
+        for key in keys:
+            MemcacheClient.delete(self, key)
+        return True
+
 
 class MemcacheToken(tests.TestCase, test_backend.TokenTests):
     def setUp(self):
@@ -122,6 +146,51 @@ class MemcacheToken(tests.TestCase, test_backend.TokenTests):
         self.token_man.driver = token_memcache.Token(client=fake_client)
         self.token_api = self.token_man
 
+    def test_delete_tokens_batches_memcache_calls(self):
+        token_ids = [self.create_token_sample_data() for i in range(3)]
+        calls = []
+        fake_client = self.token_api.driver.client
+
+        def recording(name, method):
+            def record_call(*args, **kwargs):
+                calls.append(name)
+                return method(*args, **kwargs)
+            return record_call
+
+        for name in ['get', 'get_multi', 'delete', 'delete_multi', 'append']:
+            self.stubs.Set(fake_client, name,
+                           recording(name, getattr(fake_client, name)))
+
+        self.token_api.delete_tokens('testuserid')
+        self.assertEqual(calls.count('delete_multi'), 1)
+        self.assertEqual(calls.count('append'), 1)
+        self.assertNotIn('delete', calls)
+
+        revoked = self.token_api.driver.list_revoked_tokens()
+        self.assertEqual(sorted(x['id'] for x in revoked), sorted(token_ids))
+        self.assertEqual(sorted(x['seq'] for x in revoked), [1, 2, 3])
+        for token_id in token_ids:
+            self.assertRaises(exception.TokenNotFound,
+                              self.token_api.get_token, token_id)
+
+    def test_revocation_sequence_waits_for_reserved_entries(self):
+        token_id = self.create_token_sample_data()
+        token2_id = self.create_token_sample_data()
+        driver = self.token_api.driver
+
+        # another process has reserved a sequence number but not yet added
+        # its entry to the list
+        driver._next_revocation_sequence()
+        self.token_api.delete_token(token_id)
+        self.assertEqual(driver.get_revocation_sequence(), 0)
+
+        driver._add_to_revocation_list([{'id': token2_id, 'expires': None,
+                                         'seq': 1}])
+        self.assertEqual(driver.get_revocation_sequence(), 2)
+        revoked = driver.list_revoked_tokens(since=0)
+        self.assertEqual(sorted(x['id'] for x in revoked),
+                         sorted([token_id, token2_id]))
+
     def test_create_unicode_token_id(self):
         token_id = unicode(self._create_token_id())
         data = {'id': token_id, 'a': 'b',
@@ -145,71 +214,100 @@ class MemcacheToken(tests.TestCase, test_backend.TokenTests):
         self.assertRaises(exception.NotImplemented,
                           self.token_api.flush_expired_tokens)
 
-    def test_cleanup_user_index_on_create(self):
-        valid_token_id = uuid.uuid4().hex
-        second_valid_token_id = uuid.uuid4().hex
-        expired_token_id = uuid.uuid4().hex
+    def _create_user_token(self, user_id, expires=None):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b', 'user': {'id': user_id},
+                'expires': expires}
+        self.token_api.create_token(token_id, data)
+        return token_id
+
+    def test_user_index_bucket_size(self):
+        self.opt_in_group('memcache', token_index_bucket_size=2)
+        user_id = unicode(uuid.uuid4().hex)
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        token_ids = [self._create_user_token(user_id, expires)
+                     for i in range(5)]
+
+        driver = self.token_api.driver
+        window = driver._index_window(expires)
+        buckets = [driver.client.get(
+            driver._prefix_index_bucket(user_id, window, bucket))
+            for bucket in range(4)]
+        self.assertEqual([len(b.split(',')) for b in buckets[:3]], [2, 2, 1])
+        self.assertIsNone(buckets[3])
+        self.assertEqual(driver.list_tokens(user_id), token_ids)
+
+    def test_user_index_expires_with_window(self):
+        user_id = unicode(uuid.uuid4().hex)
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        token_id = self._create_user_token(user_id, expires)
+
+        driver = self.token_api.driver
+        window = driver._index_window(expires)
+        bucket_key = driver._prefix_index_bucket(user_id, window, 0)
+        count_key = driver._prefix_index_count(user_id, window)
+        self.assertEqual(driver.client.get(bucket_key),
+                         '%s:%d' % (token_id, utils.unixtime(expires)))
+        window_end = driver._index_window_end(window)
+        self.assertTrue(window_end >= utils.unixtime(expires))
+        self.assertEqual(driver.client.cache[bucket_key][1], window_end)
+        self.assertEqual(driver.client.cache[count_key][1], window_end)
+
+    def test_list_tokens_skips_expired_index_entries(self):
         user_id = unicode(uuid.uuid4().hex)
+        valid_token_id = self._create_user_token(user_id)
+        self._create_user_token(
+            user_id, timeutils.utcnow() - datetime.timedelta(minutes=1))
 
-        expire_delta = datetime.timedelta(seconds=86400)
-
-        valid_data = {'id': valid_token_id, 'a': 'b',
-                      'user': {'id': user_id}}
-        second_valid_data = {'id': second_valid_token_id, 'a': 'b',
-                             'user': {'id': user_id}}
-        expired_data = {'id': expired_token_id, 'a': 'b',
-                        'user': {'id': user_id}}
-        self.token_api.create_token(valid_token_id, valid_data)
-        self.token_api.create_token(expired_token_id, expired_data)
-        # NOTE(morganfainberg): Directly access the data cache since we need to
-        # get expired tokens as well as valid tokens. token_api.list_tokens()
-        # will not return any expired tokens in the list.
-        user_key = self.token_api.driver._prefix_user_id(user_id)
-        user_token_list = self.token_api.driver.client.get(user_key)
-        self.assertEqual(len(user_token_list), 2)
-        # user_token_list is a list of (token, expiry) tuples
-        expired_idx = [i[0] for i in user_token_list].index(expired_token_id)
-        # set the token as expired.
-        user_token_list[expired_idx] = (user_token_list[expired_idx][0],
-                                        timeutils.utcnow() - expire_delta)
-        self.token_api.driver.client.set(user_key, user_token_list)
-
-        self.token_api.create_token(second_valid_token_id, second_valid_data)
-        user_token_list = self.token_api.driver.client.get(user_key)
-        self.assertEqual(len(user_token_list), 2)
-
-    def test_convert_token_list_from_json(self):
-        token_list = ','.join(['"%s"' % uuid.uuid4().hex for x in xrange(5)])
-        token_list_loaded = jsonutils.loads('[%s]' % token_list)
-        converted_list = self.token_api.driver._convert_user_index_from_json(
-            token_list, 'test-key')
-        for idx, item in enumerate(converted_list):
-            token_id, expiry = item
-            self.assertEqual(token_id, token_list_loaded[idx])
-            self.assertIsInstance(expiry, datetime.datetime)
-
-    def test_convert_token_list_from_json_non_string(self):
-        token_list = self.token_api.driver._convert_user_index_from_json(
-            None, 'test-key')
-        self.assertEqual([], token_list)
-
-    def test_convert_token_list_from_json_invalid_json(self):
-        token_list = self.token_api.driver._convert_user_index_from_json(
-            'invalid_json_list', 'test-key')
-        self.assertEqual([], token_list)
+        gets = []
+        fake_client = self.token_api.driver.client
+        get_multi = fake_client.get_multi
 
-    def test_cas_failure(self):
-        expire_delta = datetime.timedelta(seconds=86400)
-        self.token_api.driver.client.reject_cas = True
+        def record_get_multi(keys):
+            gets.extend(keys)
+            return get_multi(keys)
+
+        self.stubs.Set(fake_client, 'get_multi', record_get_multi)
+        self.assertEqual(self.token_api.driver.list_tokens(user_id),
+                         [valid_token_id])
+        token_keys = [key for key in gets if key.startswith('token-')]
+        self.assertEqual(token_keys, ['token-%s' % valid_token_id])
+
+    def test_list_tokens_expiring_after_token_expiration(self):
+        user_id = unicode(uuid.uuid4().hex)
+        expires = timeutils.utcnow() + datetime.timedelta(
+            seconds=CONF.token.expiration * 3)
+        token_id = self._create_user_token(user_id, expires)
+        self.assertEqual(self.token_api.driver.list_tokens(user_id),
+                         [token_id])
+
+    def test_list_tokens_from_legacy_user_index(self):
+        user_id = unicode(uuid.uuid4().hex)
         token_id = uuid.uuid4().hex
+        expiry = timeutils.utcnow() + datetime.timedelta(seconds=86400)
+        driver = self.token_api.driver
+        driver.client.set(driver._prefix_token_id(token_id),
+                          {'id': token_id, 'expires': expiry,
+                           'user': {'id': user_id}})
+        user_key = driver._prefix_user_id(user_id)
+
+        # Tokens were listed as (token_id, expiry) tuples, and before that
+        # as a JSON string of token ids.
+        driver.client.set(user_key, [(token_id, expiry)])
+        self.assertEqual(driver.list_tokens(user_id), [token_id])
+        driver.client.set(user_key, '"%s"' % token_id)
+        self.assertEqual(driver.list_tokens(user_id), [token_id])
+
+    def test_cas_failure(self):
         user_id = unicode(uuid.uuid4().hex)
-        token_data = {'expires': timeutils.utcnow() + expire_delta,
-                      'id': token_id}
-        user_key = self.token_api.driver._prefix_user_id(user_id)
-        self.assertRaises(
-            exception.UnexpectedError,
-            self.token_api.driver._update_user_list_with_cas,
-            user_key, token_id, token_data)
+        expires = timeutils.utcnow() + datetime.timedelta(
+            seconds=CONF.token.expiration * 3)
+        self._create_user_token(user_id, expires)
+
+        self.token_api.driver.client.reject_cas = True
+        self.assertRaises(exception.UnexpectedError,
+                          self._create_user_token, user_id,
+                          expires + datetime.timedelta(days=1))
 
     def test_token_expire_timezone(self):
 
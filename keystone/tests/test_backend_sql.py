@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import uuid
 
 import sqlalchemy
@@ -23,6 +24,7 @@ from keystone import config
 from keystone import exception
 from keystone.identity.backends import sql as identity_sql
 from keystone.openstack.common.fixture import moxstubout
+from keystone.openstack.common import timeutils
 from keystone import tests
 from keystone.tests import default_fixtures
 from keystone.tests import test_backend
@@ -118,29 +120,13 @@ class SqlModels(SqlTests):
                 ('name', sql.String, 255))
         self.assertExpectedSchema('role', cols)
 
-    def test_user_project_metadata_model(self):
-        cols = (('user_id', sql.String, 64),
-                ('project_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('user_project_metadata', cols)
-
-    def test_user_domain_metadata_model(self):
-        cols = (('user_id', sql.String, 64),
-                ('domain_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('user_domain_metadata', cols)
-
-    def test_group_project_metadata_model(self):
-        cols = (('group_id', sql.String, 64),
-                ('project_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('group_project_metadata', cols)
-
-    def test_group_domain_metadata_model(self):
-        cols = (('group_id', sql.String, 64),
-                ('domain_id', sql.String, 64),
-                ('data', sql.JsonBlob, None))
-        self.assertExpectedSchema('group_domain_metadata', cols)
+    def test_assignment_model(self):
+        cols = (('type', sql.Enum, None),
+                ('actor_id', sql.String, 64),
+                ('target_id', sql.String, 64),
+                ('role_id', sql.String, 64),
+                ('inherited', sql.Boolean, None))
+        self.assertExpectedSchema('assignment', cols)
 
     def test_user_group_membership(self):
         cols = (('group_id', sql.String, 64),
@@ -330,6 +316,75 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
         self.assertEqual(arbitrary_value, ref[arbitrary_key])
         self.assertEqual(arbitrary_value, ref['extra'][arbitrary_key])
 
+    def test_list_projects_for_user_in_many_groups(self):
+        # Have the groups of the user split across several IN clauses.
+        self.stubs.Set(sql, 'IN_CLAUSE_SIZE', 2)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'password': uuid.uuid4().hex, 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_user(user['id'], user)
+        self.identity_api.create_grant(user_id=user['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=self.role_member['id'])
+        project_ids = set([self.tenant_bar['id']])
+        for i in range(5):
+            group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                     'domain_id': DEFAULT_DOMAIN_ID}
+            self.identity_api.create_group(group['id'], group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            project = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                       'domain_id': DEFAULT_DOMAIN_ID}
+            self.assignment_api.create_project(project['id'], project)
+            self.identity_api.create_grant(group_id=group['id'],
+                                           project_id=project['id'],
+                                           role_id=self.role_member['id'])
+            project_ids.add(project['id'])
+        # The same project through more than one group is listed once.
+        self.identity_api.create_grant(group_id=group['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=self.role_member['id'])
+
+        user_projects = self.assignment_api.list_projects_for_user(user['id'])
+        self.assertEqual(sorted(x['id'] for x in user_projects),
+                         sorted(project_ids))
+
+    def test_get_roles_for_user_in_many_groups(self):
+        # Have the groups of the user split across several IN clauses.
+        self.stubs.Set(sql, 'IN_CLAUSE_SIZE', 2)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'password': uuid.uuid4().hex, 'domain_id': DEFAULT_DOMAIN_ID}
+        self.identity_api.create_user(user['id'], user)
+        self.identity_api.create_grant(user_id=user['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=self.role_member['id'])
+        role_ids = set([self.role_member['id']])
+        group_ids = []
+        for i in range(5):
+            group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                     'domain_id': DEFAULT_DOMAIN_ID}
+            self.identity_api.create_group(group['id'], group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            group_ids.append(group['id'])
+            role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+            self.assignment_api.create_role(role['id'], role)
+            self.identity_api.create_grant(group_id=group['id'],
+                                           project_id=self.tenant_bar['id'],
+                                           role_id=role['id'])
+            self.identity_api.create_grant(group_id=group['id'],
+                                           domain_id=DEFAULT_DOMAIN_ID,
+                                           role_id=role['id'])
+            role_ids.add(role['id'])
+
+        roles = self.assignment_api.get_roles_for_user_and_project(
+            user['id'], self.tenant_bar['id'])
+        self.assertEqual(sorted(roles), sorted(role_ids))
+        roles = self.assignment_api.get_roles_for_user_and_domain(
+            user['id'], DEFAULT_DOMAIN_ID)
+        self.assertEqual(sorted(roles),
+                         sorted(role_ids - set([self.role_member['id']])))
+        assignments = self.assignment_api.list_role_assignments(
+            user_id=user['id'], group_ids=group_ids)
+        self.assertEqual(len(assignments), 11)
+
     def test_sql_user_to_dict_null_default_project_id(self):
         user_id = uuid.uuid4().hex
         user = {
@@ -372,6 +427,119 @@ class SqlToken(SqlTests, test_backend.TokenTests):
         self.mox.ReplayAll()
         tok.list_revoked_tokens()
 
+    def _create_expiring_token(self, expires):
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(token_id, {'id': token_id,
+                                               'expires': expires,
+                                               'user': {'id': 'testuserid'}})
+        return token_id
+
+    def _stored_token_ids(self):
+        session = self.token_api.driver.get_session()
+        return set(row.id for row in session.query(token_sql.TokenModel.id))
+
+    def test_token_bucket(self):
+        self.opt_in_group('token', expiry_bucket_size=60)
+        expires = datetime.datetime(2013, 10, 1, 12, 30, 15, 7)
+        token_id = self._create_expiring_token(expires)
+        session = self.token_api.driver.get_session()
+        token_ref = session.query(token_sql.TokenModel).get(token_id)
+        self.assertEqual(token_ref.bucket,
+                         datetime.datetime(2013, 10, 1, 12, 31))
+        self.assertNotIn('bucket', self.token_api.driver.get_token(token_id))
+
+    def test_flush_expired_tokens_by_bucket(self):
+        now = timeutils.utcnow()
+        self.opt_in_group('token', expiry_bucket_size=60)
+        expired_id = self._create_expiring_token(
+            now - datetime.timedelta(hours=1))
+        valid_id = self._create_expiring_token(
+            now + datetime.timedelta(hours=1))
+        # This bucket has not ended yet, so its token stays for now.
+        self.opt_in_group('token', expiry_bucket_size=366 * 86400)
+        unflushed_id = self._create_expiring_token(
+            now - datetime.timedelta(seconds=1))
+
+        self.token_api.flush_expired_tokens()
+        stored_ids = self._stored_token_ids()
+        self.assertNotIn(expired_id, stored_ids)
+        self.assertEqual(stored_ids, set([valid_id, unflushed_id]))
+
+    def test_delete_tokens_by_tenant_and_consumer_columns(self):
+        def create_token(**extra):
+            token_id = uuid.uuid4().hex
+            data = dict(extra, id=token_id, user={'id': 'testuserid'})
+            self.token_api.create_token(token_id, data)
+            return token_id
+
+        tenant_token = create_token(tenant={'id': 'tenant1'})
+        consumer_token = create_token(
+            tenant=None,
+            token_data={'token': {'OS-OAUTH1': {'consumer_id': 'consumer1'}}})
+        v2_token = create_token(token_data={'access': {}})
+
+        session = self.token_api.driver.get_session()
+        columns = dict(
+            (token_id, (tenant_id, consumer_id))
+            for token_id, tenant_id, consumer_id in session.query(
+                token_sql.TokenModel.id,
+                token_sql.TokenModel.tenant_id,
+                token_sql.TokenModel.consumer_id))
+        self.assertEqual(columns, {tenant_token: ('tenant1', None),
+                                   consumer_token: (None, 'consumer1'),
+                                   v2_token: (None, None)})
+
+        # the consumer takes precedence over the tenant
+        self.assertEqual(
+            self.token_api.list_tokens('testuserid', tenant_id='tenant1',
+                                       consumer_id='consumer1'),
+            [consumer_token])
+        self.token_api.delete_tokens('testuserid', consumer_id='consumer1')
+        self.assertEqual(set(self.token_api.list_tokens('testuserid')),
+                         set([tenant_token, v2_token]))
+        self.token_api.delete_tokens('testuserid', tenant_id='tenant1')
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [v2_token])
+        revoked_ids = [t['id'] for t in self.token_api.list_revoked_tokens()]
+        self.assertEqual(set(revoked_ids),
+                         set([tenant_token, consumer_token]))
+
+    def test_flush_expired_tokens_batch(self):
+        now = timeutils.utcnow()
+        expired_ids = [
+            self._create_expiring_token(now - datetime.timedelta(minutes=i))
+            for i in range(3, 0, -1)]
+        valid_id = self._create_expiring_token(
+            now + datetime.timedelta(hours=1))
+
+        # The oldest tokens go first.
+        self.assertEqual(self.token_api.flush_expired_tokens_batch(2), 2)
+        self.assertEqual(self._stored_token_ids(),
+                         set([expired_ids[2], valid_id]))
+        self.assertEqual(self.token_api.flush_expired_tokens_batch(2), 1)
+        self.assertEqual(self.token_api.flush_expired_tokens_batch(2), 0)
+        self.assertEqual(self._stored_token_ids(), set([valid_id]))
+
+    def test_revocation_sequence_survives_flush(self):
+        now = timeutils.utcnow()
+        expired_id = self._create_expiring_token(
+            now - datetime.timedelta(minutes=1))
+        self.token_api.delete_token(expired_id)
+        sequence = self.token_api.get_revocation_sequence()
+
+        self.token_api.flush_expired_tokens()
+        session = self.token_api.driver.get_session()
+        self.assertEqual(
+            session.query(token_sql.RevocationLogModel).count(), 0)
+        self.assertEqual(self.token_api.get_revocation_sequence(), sequence)
+
+        valid_id = self._create_expiring_token(
+            now + datetime.timedelta(hours=1))
+        self.token_api.delete_token(valid_id)
+        self.assertEqual(self.token_api.get_revocation_sequence(),
+                         sequence + 1)
+        revoked = self.token_api.driver.list_revoked_tokens(since=sequence)
+        self.assertEqual([t['id'] for t in revoked], [valid_id])
+
 
 class SqlCatalog(SqlTests, test_backend.CatalogTests):
     def test_malformed_catalog_throws_error(self):
@@ -424,6 +592,49 @@ class SqlCatalog(SqlTests, test_backend.CatalogTests):
         self.assertIsNone(catalog_endpoint.get('adminURL'))
         self.assertIsNone(catalog_endpoint.get('internalURL'))
 
+    def test_get_catalog_is_cached_until_endpoint_change(self):
+        service = {
+            'id': uuid.uuid4().hex,
+            'type': uuid.uuid4().hex,
+            'name': uuid.uuid4().hex,
+            'description': uuid.uuid4().hex,
+        }
+        self.catalog_api.create_service(service['id'], service.copy())
+
+        endpoint = {
+            'id': uuid.uuid4().hex,
+            'region': uuid.uuid4().hex,
+            'interface': 'public',
+            'url': 'http://localhost/v2/$(tenant_id)s',
+            'service_id': service['id'],
+        }
+        self.catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
+
+        stats = self.catalog_api.get_catalog_cache_stats()
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(catalog[endpoint['region']][service['type']]
+                         ['publicURL'], 'http://localhost/v2/tenant')
+        self.assertEqual(self.catalog_api.get_catalog('user', 'tenant'),
+                         catalog)
+        self.assertEqual(self.catalog_api.get_catalog_cache_stats(),
+                         {'hits': stats['hits'] + 1,
+                          'misses': stats['misses'] + 1})
+
+        # A different tenant gets a catalog of its own.
+        catalog = self.catalog_api.get_catalog('user', 'other')
+        self.assertEqual(catalog[endpoint['region']][service['type']]
+                         ['publicURL'], 'http://localhost/v2/other')
+
+        endpoint['url'] = 'http://remotehost/v2/$(tenant_id)s'
+        self.catalog_api.update_endpoint(endpoint['id'], endpoint.copy())
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(catalog[endpoint['region']][service['type']]
+                         ['publicURL'], 'http://remotehost/v2/tenant')
+
+        self.catalog_api.delete_endpoint(endpoint['id'])
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertNotIn(endpoint['region'], catalog)
+
     def test_create_endpoint_400(self):
         service = {
             'id': uuid.uuid4().hex,
@@ -452,7 +663,52 @@ class SqlPolicy(SqlTests, test_backend.PolicyTests):
 
 
 class SqlInheritance(SqlTests, test_backend.InheritanceTests):
-    pass
+    def test_effective_roles_for_many_groups(self):
+        self.opt_in_group('os_inherit', enabled=True)
+        domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.assignment_api.create_domain(domain['id'], domain)
+        project = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                   'domain_id': domain['id']}
+        self.assignment_api.create_project(project['id'], project)
+        user = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                'domain_id': domain['id'], 'password': uuid.uuid4().hex,
+                'enabled': True}
+        self.identity_api.create_user(user['id'], user)
+
+        project_roles = set()
+        domain_roles = set()
+        for i in range(5):
+            group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                     'domain_id': domain['id']}
+            self.identity_api.create_group(group['id'], group)
+            self.identity_api.add_user_to_group(user['id'], group['id'])
+            for grant in ({'project_id': project['id']},
+                          {'domain_id': domain['id']},
+                          {'domain_id': domain['id'],
+                           'inherited_to_projects': True}):
+                role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+                self.assignment_api.create_role(role['id'], role)
+                self.assignment_api.create_grant(
+                    role['id'], group_id=group['id'], **grant)
+                if 'project_id' in grant or 'inherited_to_projects' in grant:
+                    project_roles.add(role['id'])
+                else:
+                    domain_roles.add(role['id'])
+
+        # The roles are resolved with bulk queries, not grant by grant.
+        def _get_metadata(*args, **kwargs):
+            self.fail('Grants were looked up one at a time')
+        self.stubs.Set(self.assignment_api.driver, '_get_metadata',
+                       _get_metadata)
+
+        self.assertEqual(
+            set(self.assignment_api.get_roles_for_user_and_project(
+                user['id'], project['id'])),
+            project_roles)
+        self.assertEqual(
+            set(self.assignment_api.get_roles_for_user_and_domain(
+                user['id'], domain['id'])),
+            domain_roles)
 
 
 class SqlTokenCacheInvalidation(SqlTests, test_backend.TokenCacheInvalidation):
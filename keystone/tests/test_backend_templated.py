@@ -59,9 +59,11 @@ class TestTemplatedCatalog(tests.TestCase, test_backend.CatalogTests):
         self.assertDictEqual(catalog_ref, self.DEFAULT_FIXTURE)
 
     def test_malformed_catalog_throws_error(self):
-        (self.catalog_api.driver.templates
-         ['RegionOne']['compute']['adminURL']) = \
-            'http://localhost:$(compute_port)s/v1.1/$(tenant)s'
+        # The templates are compiled when they are set.
+        templates = self.catalog_api.driver.templates
+        templates['RegionOne']['compute']['adminURL'] = (
+            'http://localhost:$(compute_port)s/v1.1/$(tenant)s')
+        self.catalog_api.driver.templates = templates
         self.assertRaises(exception.MalformedEndpoint,
                           self.catalog_api.get_catalog,
                           'fake-user',
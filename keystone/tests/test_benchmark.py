@@ -0,0 +1,82 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import testtools
+
+from keystone import tests
+from keystone.tests import benchmark
+
+
+# Each benchmark scenario sets up and tears down a full test fixture of
+# its own, so these tests must not be wrapped in another one.
+class BenchmarkTests(testtools.TestCase):
+    def test_measure(self):
+        calls = []
+        result = benchmark.measure(lambda: calls.append(None), 10, warmup=5)
+        self.assertEqual(len(calls), 16 if benchmark.tracemalloc else 15)
+        self.assertEqual(result['iterations'], 10)
+        self.assertTrue(result['p50_ms'] <= result['p99_ms'])
+        self.assertIn('ops_per_sec', result)
+        self.assertIn('gc_objects_retained_per_call', result)
+
+    def test_run_every_scenario(self):
+        output = tests.tmpdir('benchmark.json')
+        self.addCleanup(os.unlink, output)
+        benchmark.main(['--iterations', '2', '--warmup', '0',
+                        '--output', output])
+        with open(output) as f:
+            document = json.load(f)
+
+        results = document['results']
+        self.assertEqual(len(results),
+                         len(benchmark.BACKENDS) * len(benchmark.PROVIDERS) *
+                         len(benchmark.OPERATIONS))
+        for result in results:
+            self.assertEqual(result['iterations'], 2)
+            self.assertTrue(result['ops_per_sec'] > 0)
+
+    def test_run_catalog(self):
+        output = tests.tmpdir('benchmark.json')
+        self.addCleanup(os.unlink, output)
+        benchmark.main(['--catalog', '--iterations', '2', '--warmup', '0',
+                        '--output', output])
+        with open(output) as f:
+            document = json.load(f)
+
+        results = document['results']
+        self.assertEqual([r['operation'] for r in results],
+                         benchmark.CATALOG_OPERATIONS)
+        for result in results:
+            self.assertEqual(result['services'], benchmark.CATALOG_SERVICES)
+            self.assertEqual(result['regions'], benchmark.CATALOG_REGIONS)
+            self.assertTrue(result['ops_per_sec'] > 0)
+
+    def test_run_policy(self):
+        output = tests.tmpdir('benchmark.json')
+        self.addCleanup(os.unlink, output)
+        benchmark.main(['--policy', '--iterations', '2', '--warmup', '0',
+                        '--output', output])
+        with open(output) as f:
+            document = json.load(f)
+
+        results = document['results']
+        self.assertEqual([r['operation'] for r in results],
+                         benchmark.POLICY_OPERATIONS)
+        for result in results:
+            self.assertEqual(result['action'], benchmark.POLICY_ACTION)
+            self.assertTrue(result['ops_per_sec'] > 0)
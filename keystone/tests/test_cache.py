@@ -182,6 +182,28 @@ class CacheRegionTest(tests.TestCase):
                           "bogus")
 
 
+class CacheOnArgumentsTest(tests.TestCase):
+    def test_invalidate_multi(self):
+        calls = []
+
+        class Lookup(object):
+            @cache.on_arguments()
+            def get(self, key):
+                calls.append(key)
+                return key
+
+        lookup = Lookup()
+        for key in ['a', 'b', 'c', 'a', 'b', 'c']:
+            lookup.get(key)
+        self.assertEqual(calls, ['a', 'b', 'c'])
+
+        cache.invalidate_multi([lookup.get.key_generator(lookup, 'a'),
+                                lookup.get.key_generator(lookup, 'b')])
+        for key in ['a', 'b', 'c']:
+            lookup.get(key)
+        self.assertEqual(calls, ['a', 'b', 'c', 'a', 'b'])
+
+
 class CacheNoopBackendTest(tests.TestCase):
     def __init__(self, *args, **kwargs):
         super(CacheNoopBackendTest, self).__init__(*args, **kwargs)
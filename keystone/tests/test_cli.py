@@ -0,0 +1,128 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import StringIO
+import sys
+import time
+
+from keystone import cli
+from keystone import tests
+
+
+class FakeCommand(object):
+    def __init__(self, batch_size=None, sleep=0, max_runtime=None):
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.max_runtime = max_runtime
+
+
+class FakeConf(object):
+    def __init__(self, **kwargs):
+        self.command = FakeCommand(**kwargs)
+
+
+class FakeTokenDriver(object):
+    """Deletes batches of the given sizes, each taking batch_time seconds."""
+
+    def __init__(self, clock, counts, batch_time=0):
+        self.clock = clock
+        self.counts = list(counts)
+        self.batch_time = batch_time
+        self.batches = []
+        self.flushed = False
+
+    def flush_expired_tokens(self):
+        self.flushed = True
+
+    def flush_expired_tokens_batch(self, batch_size):
+        self.batches.append(batch_size)
+        self.clock.now += self.batch_time
+        return self.counts.pop(0)
+
+
+class FakeTokenManager(object):
+    def __init__(self, driver):
+        self.driver = driver
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenFlushTestCase(tests.TestCase):
+    def setUp(self):
+        super(TokenFlushTestCase, self).setUp()
+        self.clock = FakeClock()
+        self.stubs.Set(time, 'time', self.clock.time)
+        self.stubs.Set(time, 'sleep', self.clock.sleep)
+        self.output = StringIO.StringIO()
+        self.stubs.Set(sys, 'stdout', self.output)
+
+    def flush(self, counts, batch_time=0, **kwargs):
+        driver = FakeTokenDriver(self.clock, counts, batch_time)
+        self.stubs.Set(cli, 'CONF', FakeConf(**kwargs))
+        self.stubs.Set(cli.token, 'Manager',
+                       lambda: FakeTokenManager(driver))
+        cli.TokenFlush.main()
+        return driver, self.output.getvalue().splitlines()
+
+    def test_flush_at_once(self):
+        driver, lines = self.flush([])
+        self.assertTrue(driver.flushed)
+        self.assertEqual(driver.batches, [])
+        self.assertEqual(lines, [])
+
+    def test_flush_in_batches(self):
+        driver, lines = self.flush([10, 10, 3], batch_size=10, sleep=0.5)
+        self.assertFalse(driver.flushed)
+        self.assertEqual(driver.batches, [10, 10, 10])
+        # there is no wait after the last, partial batch
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Deleted 10 expired tokens', lines[0])
+        self.assertIn('20 in total', lines[1])
+        self.assertIn('Deleted 3 expired tokens', lines[2])
+        self.assertIn('23 in total', lines[2])
+
+    def test_flush_ends_on_empty_batch(self):
+        driver, lines = self.flush([10, 10, 0], batch_size=10)
+        self.assertEqual(driver.batches, [10, 10, 10])
+        self.assertIn('20 in total', lines[-1])
+
+    def test_flush_stops_at_max_runtime(self):
+        driver, lines = self.flush([10] * 10, batch_time=1, batch_size=10,
+                                   max_runtime=2.5)
+        # the third batch ends 3 seconds in, past the maximum runtime
+        self.assertEqual(driver.batches, [10, 10, 10])
+        self.assertEqual(len(lines), 4)
+        self.assertIn('30 in total', lines[2])
+        self.assertIn('maximum runtime of 2.5 seconds', lines[3])
+
+    def test_flush_sleeps_count_towards_max_runtime(self):
+        driver, lines = self.flush([10] * 10, batch_size=10, sleep=1,
+                                   max_runtime=2)
+        self.assertEqual(driver.batches, [10, 10, 10])
+        self.assertEqual(self.clock.sleeps, [1, 1])
+        self.assertIn('maximum runtime of 2 seconds', lines[-1])
@@ -0,0 +1,96 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+from keystone.common import cms
+from keystone.common import environment
+from keystone import tests
+
+
+SIGNING_CERT = tests.rootdir('examples', 'pki', 'certs', 'signing_cert.pem')
+SIGNING_KEY = tests.rootdir('examples', 'pki', 'private', 'signing_key.pem')
+CA_CERT = tests.rootdir('examples', 'pki', 'certs', 'cacert.pem')
+
+TOKEN_DATA = {'access': {'token': {'id': 'placeholder',
+                                   'expires': '2013-10-16T22:17:24Z'},
+                         'user': {'id': 'foo', 'name': 'FOO',
+                                  'roles': [{'name': 'admin'}]}}}
+
+class CmsEngineTests(tests.TestCase):
+    def setUp(self):
+        super(CmsEngineTests, self).setUp()
+        if cms.x509 is None:
+            self.skipTest('cryptography is not installed')
+        cms.reset_engines()
+        self.subprocess_engine = cms.SubprocessEngine(
+            SIGNING_CERT, SIGNING_KEY, CA_CERT)
+        self.cryptography_engine = cms.CryptographyEngine(
+            SIGNING_CERT, SIGNING_KEY, CA_CERT)
+
+    def tearDown(self):
+        cms.reset_engines()
+        super(CmsEngineTests, self).tearDown()
+
+    def test_signed_token_is_byte_compatible(self):
+        text = json.dumps(TOKEN_DATA)
+        self.assertEqual(self.subprocess_engine.sign(text),
+                         self.cryptography_engine.sign(text))
+
+    def test_signed_text_is_byte_compatible(self):
+        text = 'first line\nsecond line\r\n\nlast line'
+        self.assertEqual(self.subprocess_engine.sign(text),
+                         self.cryptography_engine.sign(text))
+
+    def test_cross_verify(self):
+        text = json.dumps(TOKEN_DATA)
+        signed = self.subprocess_engine.sign(text)
+        self.assertEqual(text, self.cryptography_engine.verify(signed))
+        signed = self.cryptography_engine.sign(text)
+        self.assertEqual(text, self.subprocess_engine.verify(signed))
+
+    def test_verify_tampered_document_fails(self):
+        signed = self.cryptography_engine.sign(json.dumps(TOKEN_DATA))
+        der = cms._unpem(signed).replace('FOO', 'BAR')
+        tampered = cms._pem(der, 'CMS')
+        for engine in (self.subprocess_engine, self.cryptography_engine):
+            self.assertRaises(environment.subprocess.CalledProcessError,
+                              engine.verify, tampered)
+
+    def test_sign_token_uses_configured_engine(self):
+        self.opt_in_group('signing',
+                          engine='keystone.common.cms.CryptographyEngine')
+        text = json.dumps(TOKEN_DATA)
+        token_id = cms.cms_sign_token(text, SIGNING_CERT, SIGNING_KEY)
+        self.assertIsInstance(cms._get_engine(SIGNING_CERT, SIGNING_KEY),
+                              cms.CryptographyEngine)
+        self.assertEqual(text, cms.verify_token(token_id, SIGNING_CERT,
+                                                CA_CERT))
+
+    def test_engine_is_loaded_once(self):
+        engine = cms._get_engine(SIGNING_CERT, SIGNING_KEY)
+        self.assertIs(engine, cms._get_engine(SIGNING_CERT, SIGNING_KEY))
+
+    def test_fallback_to_subprocess_engine(self):
+        self.stubs.Set(cms, 'x509', None)
+        self.opt_in_group('signing',
+                          engine='keystone.common.cms.CryptographyEngine')
+        engine = cms._get_engine(SIGNING_CERT, SIGNING_KEY)
+        self.assertIsInstance(engine, cms.SubprocessEngine)
+        text = json.dumps(TOKEN_DATA)
+        self.assertEqual(self.cryptography_engine.sign(text),
+                         cms.cms_sign_text(text, SIGNING_CERT, SIGNING_KEY))
+
@@ -51,6 +51,17 @@ class TokenAuthMiddlewareTest(tests.TestCase):
         context = req.environ[middleware.CONTEXT_ENV]
         self.assertEqual(context['token_id'], 'MAGIC')
 
+    def test_request_auth_context(self):
+        req = make_request()
+        req.headers[middleware.AUTH_TOKEN_HEADER] = 'MAGIC'
+        req.headers[middleware.SUBJECT_TOKEN_HEADER] = 'SUBJECT'
+        middleware.TokenAuthMiddleware(None).process_request(req)
+        context = req.environ[middleware.CONTEXT_ENV]
+        auth_context = context[middleware.AUTH_CONTEXT_ENV]
+        self.assertEqual(auth_context.token_id, 'MAGIC')
+        self.assertEqual(auth_context.subject_token_id, 'SUBJECT')
+        self.assertIsNone(auth_context.credentials)
+
 
 class AdminTokenAuthMiddlewareTest(tests.TestCase):
     def test_request_admin(self):
@@ -115,6 +115,30 @@ class NotificationsWrapperTestCase(tests.TestCase):
             ArbitraryException, self.delete_exception, uuid.uuid4().hex)
         self.assertFalse(self.send_notification_called)
 
+    def test_event_callback(self):
+        callbacks = []
+
+        def callback(operation, resource_type, resource_id):
+            callbacks.append((operation, resource_type, resource_id))
+
+        self.stubs.Set(notifications, '_SUBSCRIBERS', {})
+        notifications.register_event_callback('deleted', EXP_RESOURCE_TYPE,
+                                              callback)
+        self.exp_operation = 'deleted'
+        self.exp_resource_id = uuid.uuid4().hex
+        self.delete_resource(self.exp_resource_id)
+        self.assertEqual(
+            callbacks,
+            [('deleted', EXP_RESOURCE_TYPE, self.exp_resource_id)])
+        self.assertRaises(
+            ArbitraryException, self.delete_exception, uuid.uuid4().hex)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_event_callback_unknown_operation(self):
+        self.assertRaises(ValueError,
+                          notifications.register_event_callback,
+                          'replaced', EXP_RESOURCE_TYPE, lambda *args: None)
+
 
 class NotificationsTestCase(tests.TestCase):
     def test_send_notification(self):
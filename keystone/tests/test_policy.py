@@ -56,6 +56,22 @@ class PolicyFileTestCase(tests.TestCase):
         self.assertRaises(exception.ForbiddenAction, rules.enforce,
                           empty_credentials, action, self.target)
 
+    def test_policy_file_checked_after_interval(self):
+        self.opt_in_group('policy', file_check_interval=3600)
+        action = "example:test"
+        empty_credentials = {}
+        with open(self.tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": []}""")
+        rules.enforce(empty_credentials, action, self.target)
+        with open(self.tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": ["false:false"]}""")
+        # The file is not looked at again until the interval has passed.
+        rules._POLICY_CACHE['mtime'] = None
+        rules.enforce(empty_credentials, action, self.target)
+        rules._POLICY_CACHE['next_check'] = 0
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          empty_credentials, action, self.target)
+
 
 class PolicyTestCase(tests.TestCase):
     def setUp(self):
@@ -204,3 +220,76 @@ class DefaultPolicyTestCase(tests.TestCase):
         self._set_rules(new_default_rule)
         self.assertRaises(exception.ForbiddenAction, rules.enforce,
                           self.credentials, "example:noexist", {})
+
+
+class CompiledPolicyTestCase(tests.TestCase):
+    def setUp(self):
+        super(CompiledPolicyTestCase, self).setUp()
+        rules.reset()
+        self.opt(policy_file=tests.etcdir('policy.v3cloudsample.json'))
+        rules.init()
+
+    def tearDown(self):
+        rules.reset()
+        super(CompiledPolicyTestCase, self).tearDown()
+
+    def _check_tree(self, action, target, credentials):
+        try:
+            return rules._ENFORCER.rules[action](target, credentials,
+                                                 rules._ENFORCER)
+        except KeyError:
+            return False
+
+    def test_same_results_as_check_tree(self):
+        credentials = [
+            {},
+            {'roles': []},
+            {'roles': ['Admin'], 'user_id': 'u1', 'domain_id': 'd1'},
+            {'roles': ['admin'], 'user_id': 'u1',
+             'domain_id': 'admin_domain_id'},
+            {'roles': ['service'], 'user_id': 'u2'},
+            {'roles': ['member'], 'user_id': 'u1', 'domain_id': 'd1'}]
+        targets = [
+            {},
+            {'user_id': 'u1', 'domain_id': 'd1',
+             'target.user.domain_id': 'd1',
+             'target.project.domain_id': 'd2',
+             'target.entity.user_id': 'u2'}]
+        for action in rules._ENFORCER.rules.keys() + ['example:noexist']:
+            for creds in credentials:
+                for target in targets:
+                    self.assertEqual(
+                        bool(rules.enforce(creds, action, target,
+                                           do_raise=False)),
+                        bool(self._check_tree(action, target, creds)),
+                        action)
+
+    def test_pure_rules(self):
+        evaluator = rules._get_evaluator()
+        self.assertTrue(evaluator._is_pure_rule('admin_required'))
+        self.assertTrue(evaluator._is_pure_rule('cloud_admin'))
+        self.assertFalse(evaluator._is_pure_rule('owner'))
+        self.assertFalse(evaluator._is_pure_rule('admin_or_owner'))
+
+    def test_pure_rule_evaluated_once(self):
+        evaluator = rules._get_evaluator()
+        admin_required = evaluator._functions['admin_required']
+        calls = []
+
+        def counting_admin_required(target, creds, memo):
+            calls.append(None)
+            return admin_required(target, creds, memo)
+
+        evaluator._functions['admin_required'] = counting_admin_required
+        # admin_or_cloud_admin refers to admin_required both directly and
+        # through cloud_admin.
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          {'roles': ['member']}, 'identity:get_service', {})
+        self.assertEqual(len(calls), 1)
+
+    def test_rules_set_on_enforcer_are_compiled(self):
+        rules._ENFORCER.set_rules(common_policy.Rules(
+            {'example:allowed': common_policy.parse_rule('@')}))
+        rules.enforce({}, 'example:allowed', {})
+        self.assertRaises(exception.ForbiddenAction, rules.enforce,
+                          {'roles': ['admin']}, 'identity:get_service', {})
@@ -26,6 +26,7 @@ To run these tests against a live database:
     all data will be lost.
 """
 import copy
+import datetime
 import json
 import uuid
 
@@ -1348,6 +1349,169 @@ class SqlUpgradeTests(SqlMigrateBase):
                       for idx in table.indexes]
         self.assertNotIn(('ix_token_valid', ['valid']), index_data)
 
+    def test_upgrade_add_token_revocation_log(self):
+        self.upgrade(36)
+        self.assertTableDoesNotExist('token_revocation_log')
+        self.upgrade(37)
+        self.assertTableExists('token_revocation_log')
+        self.assertTableColumns('token_revocation_log',
+                                ['seq', 'token_id', 'expires'])
+        self.assertTableColumns('token_revocation_sequence', ['id', 'seq'])
+        sequence_table = sqlalchemy.Table('token_revocation_sequence',
+                                          self.metadata, autoload=True)
+        self.assertEqual([(1, 0)], list(self.engine.execute(
+            sequence_table.select())))
+        self.downgrade(36)
+        self.assertTableDoesNotExist('token_revocation_log')
+        self.assertTableDoesNotExist('token_revocation_sequence')
+
+    def test_upgrade_add_token_bucket(self):
+        self.upgrade(37)
+        self.opt_in_group('token', expiry_bucket_size=3600)
+        expires = [datetime.datetime(2013, 10, 1, 12, 30),
+                   datetime.datetime(2013, 10, 1, 12, 59, 59),
+                   datetime.datetime(2013, 10, 3, 8, 0)]
+        session = self.Session()
+        for i, token_expires in enumerate(expires):
+            self.insert_dict(session, 'token', {'id': 'token%s' % i,
+                                                'expires': token_expires,
+                                                'extra': '{}',
+                                                'valid': True,
+                                                'user_id': 'user1',
+                                                'trust_id': None})
+        session.commit()
+        session.close()
+
+        self.upgrade(38)
+        # The token table was reflected before the bucket column existed.
+        table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                 autoload=True, autoload_with=self.engine)
+        self.assertIn('bucket', table.c)
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(('ix_token_bucket', ['bucket']), index_data)
+        buckets = dict((token.id, token.bucket) for token in
+                       self.engine.execute(table.select()))
+        self.assertEqual(buckets,
+                         {'token0': datetime.datetime(2013, 10, 1, 13, 0),
+                          'token1': datetime.datetime(2013, 10, 1, 13, 0),
+                          'token2': datetime.datetime(2013, 10, 3, 9, 0)})
+
+        self.downgrade(37)
+        table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                 autoload=True, autoload_with=self.engine)
+        self.assertNotIn('bucket', table.c)
+
+    def test_upgrade_add_token_tenant_consumer_columns(self):
+        self.upgrade(38)
+        extras = {
+            'token1': {'tenant': {'id': 'tenant1'}},
+            'token2': {'tenant': None,
+                       'token_data': {'token': {
+                           'OS-OAUTH1': {'consumer_id': 'consumer1'}}}},
+            'token3': {'token_data': {'access': {}}},
+        }
+        session = self.Session()
+        for token_id, extra in extras.items():
+            self.insert_dict(session, 'token', {'id': token_id,
+                                                'expires': None,
+                                                'extra': json.dumps(extra),
+                                                'valid': True,
+                                                'user_id': 'user1',
+                                                'trust_id': None})
+        session.close()
+
+        self.upgrade(39)
+        table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                 autoload=True, autoload_with=self.engine)
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(('ix_token_tenant_id', ['tenant_id']), index_data)
+        self.assertIn(('ix_token_consumer_id', ['consumer_id']), index_data)
+        tokens = dict((token.id, (token.tenant_id, token.consumer_id))
+                      for token in self.engine.execute(table.select()))
+        self.assertEqual(tokens, {'token1': ('tenant1', None),
+                                  'token2': (None, 'consumer1'),
+                                  'token3': (None, None)})
+
+        self.downgrade(38)
+        table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                 autoload=True, autoload_with=self.engine)
+        self.assertNotIn('tenant_id', table.c)
+        self.assertNotIn('consumer_id', table.c)
+
+    def test_upgrade_assignment_table(self):
+        self.upgrade(39)
+        session = self.Session()
+        domain_id = uuid.uuid4().hex
+        project_id = uuid.uuid4().hex
+        self.insert_dict(session, 'domain', {'id': domain_id,
+                                             'name': domain_id,
+                                             'enabled': True,
+                                             'extra': '{}'})
+        self.insert_dict(session, 'project', {'id': project_id,
+                                              'name': project_id,
+                                              'domain_id': domain_id,
+                                              'enabled': True,
+                                              'extra': '{}'})
+        role_ids = []
+        for i in range(2):
+            role_ids.append(uuid.uuid4().hex)
+            self.insert_dict(session, 'role', {'id': role_ids[-1],
+                                               'name': role_ids[-1],
+                                               'extra': '{}'})
+        roles = {'roles': [{'id': role_ids[0]}, {'id': role_ids[1]}]}
+        self.insert_dict(session, 'user_project_metadata',
+                         {'user_id': 'user1', 'project_id': project_id,
+                          'data': json.dumps(roles)})
+        inherited = {'roles': [{'id': role_ids[0],
+                                'inherited_to': 'projects'}]}
+        self.insert_dict(session, 'group_domain_metadata',
+                         {'group_id': 'group1', 'domain_id': domain_id,
+                          'data': json.dumps(inherited)})
+        # a grant of a role that has since been deleted is dropped
+        deleted = {'roles': [{'id': uuid.uuid4().hex}]}
+        self.insert_dict(session, 'user_domain_metadata',
+                         {'user_id': 'user1', 'domain_id': domain_id,
+                          'data': json.dumps(deleted)})
+        session.close()
+
+        self.upgrade(40)
+        for table_name in ['user_project_metadata', 'user_domain_metadata',
+                           'group_project_metadata', 'group_domain_metadata']:
+            self.assertTableDoesNotExist(table_name)
+        table = sqlalchemy.Table('assignment', sqlalchemy.MetaData(),
+                                 autoload=True, autoload_with=self.engine)
+        index_data = [(idx.name, idx.columns.keys())
+                      for idx in table.indexes]
+        self.assertIn(('ix_assignment_actor_id_target_id',
+                       ['actor_id', 'target_id']), index_data)
+        self.assertIn(('ix_assignment_target_id', ['target_id']), index_data)
+        self.assertIn(('ix_assignment_role_id', ['role_id']), index_data)
+        assignments = set((a.type, a.actor_id, a.target_id, a.role_id,
+                           a.inherited)
+                          for a in self.engine.execute(table.select()))
+        self.assertEqual(assignments, set([
+            ('UserProject', 'user1', project_id, role_ids[0], False),
+            ('UserProject', 'user1', project_id, role_ids[1], False),
+            ('GroupDomain', 'group1', domain_id, role_ids[0], True)]))
+
+        self.downgrade(39)
+        self.assertTableDoesNotExist('assignment')
+        table = sqlalchemy.Table('user_project_metadata',
+                                 sqlalchemy.MetaData(), autoload=True,
+                                 autoload_with=self.engine)
+        grant = self.engine.execute(table.select()).fetchone()
+        self.assertEqual((grant.user_id, grant.project_id),
+                         ('user1', project_id))
+        self.assertItemsEqual(json.loads(grant.data)['roles'],
+                              roles['roles'])
+        table = sqlalchemy.Table('group_domain_metadata',
+                                 sqlalchemy.MetaData(), autoload=True,
+                                 autoload_with=self.engine)
+        grant = self.engine.execute(table.select()).fetchone()
+        self.assertEqual(json.loads(grant.data), inherited)
+
     def test_migrate_ec2_credential(self):
         user = {
             'id': 'foo',
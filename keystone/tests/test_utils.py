@@ -29,11 +29,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import datetime
 import functools
 import os
+import pickle
 import time
 
+from keystone.common import environment
 from keystone.common import utils
 from keystone import tests
 
@@ -86,6 +89,54 @@ class UtilsTestCase(tests.TestCase):
         self.assertTrue(utils.check_password(password, hashed))
         self.assertFalse(utils.check_password(wrong, hashed))
 
+    def _check_hash_pool(self, kind):
+        self.opt_in_group('identity', password_hash_workers=2,
+                          password_hash_pool=kind)
+        self.opt(crypt_strength=1000)
+        # stops the workers, once the pool is no longer configured
+        self.addCleanup(utils._get_password_hash_pool)
+        self.addCleanup(self.opt_in_group, 'identity',
+                        password_hash_workers=0)
+
+        hashed = utils.hash_password('right')
+        self.assertTrue(utils.check_password('right', hashed))
+        self.assertFalse(utils.check_password('wrong', hashed))
+        self.assertRaises(ValueError,
+                          utils.check_password, 'right', 'not a hash')
+
+        metrics = utils.get_password_hash_metrics()
+        self.assertEqual(metrics['kind'], kind)
+        self.assertEqual(metrics['calls'], 4)
+        self.assertEqual(metrics['queued'], 0)
+        self.assertEqual(metrics['running'], 0)
+
+    def test_hash_thread_pool(self):
+        self._check_hash_pool('thread')
+
+    def test_hash_process_pool(self):
+        self._check_hash_pool('process')
+
+    def test_hash_pool_closed_while_busy(self):
+        pool = utils.PasswordHashPool(1, 'process')
+        self.addCleanup(pool.close)
+        workers = []
+        execute = environment.execute
+
+        def close_and_execute(func, *args):
+            workers.append(func.im_self)
+            pool.close()
+            return execute(func, *args)
+        self.stubs.Set(environment, 'execute', close_and_execute)
+
+        hashed = pool.run(utils._sha512_crypt_encrypt, 'right', 1000)
+        self.assertTrue(utils._sha512_crypt_verify('right', hashed))
+        # the busy worker is stopped instead of going back to the pool
+        self.assertFalse(workers[0].is_alive())
+        self.assertIsNone(pool._idle.get(block=False))
+
+    def test_hash_invalid_pool(self):
+        self.assertRaises(ValueError, utils.PasswordHashPool, 2, 'fork')
+
     def test_auth_str_equal(self):
         self.assertTrue(utils.auth_str_equal('abc123', 'abc123'))
         self.assertFalse(utils.auth_str_equal('a', 'aaaaa'))
@@ -106,6 +157,64 @@ class UtilsTestCase(tests.TestCase):
             TZ = 'UTC' + d
             _test_unixtime()
 
+    def test_freeze(self):
+        value = {'a': [{'b': 1}], 'c': 'd'}
+        frozen = utils.freeze(value)
+        self.assertEqual(frozen, value)
+        self.assertRaises(TypeError, frozen.__setitem__, 'c', 'e')
+        self.assertRaises(TypeError, frozen['a'].append, 2)
+        self.assertRaises(TypeError, frozen['a'][0].pop, 'b')
+        self.assertIs(utils.freeze(frozen), frozen)
+        self.assertIs(copy.deepcopy(frozen), frozen)
+
+        thawed = frozen.copy()
+        thawed['c'] = 'e'
+        self.assertEqual(frozen['c'], 'd')
+        thawed = utils.thaw(frozen)
+        thawed['a'][0]['b'] = 2
+        self.assertEqual(frozen['a'][0]['b'], 1)
+
+    def test_freeze_pickle(self):
+        frozen = utils.freeze({'a': [{'b': 1}]})
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(frozen, protocol))
+            self.assertEqual(loaded, frozen)
+            self.assertIsInstance(loaded, utils.FrozenDict)
+            self.assertIsInstance(loaded['a'], utils.FrozenList)
+            self.assertIsInstance(loaded['a'][0], utils.FrozenDict)
+
+    def test_chunked(self):
+        self.assertEqual(utils.chunked(range(5), 2), [[0, 1], [2, 3], [4]])
+        self.assertEqual(utils.chunked([], 2), [])
+
+    def test_lru_cache(self):
+        lru = utils.LRUCache(2, 60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)
+        # 'b' is now the least recently used entry
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        lru.invalidate('a')
+        self.assertIsNone(lru.get('a'))
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+
+    def test_lru_cache_expiry(self):
+        lru = utils.LRUCache(2, 60)
+        now = time.time()
+        lru.set('a', 1)
+        self.stubs.Set(time, 'time', lambda: now + 61)
+        self.assertIsNone(lru.get('a'))
+
+    def test_lru_cache_disabled(self):
+        for size, ttl in ((0, 60), (2, 0)):
+            lru = utils.LRUCache(size, ttl)
+            lru.set('a', 1)
+            self.assertIsNone(lru.get('a'))
+
 
 class LimitingReaderTests(tests.TestCase):
 
@@ -21,6 +21,7 @@ from keystone import config
 from keystone import exception
 from keystone import tests
 from keystone.tests import test_v3
+from keystone.token.providers import uuid as uuid_provider
 
 
 CONF = config.CONF
@@ -1185,6 +1186,90 @@ class TestAuthJSON(test_v3.RestfulTestCase):
         r = self.post('/auth/tokens', body=auth_data)
         self.assertValidProjectScopedTokenResponse(r)
 
+    def test_project_scoped_token_data_is_cached(self):
+        # the default token is requested by user name, so get one before the
+        # user is renamed
+        token = self.get_scoped_token()
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'],
+            project_id=self.project['id'])
+        self.post('/auth/tokens', body=auth_data, token=token)
+
+        catalog_lookups = []
+        get_v3_catalog = self.catalog_api.get_v3_catalog
+
+        def counting_get_v3_catalog(user_id, tenant_id, metadata=None):
+            catalog_lookups.append(tenant_id)
+            return get_v3_catalog(user_id, tenant_id, metadata)
+
+        self.stubs.Set(self.catalog_api, 'get_v3_catalog',
+                       counting_get_v3_catalog)
+        r = self.post('/auth/tokens', body=auth_data, token=token)
+        self.assertValidProjectScopedTokenResponse(r)
+        self.assertEqual(catalog_lookups, [])
+
+        # updating the user drops the cached token data
+        user_name = uuid.uuid4().hex
+        self.patch('/users/%(user_id)s' % {'user_id': self.user['id']},
+                   body={'user': {'name': user_name}}, token=token)
+        r = self.post('/auth/tokens', body=auth_data, token=token)
+        token_data = self.assertValidProjectScopedTokenResponse(r)
+        self.assertEqual(token_data['user']['name'], user_name)
+        self.assertEqual(catalog_lookups, [self.project['id']])
+
+    def test_token_data_cached_without_catalog_caching(self):
+        self.opt_in_group('catalog', caching=False)
+        token = self.get_scoped_token()
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'],
+            project_id=self.project['id'])
+        self.post('/auth/tokens', body=auth_data, token=token)
+
+        populated = []
+        catalog_lookups = []
+        helper_class = uuid_provider.V3TokenDataHelper
+        populate_scoped_data = helper_class._populate_scoped_data
+        get_v3_catalog = self.catalog_api.get_v3_catalog
+
+        def counting_populate_scoped_data(helper, *args, **kwargs):
+            populated.append(args)
+            return populate_scoped_data(helper, *args, **kwargs)
+
+        def counting_get_v3_catalog(user_id, tenant_id, metadata=None):
+            catalog_lookups.append(tenant_id)
+            return get_v3_catalog(user_id, tenant_id, metadata)
+
+        self.stubs.Set(helper_class, '_populate_scoped_data',
+                       counting_populate_scoped_data)
+        self.stubs.Set(self.catalog_api, 'get_v3_catalog',
+                       counting_get_v3_catalog)
+        for i in range(2):
+            r = self.post('/auth/tokens', body=auth_data, token=token)
+            self.assertValidProjectScopedTokenResponse(r)
+
+        # the rest of the token data comes from the cache, while the catalog
+        # is rendered for each token
+        self.assertEqual(populated, [])
+        self.assertEqual(catalog_lookups, [self.project['id']] * 2)
+
+    def test_cached_token_data_follows_grants(self):
+        token = self.get_scoped_token()
+        auth_data = self.build_authentication_request(
+            user_id=self.user['id'],
+            password=self.user['password'],
+            project_id=self.project['id'])
+        self.post('/auth/tokens', body=auth_data, token=token)
+        self.delete(
+            '/projects/%(project_id)s/users/%(user_id)s/roles/%(role_id)s' % {
+                'user_id': self.user['id'],
+                'project_id': self.project['id'],
+                'role_id': self.role['id']},
+            token=token)
+        self.post('/auth/tokens', body=auth_data, token=token,
+                  expected_status=401)
+
     def test_default_project_id_scoped_token_with_user_id(self):
         # create a second project to work with
         ref = self.new_project_ref(domain_id=self.domain_id)
@@ -402,6 +402,25 @@ class IdentityTestCase(test_v3.RestfulTestCase):
             body={'user': ref})
         return self.assertValidUserResponse(r, ref)
 
+    def test_create_user_loads_token_once(self):
+        """Call ``POST /users`` without a domain, counting token loads."""
+        token = self.get_scoped_token()
+        token_ids = []
+        get_token = self.token_api.get_token
+
+        def counting_get_token(token_id):
+            token_ids.append(token_id)
+            return get_token(token_id)
+
+        self.stubs.Set(self.token_api, 'get_token', counting_get_token)
+        ref = self.new_user_ref(domain_id=self.domain_id)
+        del ref['domain_id']
+        r = self.post('/users', body={'user': ref}, token=token)
+        self.assertEqual(r.result['user']['domain_id'],
+                         controller.DEFAULT_DOMAIN_ID)
+        # RBAC and the domain of the new user share the one load
+        self.assertEqual(token_ids, [token])
+
     def test_create_user_400(self):
         """Call ``POST /users``."""
         self.post('/users', body={'user': {}}, expected_status=400)
@@ -14,9 +14,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import copy
-
 from keystone.common import kvs
+from keystone.common import utils
 from keystone import exception
 from keystone.openstack.common import log as logging
 from keystone.openstack.common import timeutils
@@ -42,28 +41,64 @@ class Token(kvs.Base, token.Driver):
     def get_token(self, token_id):
         try:
             ref = self.db.get('token-%s' % token_id)
-            return copy.deepcopy(ref)
+            return utils.freeze(ref)
         except Exception:
             # On any issues here, Token is not found.
             raise exception.TokenNotFound(token_id=token_id)
 
     def create_token(self, token_id, data):
-        data_copy = copy.deepcopy(data)
+        data_copy = dict(data)
         data_copy['id'] = token_id
         if not data_copy.get('expires'):
             data_copy['expires'] = token.default_expire_time()
         if not data_copy.get('user_id'):
             data_copy['user_id'] = data_copy['user']['id']
-        self.db.set('token-%s' % token_id, data_copy)
-        return copy.deepcopy(data_copy)
+        token_ref = utils.freeze(data_copy)
+        self.db.set('token-%s' % token_id, token_ref)
+        return token_ref
 
     def delete_token(self, token_id):
         try:
-            token_ref = self.get_token(token_id)
-            self.db.delete('token-%s' % token_id)
-            self.db.set('revoked-token-%s' % token_id, token_ref)
+            token_ref = self._revoke_token(token_id)
         except exception.NotFound:
             raise exception.TokenNotFound(token_id=token_id)
+        self._log_revocations([token_ref])
+
+    def _revoke_token(self, token_id):
+        token_ref = self.db.get('token-%s' % token_id)
+        self.db.delete('token-%s' % token_id)
+        self.db.set('revoked-token-%s' % token_id, token_ref)
+        return token_ref
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
+                      consumer_id=None):
+        revoked = []
+        for token_id in self.list_tokens(user_id, tenant_id=tenant_id,
+                                         trust_id=trust_id,
+                                         consumer_id=consumer_id):
+            try:
+                revoked.append(self._revoke_token(token_id))
+            except exception.NotFound:
+                pass
+        self._log_revocations(revoked)
+
+    def _get_revocation_log(self):
+        return self.db.get('revocation-log', {'sequence': 0, 'revoked': []})
+
+    def _log_revocations(self, token_refs):
+        if not token_refs:
+            return
+        revocation_log = self._get_revocation_log()
+        sequence = revocation_log['sequence']
+        records = []
+        for token_ref in token_refs:
+            sequence += 1
+            records.append({'seq': sequence,
+                            'id': token_ref['id'],
+                            'expires': token_ref['expires']})
+        self.db.set('revocation-log',
+                    {'sequence': sequence,
+                     'revoked': revocation_log['revoked'] + records})
 
     def is_not_expired(self, now, ref):
         return not ref.get('expires') and ref.get('expires') < now
@@ -136,8 +171,15 @@ class Token(kvs.Base, token.Driver):
         else:
             return self._list_tokens_for_user(user_id, tenant_id)
 
-    def list_revoked_tokens(self):
+    def list_revoked_tokens(self, since=None):
         tokens = []
+        if since is not None:
+            now = timeutils.utcnow()
+            for record in self._get_revocation_log()['revoked']:
+                if record['seq'] > since and not self.is_expired(now, record):
+                    tokens.append({'id': record['id'],
+                                   'expires': record['expires']})
+            return tokens
         for token, token_ref in self.db.items():
             if not token.startswith('revoked-token-'):
                 continue
@@ -147,6 +189,9 @@ class Token(kvs.Base, token.Driver):
             tokens.append(record)
         return tokens
 
+    def get_revocation_sequence(self):
+        return self._get_revocation_log()['sequence']
+
     def flush_expired_tokens(self):
         now = timeutils.utcnow()
         for token, token_ref in self.db.items():
@@ -154,3 +199,8 @@ class Token(kvs.Base, token.Driver):
                 continue
             if self.is_expired(now, token_ref):
                 self.db.delete(token)
+        revocation_log = self._get_revocation_log()
+        self.db.set('revocation-log',
+                    {'sequence': revocation_log['sequence'],
+                     'revoked': [record for record in revocation_log['revoked']
+                                 if not self.is_expired(now, record)]})
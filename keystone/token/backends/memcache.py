@@ -15,7 +15,6 @@
 # under the License.
 
 from __future__ import absolute_import
-import copy
 import datetime
 
 import memcache
@@ -36,6 +35,7 @@ LOG = logging.getLogger(__name__)
 
 class Token(token.Driver):
     revocation_key = 'revocation-list'
+    revocation_sequence_key = 'revocation-sequence'
 
     def __init__(self, client=None):
         self._memcache_client = client
@@ -69,10 +69,11 @@ class Token(token.Driver):
         if token_ref is None:
             raise exception.TokenNotFound(token_id=token_id)
 
-        return token_ref
+        # Tokens stored before token references were frozen are plain dicts.
+        return utils.freeze(token_ref)
 
     def create_token(self, token_id, data):
-        data_copy = copy.deepcopy(data)
+        data_copy = dict(data)
         ptk = self._prefix_token_id(token_id)
         if not data_copy.get('expires'):
             data_copy['expires'] = token.default_expire_time()
@@ -82,12 +83,9 @@ class Token(token.Driver):
         if data_copy['expires'] is not None:
             expires_ts = utils.unixtime(data_copy['expires'])
             kwargs['time'] = expires_ts
+        data_copy = utils.freeze(data_copy)
         self.client.set(ptk, data_copy, **kwargs)
-        user_id = data['user']['id']
-        user_key = self._prefix_user_id(user_id)
-        # Append the new token_id to the token-index-list stored in the
-        # user-key within memcache.
-        self._update_user_list_with_cas(user_key, token_id, data_copy)
+        self._add_to_user_index(data['user']['id'], token_id, data_copy)
         if CONF.trust.enabled and data.get('trust_id'):
             # NOTE(morganfainberg): If trusts are enabled and this is a trust
             # scoped token, we add the token to the trustee list as well.  This
@@ -107,142 +105,192 @@ class Token(token.Driver):
                     _('Unknown token version %s') %
                     data_copy.get('token_version'))
 
-            trustee_key = self._prefix_user_id(trustee_user_id)
-            self._update_user_list_with_cas(trustee_key, token_id, data_copy)
-
-        return copy.deepcopy(data_copy)
-
-    def _convert_user_index_from_json(self, token_list, user_key):
-        try:
-            # NOTE(morganfainberg): Try loading in the old format
-            # of the list.
-            token_list = jsonutils.loads('[%s]' % token_list)
-
-            # NOTE(morganfainberg): Build a delta based upon the
-            # token TTL configured. Since we are using the old
-            # format index-list, we will create a "fake" expiration
-            # that should be further in the future than the actual
-            # expiry. To avoid locking up keystone trying to
-            # communicate to memcached, it is better to use a fake
-            # value. The logic that utilizes this list already
-            # knows how to handle the case of tokens that are
-            # no longer valid being included.
-            delta = datetime.timedelta(
-                seconds=CONF.token.expiration)
-            new_expiry = timeutils.normalize_time(
-                timeutils.utcnow()) + delta
-
-            for idx, token_id in enumerate(token_list):
-                token_list[idx] = (token_id, new_expiry)
-
-        except Exception:
-            # NOTE(morganfainberg): Catch any errors thrown here. There is
-            # nothing the admin or operator needs to do in this case, but
-            # it should be logged that there was an error and some action was
-            # taken to correct it
-            LOG.info(_('Unable to convert user-token-index to new format; '
-                       'clearing user token index record "%s".'), user_key)
-            token_list = []
-        return token_list
+            self._add_to_user_index(trustee_user_id, token_id, data_copy)
 
-    def _update_user_list_with_cas(self, user_key, token_id, token_data):
-        cas_retry = 0
-        max_cas_retry = CONF.memcache.max_compare_and_set_retry
+        return data_copy
+
+    def _index_window(self, expires):
+        return int(utils.unixtime(expires)) // CONF.memcache.token_index_window
+
+    def _index_window_end(self, window):
+        return (window + 1) * CONF.memcache.token_index_window
+
+    def _prefix_index_count(self, user_id, window):
+        return 'usertokencount-%d-%s' % (window, user_id.encode('utf-8'))
+
+    def _prefix_index_bucket(self, user_id, window, bucket):
+        return 'usertokenbucket-%d-%d-%s' % (window, bucket,
+                                             user_id.encode('utf-8'))
+
+    def _prefix_index_horizon(self, user_id):
+        return 'usertokenhorizon-%s' % user_id.encode('utf-8')
+
+    def _add_to_user_index(self, user_id, token_id, token_data):
+        """Record a token in the token index of a user.
+
+        The index is sharded by the time window the tokens expire in, and
+        each window into buckets of at most token_index_bucket_size entries.
+        An entry is the token id and its integer expiry timestamp, appended
+        to the bucket, so issuing a token never rewrites the existing index.
+        Buckets and counters expire with the last token they can hold.
+
+        """
+        window = self._index_window(token_data['expires'])
+        window_end = self._index_window_end(window)
+        # incr() hands out a unique slot in the window, which picks the
+        # bucket without reading it.
+        slot = self._increment(self._prefix_index_count(user_id, window),
+                               time=window_end)
+        bucket = (slot - 1) // CONF.memcache.token_index_bucket_size
+        entry = '%s:%d' % (token_id.encode('utf-8'),
+                           utils.unixtime(token_data['expires']))
+        self._append_to_list(
+            self._prefix_index_bucket(user_id, window, bucket), entry,
+            time=window_end)
+        self._extend_index_horizon(user_id, window)
+
+    def _extend_index_horizon(self, user_id, window):
+        """Make sure list_tokens looks at the windows up to ``window``.
+
+        The windows covered by the configured token expiration are always
+        looked at, the horizon only needs to be raised for tokens expiring
+        later than that.
+
+        """
         current_time = timeutils.normalize_time(timeutils.utcnow())
+        default_expiry = current_time + datetime.timedelta(
+            seconds=CONF.token.expiration)
+        if window <= self._index_window(default_expiry):
+            return
 
+        horizon_key = self._prefix_index_horizon(user_id)
+        cas_retry = 0
+        max_cas_retry = CONF.memcache.max_compare_and_set_retry
         self.client.reset_cas()
-
         while cas_retry <= max_cas_retry:
-            # NOTE(morganfainberg): cas or "compare and set" is a function of
-            # memcache. It will return false if the value has changed since the
-            # last call to client.gets(). This is the memcache supported method
-            # of avoiding race conditions on set().  Memcache is already atomic
-            # on the back-end and serializes operations.
-            #
-            # cas_retry is for tracking our iterations before we give up (in
-            # case memcache is down or something horrible happens we don't
-            # iterate forever trying to compare and set the new value.
             cas_retry += 1
-            token_list = self.client.gets(user_key)
-            filtered_list = []
-
-            if token_list is not None:
-                if not isinstance(token_list, list):
-                    token_list = self._convert_user_index_from_json(token_list,
-                                                                    user_key)
-                for token_i, expiry in token_list:
-                    expires_at = timeutils.normalize_time(expiry)
-                    if expires_at < current_time:
-                        # skip tokens that are expired.
-                        continue
+            horizon = self.client.gets(horizon_key)
+            if horizon is not None and int(horizon) >= window:
+                return
+            if horizon is None:
+                stored = self.client.add(horizon_key, str(window),
+                                         time=self._index_window_end(window))
+            else:
+                stored = self.client.cas(horizon_key, str(window),
+                                         time=self._index_window_end(window))
+            if stored:
+                return
+
+        error_msg = _('Unable to extend the token index of user "%s"')
+        raise exception.UnexpectedError(error_msg % user_id)
+
+    def _parse_user_index(self, user_id):
+        """Return (token_id, expiry timestamp) tuples for a user.
 
-                    # Add the still valid token_id to the list.
-                    filtered_list.append((token_i, expiry))
-            # Add the new token_id and expiry.
-            filtered_list.append(
-                (token_id, timeutils.normalize_time(token_data['expires'])))
-
-            # Use compare-and-set (cas) to set the new value for the
-            # token-index-list for the user-key. Cas is used to prevent race
-            # conditions from causing the loss of valid token ids from this
-            # list.
-            if self.client.cas(user_key, filtered_list):
-                msg = _('Successful set of token-index-list for user-key '
-                        '"%(user_key)s", #%(count)d records')
-                LOG.debug(msg, {'user_key': user_key,
-                                'count': len(filtered_list)})
-                return filtered_list
-
-            # The cas function will return true if it succeeded or false if it
-            # failed for any reason, including memcache server being down, cas
-            # id changed since gets() called (the data changed between when
-            # this loop started and this point, etc.
-            error_msg = _('Failed to set token-index-list for user-key '
-                          '"%(user_key)s". Attempt %(cas_retry)d of '
-                          '%(cas_retry_max)d')
-            LOG.debug(error_msg,
-                      {'user_key': user_key,
-                       'cas_retry': cas_retry,
-                       'cas_retry_max': max_cas_retry})
-
-        # Exceeded the maximum retry attempts.
-        error_msg = _('Unable to add token user list')
-        raise exception.UnexpectedError(error_msg)
-
-    def _add_to_revocation_list(self, data):
-        data_json = jsonutils.dumps(data)
-        if not self.client.append(self.revocation_key, ',%s' % data_json):
-            if not self.client.add(self.revocation_key, data_json):
-                if not self.client.append(self.revocation_key,
-                                          ',%s' % data_json):
-                    msg = _('Unable to add token to revocation list.')
-                    raise exception.UnexpectedError(msg)
+        Tokens recorded in the list format used before the index existed
+        are returned with an expiry of None.
+
+        """
+        current_window = self._index_window(timeutils.utcnow())
+        last_window = self._index_window(
+            timeutils.utcnow() + datetime.timedelta(
+                seconds=CONF.token.expiration))
+
+        user_key = self._prefix_user_id(user_id)
+        horizon_key = self._prefix_index_horizon(user_id)
+        values = self.client.get_multi([user_key, horizon_key])
+        if horizon_key in values:
+            last_window = max(last_window, int(values[horizon_key]))
+
+        token_list = []
+        legacy_list = values.get(user_key)
+        if legacy_list:
+            if not isinstance(legacy_list, list):
+                # NOTE(morganfainberg): This is for compatibility for
+                # old-format token-lists that were a JSON string of just
+                # token_ids. This code will reference the underlying expires
+                # directly from the token_ref.
+                legacy_list = [(i, None) for i in
+                               jsonutils.loads('[%s]' % legacy_list)]
+            for token_id, expiry in legacy_list:
+                if expiry is not None:
+                    expiry = utils.unixtime(expiry)
+                token_list.append((token_id, expiry))
+
+        windows = range(current_window, last_window + 1)
+        count_keys = [self._prefix_index_count(user_id, window)
+                      for window in windows]
+        counts = self.client.get_multi(count_keys)
+        bucket_keys = []
+        for window, count_key in zip(windows, count_keys):
+            if count_key not in counts:
+                continue
+            buckets = ((int(counts[count_key]) - 1) //
+                       CONF.memcache.token_index_bucket_size + 1)
+            bucket_keys.extend(
+                self._prefix_index_bucket(user_id, window, bucket)
+                for bucket in range(buckets))
+        buckets = self.client.get_multi(bucket_keys)
+        for bucket_key in bucket_keys:
+            if bucket_key not in buckets:
+                continue
+            for entry in buckets[bucket_key].split(','):
+                token_id, expiry = entry.rsplit(':', 1)
+                token_list.append((token_id.decode('utf-8'), int(expiry)))
+        return token_list
+
+    def _increment(self, key, delta=1, time=0):
+        """Increment a counter, creating it if needed, and return it."""
+        value = self.client.incr(key, delta)
+        if value is None:
+            # add() does nothing if another process created the counter in
+            # the meantime, in which case incr() still works.
+            self.client.add(key, '0', time=time)
+            value = self.client.incr(key, delta)
+            if value is None:
+                msg = _('Unable to increment the counter "%s".')
+                raise exception.UnexpectedError(msg % key)
+        return int(value)
+
+    def _append_to_list(self, key, data, time=0):
+        """Append to a comma separated list, creating it if needed."""
+        if not self.client.append(key, ',%s' % data):
+            if not self.client.add(key, data, time=time):
+                if not self.client.append(key, ',%s' % data):
+                    msg = _('Unable to append to the list "%s".')
+                    raise exception.UnexpectedError(msg % key)
+
+    def _add_to_revocation_list(self, revoked):
+        data_json = ','.join(jsonutils.dumps(data) for data in revoked)
+        self._append_to_list(self.revocation_key, data_json)
+
+    def _next_revocation_sequence(self, count=1):
+        """Reserve ``count`` sequence numbers and return the last one."""
+        return self._increment(self.revocation_sequence_key, count)
 
     def delete_token(self, token_id):
         # Test for existence
-        data = self.get_token(token_id)
+        data = self.get_token(token_id).copy()
         ptk = self._prefix_token_id(token_id)
         result = self.client.delete(ptk)
-        self._add_to_revocation_list(data)
+        data['seq'] = self._next_revocation_sequence()
+        self._add_to_revocation_list([data])
         return result
 
-    def list_tokens(self, user_id, tenant_id=None, trust_id=None,
-                    consumer_id=None):
-        tokens = []
-        user_key = self._prefix_user_id(user_id)
+    def _list_token_refs(self, user_id, tenant_id=None, trust_id=None,
+                         consumer_id=None):
         current_time = timeutils.normalize_time(timeutils.utcnow())
-        token_list = self.client.get(user_key) or []
-        if not isinstance(token_list, list):
-            # NOTE(morganfainberg): This is for compatibility for old-format
-            # token-lists that were a JSON string of just token_ids. This code
-            # will reference the underlying expires directly from the
-            # token_ref vs in this list, so setting to none just ensures the
-            # loop works as expected.
-            token_list = [(i, None) for i in
-                          jsonutils.loads('[%s]' % token_list)]
-        for token_id, expiry in token_list:
-            ptk = self._prefix_token_id(token_id)
-            token_ref = self.client.get(ptk)
+        now = utils.unixtime(current_time)
+        # Tokens known to have expired need not be fetched at all.
+        token_ids = [token_id for token_id, expiry in
+                     self._parse_user_index(user_id)
+                     if expiry is None or expiry >= now]
+        token_refs = self.client.get_multi(
+            [self._prefix_token_id(token_id) for token_id in token_ids])
+
+        tokens = []
+        for token_id in token_ids:
+            token_ref = token_refs.get(self._prefix_token_id(token_id))
             if token_ref:
                 if tenant_id is not None:
                     tenant = token_ref.get('tenant')
@@ -269,11 +317,58 @@ class Token(token.Driver):
                     # Skip expired tokens.
                     continue
 
-                tokens.append(token_id)
+                tokens.append((token_id, token_ref))
         return tokens
 
-    def list_revoked_tokens(self):
+    def list_tokens(self, user_id, tenant_id=None, trust_id=None,
+                    consumer_id=None):
+        return [token_id for token_id, token_ref in
+                self._list_token_refs(user_id, tenant_id, trust_id,
+                                      consumer_id)]
+
+    def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
+                      consumer_id=None):
+        token_refs = self._list_token_refs(user_id, tenant_id, trust_id,
+                                           consumer_id)
+        if not token_refs:
+            return
+        self.client.delete_multi([self._prefix_token_id(token_id)
+                                  for token_id, token_ref in token_refs])
+        sequence = self._next_revocation_sequence(len(token_refs))
+        first_sequence = sequence - len(token_refs) + 1
+        revoked = []
+        for seq, (token_id, token_ref) in enumerate(token_refs,
+                                                    first_sequence):
+            revoked.append(dict(token_ref, seq=seq))
+        self._add_to_revocation_list(revoked)
+
+    def _get_revocation_list(self):
         list_json = self.client.get(self.revocation_key)
-        if list_json:
-            return jsonutils.loads('[%s]' % list_json)
-        return []
+        if not list_json:
+            return []
+        return jsonutils.loads('[%s]' % list_json)
+
+    def list_revoked_tokens(self, since=None):
+        tokens = self._get_revocation_list()
+        if since is not None:
+            # Entries written before sequence numbers existed have none and
+            # are only part of the full list.
+            tokens = [t for t in tokens if t.get('seq', 0) > since]
+        return tokens
+
+    def get_revocation_sequence(self):
+        """Return the highest sequence number below which none is missing.
+
+        Sequence numbers are reserved before their entries are appended, so
+        the counter can be ahead of the list, and entries can be appended out
+        of order. Only sequence numbers whose entries, and all earlier ones,
+        are in the list are advertised, so that a delta asked from them
+        misses nothing.
+
+        """
+        seqs = set(t['seq'] for t in self._get_revocation_list()
+                   if 'seq' in t)
+        sequence = 0
+        while sequence + 1 in seqs:
+            sequence += 1
+        return sequence
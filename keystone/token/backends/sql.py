@@ -14,14 +14,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import copy
+import datetime
 
 from keystone.common import sql
+from keystone.common import utils
+from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
 from keystone import token
 
 
+CONF = config.CONF
+
+
 class TokenModel(sql.ModelBase, sql.DictBase):
     __tablename__ = 'token'
     attributes = ['id', 'expires', 'user_id', 'trust_id']
@@ -31,25 +36,80 @@ class TokenModel(sql.ModelBase, sql.DictBase):
     valid = sql.Column(sql.Boolean(), default=True, nullable=False)
     user_id = sql.Column(sql.String(64))
     trust_id = sql.Column(sql.String(64))
+    # The end of the time window the token expires in, see expiry_bucket().
+    bucket = sql.Column(sql.DateTime(), default=None)
+    # Copied out of extra, so that tokens can be filtered by them in SQL.
+    tenant_id = sql.Column(sql.String(64))
+    consumer_id = sql.Column(sql.String(64))
     __table_args__ = (
         sql.Index('ix_token_expires', 'expires'),
-        sql.Index('ix_token_expires_valid', 'expires', 'valid')
+        sql.Index('ix_token_expires_valid', 'expires', 'valid'),
+        sql.Index('ix_token_bucket', 'bucket'),
+        sql.Index('ix_token_tenant_id', 'tenant_id'),
+        sql.Index('ix_token_consumer_id', 'consumer_id')
+    )
+
+
+def expiry_bucket(expires):
+    """Return the end of the time window a token expiring then belongs to.
+
+    Windows are ``[token] expiry_bucket_size`` seconds wide. Every token in a
+    bucket has expired once the bucket has ended, so flushing expired tokens
+    removes whole buckets, each with a single indexed delete.
+
+    """
+    if expires is None:
+        return None
+    size = CONF.token.expiry_bucket_size
+    end = (utils.unixtime(expires) // size + 1) * size
+    return datetime.datetime.utcfromtimestamp(end)
+
+
+class RevocationLogModel(sql.ModelBase, sql.DictBase):
+    __tablename__ = 'token_revocation_log'
+    attributes = ['seq', 'token_id', 'expires']
+    seq = sql.Column(sql.Integer, primary_key=True, autoincrement=True)
+    token_id = sql.Column(sql.String(64), nullable=False)
+    expires = sql.Column(sql.DateTime(), default=None)
+    __table_args__ = (
+        sql.Index('ix_token_revocation_log_expires', 'expires'),
     )
 
 
+class RevocationSequenceModel(sql.ModelBase):
+    """The single row holding the last revocation sequence number handed out.
+
+    Revoking transactions update the row before logging their tokens, which
+    keeps it locked until they commit. Sequence numbers are thus committed in
+    order, and a client that has seen one number has seen all lower ones.
+
+    """
+    __tablename__ = 'token_revocation_sequence'
+    id = sql.Column(sql.Integer, primary_key=True, autoincrement=False)
+    seq = sql.Column(sql.Integer, nullable=False)
+
+
 class Token(sql.Base, token.Driver):
     # Public interface
     def get_token(self, token_id):
         if token_id is None:
             raise exception.TokenNotFound(token_id=token_id)
         session = self.get_session()
-        token_ref = session.query(TokenModel).get(token_id)
-        if not token_ref or not token_ref.valid:
+        # Only load the columns to_dict() would return, without building a
+        # model instance; the reference has to be frozen afterwards anyway.
+        query = session.query(TokenModel.extra, TokenModel.valid,
+                              *[getattr(TokenModel, attr)
+                                for attr in TokenModel.attributes])
+        row = query.filter(TokenModel.id == token_id).first()
+        if row is None or not row.valid:
             raise exception.TokenNotFound(token_id=token_id)
-        return token_ref.to_dict()
+        token_ref = dict(row.extra)
+        for attr in TokenModel.attributes:
+            token_ref[attr] = getattr(row, attr)
+        return utils.freeze(token_ref)
 
     def create_token(self, token_id, data):
-        data_copy = copy.deepcopy(data)
+        data_copy = dict(data)
         if not data_copy.get('expires'):
             data_copy['expires'] = token.default_expire_time()
         if not data_copy.get('user_id'):
@@ -57,11 +117,14 @@ class Token(sql.Base, token.Driver):
 
         token_ref = TokenModel.from_dict(data_copy)
         token_ref.valid = True
+        token_ref.bucket = expiry_bucket(token_ref.expires)
+        token_ref.tenant_id = self._tenant_id(data_copy)
+        token_ref.consumer_id = self._consumer_id(data_copy)
         session = self.get_session()
         with session.begin():
             session.add(token_ref)
             session.flush()
-        return token_ref.to_dict()
+        return utils.freeze(token_ref.to_dict())
 
     def delete_token(self, token_id):
         session = self.get_session()
@@ -70,7 +133,37 @@ class Token(sql.Base, token.Driver):
             if not token_ref or not token_ref.valid:
                 raise exception.TokenNotFound(token_id=token_id)
             token_ref.valid = False
+            # lock the token before the sequence, as delete_tokens does
+            session.flush()
+            self._log_revocations(session,
+                                  [(token_ref.id, token_ref.expires)])
+
+    def _log_revocations(self, session, revoked):
+        first = self._reserve_revocation_sequence(session, len(revoked))
+        session.execute(RevocationLogModel.__table__.insert(),
+                        [{'seq': seq, 'token_id': token_id,
+                          'expires': expires}
+                         for seq, (token_id, expires) in enumerate(revoked,
+                                                                   first)])
+
+    def _reserve_revocation_sequence(self, session, count):
+        """Reserve ``count`` sequence numbers and return the first one.
+
+        The counter is updated before it is read, so the row stays locked
+        until the revoking transaction commits.
+
+        """
+        table = RevocationSequenceModel.__table__
+        result = session.execute(table.update().values(seq=table.c.seq +
+                                                       count))
+        if not result.rowcount:
+            # the row is only created by the migration, not by create_all()
+            first = self._get_revocation_sequence(session) + 1
+            session.add(RevocationSequenceModel(id=1, seq=first + count - 1))
             session.flush()
+            return first
+        query = session.query(RevocationSequenceModel.seq)
+        return query.scalar() - count + 1
 
     def delete_tokens(self, user_id, tenant_id=None, trust_id=None,
                       consumer_id=None):
@@ -84,106 +177,70 @@ class Token(sql.Base, token.Driver):
         """
         session = self.get_session()
         with session.begin():
-            now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter_by(valid=True)
-            query = query.filter(TokenModel.expires > now)
-            if trust_id:
-                query = query.filter(TokenModel.trust_id == trust_id)
-            else:
-                query = query.filter(TokenModel.user_id == user_id)
-
-            for token_ref in query.all():
-                if tenant_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._tenant_matches(tenant_id, token_ref_dict):
-                        continue
-                if consumer_id:
-                    token_ref_dict = token_ref.to_dict()
-                    if not self._consumer_matches(consumer_id, token_ref_dict):
-                        continue
-
-                token_ref.valid = False
-
-            session.flush()
+            # Lock the rows while logging them, so that the update below
+            # revokes exactly the tokens that were logged.
+            query = self._token_query(session, (TokenModel.id,
+                                                TokenModel.expires),
+                                      user_id, tenant_id, trust_id,
+                                      consumer_id)
+            revoked = query.with_lockmode('update').all()
+            if not revoked:
+                return
+            self._log_revocations(session, revoked)
+            query = self._token_query(session, (TokenModel,), user_id,
+                                      tenant_id, trust_id, consumer_id)
+            query.update({'valid': False}, synchronize_session=False)
 
-    def _tenant_matches(self, tenant_id, token_ref_dict):
-        return ((tenant_id is None) or
-                (token_ref_dict.get('tenant') and
-                 token_ref_dict['tenant'].get('id') == tenant_id))
+    def _tenant_id(self, token_ref):
+        tenant = token_ref.get('tenant')
+        return tenant and tenant.get('id')
 
-    def _consumer_matches(self, consumer_id, ref):
-        if consumer_id is None:
-            return True
-        else:
-            try:
-                oauth = ref['token_data']['token'].get('OS-OAUTH1', {})
-                return oauth and oauth['consumer_id'] == consumer_id
-            except KeyError:
-                return False
-
-    def _list_tokens_for_trust(self, trust_id):
-        session = self.get_session()
-        tokens = []
-        now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.trust_id == trust_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            tokens.append(token_ref_dict['id'])
-        return tokens
+    def _consumer_id(self, token_ref):
+        try:
+            oauth = token_ref['token_data']['token'].get('OS-OAUTH1')
+            return oauth and oauth.get('consumer_id')
+        except KeyError:
+            return None
 
-    def _list_tokens_for_user(self, user_id, tenant_id=None):
-        session = self.get_session()
-        tokens = []
+    def _token_query(self, session, columns, user_id, tenant_id=None,
+                     trust_id=None, consumer_id=None):
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
+        query = session.query(*columns)
+        query = query.filter_by(valid=True)
         query = query.filter(TokenModel.expires > now)
-        query = query.filter(TokenModel.user_id == user_id)
-
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if self._tenant_matches(tenant_id, token_ref_dict):
-                tokens.append(token_ref['id'])
-        return tokens
-
-    def _list_tokens_for_consumer(self, user_id, consumer_id):
-        tokens = []
-        session = self.get_session()
-        with session.begin():
-            now = timeutils.utcnow()
-            query = session.query(TokenModel)
-            query = query.filter(TokenModel.expires > now)
+        # A trust, then a consumer, take precedence over a tenant, as they
+        # do in the kvs backend.
+        if trust_id:
+            query = query.filter(TokenModel.trust_id == trust_id)
+        else:
             query = query.filter(TokenModel.user_id == user_id)
-            token_references = query.filter_by(valid=True)
-
-            for token_ref in token_references:
-                token_ref_dict = token_ref.to_dict()
-                if self._consumer_matches(consumer_id, token_ref_dict):
-                    tokens.append(token_ref_dict['id'])
-            session.flush()
-        return tokens
+            if consumer_id:
+                query = query.filter(TokenModel.consumer_id == consumer_id)
+            elif tenant_id:
+                query = query.filter(TokenModel.tenant_id == tenant_id)
+        return query
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None,
                     consumer_id=None):
-        if trust_id:
-            return self._list_tokens_for_trust(trust_id)
-        if consumer_id:
-            return self._list_tokens_for_consumer(user_id, consumer_id)
-        else:
-            return self._list_tokens_for_user(user_id, tenant_id)
+        session = self.get_session()
+        query = self._token_query(session, (TokenModel.id,), user_id,
+                                  tenant_id, trust_id, consumer_id)
+        return [token_id for token_id, in query.all()]
 
-    def list_revoked_tokens(self):
+    def list_revoked_tokens(self, since=None):
         session = self.get_session()
         tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel.id, TokenModel.expires)
-        query = query.filter(TokenModel.expires > now)
-        token_references = query.filter_by(valid=False)
+        if since is None:
+            query = session.query(TokenModel.id, TokenModel.expires)
+            query = query.filter(TokenModel.expires > now)
+            token_references = query.filter_by(valid=False)
+        else:
+            query = session.query(RevocationLogModel.token_id,
+                                  RevocationLogModel.expires)
+            query = query.filter(RevocationLogModel.seq > since)
+            token_references = query.filter(
+                RevocationLogModel.expires > now)
         for token_ref in token_references:
             record = {
                 'id': token_ref[0],
@@ -192,11 +249,55 @@ class Token(sql.Base, token.Driver):
             tokens.append(record)
         return tokens
 
+    def get_revocation_sequence(self):
+        return self._get_revocation_sequence(self.get_session())
+
+    def _get_revocation_sequence(self, session):
+        sequence = session.query(RevocationSequenceModel.seq).scalar()
+        if sequence is None:
+            query = session.query(sql.func.max(RevocationLogModel.seq))
+            sequence = query.scalar()
+        return sequence or 0
+
     def flush_expired_tokens(self):
         session = self.get_session()
+        now = timeutils.utcnow()
 
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires < timeutils.utcnow())
-        query.delete(synchronize_session=False)
+        # Delete one bucket per transaction, so that locks are only held on
+        # a bounded number of rows at a time. Tokens that already expired in
+        # a bucket that has not ended yet are removed by a later flush.
+        query = session.query(TokenModel.bucket).distinct()
+        query = query.filter(TokenModel.bucket <= now)
+        for bucket, in query.order_by(TokenModel.bucket).all():
+            with session.begin():
+                query = session.query(TokenModel)
+                query = query.filter(TokenModel.bucket == bucket)
+                query.delete(synchronize_session=False)
 
+        self._flush_revocation_log(session, now)
         session.flush()
+
+    def flush_expired_tokens_batch(self, batch_size):
+        session = self.get_session()
+        now = timeutils.utcnow()
+        with session.begin():
+            # Walk ix_token_expires from the oldest token, so that each batch
+            # only touches the rows it is about to delete.
+            query = session.query(TokenModel.id)
+            query = query.filter(TokenModel.expires < now)
+            query = query.order_by(TokenModel.expires).limit(batch_size)
+            token_ids = [token_id for token_id, in query.all()]
+            if token_ids:
+                query = session.query(TokenModel)
+                query = query.filter(TokenModel.id.in_(token_ids))
+                query.delete(synchronize_session=False)
+            if len(token_ids) < batch_size:
+                self._flush_revocation_log(session, now)
+        return len(token_ids)
+
+    def _flush_revocation_log(self, session, now):
+        # The sequence is kept by token_revocation_sequence, so every
+        # expired entry can go.
+        query = session.query(RevocationLogModel)
+        query = query.filter(RevocationLogModel.expires < now)
+        query.delete(synchronize_session=False)
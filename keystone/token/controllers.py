@@ -14,9 +14,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import json
-
-from keystone.common import cms
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import wsgi
@@ -118,10 +115,8 @@ class Auth(controller.V2Controller):
         if bind:
             auth_token_data['bind'] = bind
 
-        roles_ref = []
-        for role_id in metadata_ref.get('roles', []):
-            role_ref = self.identity_api.get_role(role_id)
-            roles_ref.append(dict(name=role_ref['name']))
+        role_refs = self.identity_api.get_roles(metadata_ref.get('roles', []))
+        roles_ref = [dict(name=role_ref['name']) for role_ref in role_refs]
 
         (token_id, token_data) = self.token_provider_api.issue_v2_token(
             auth_token_data, roles_ref=roles_ref, catalog_ref=catalog_ref)
@@ -430,17 +425,15 @@ class Auth(controller.V2Controller):
 
     @controller.protected()
     def revocation_list(self, context, auth=None):
-        tokens = self.token_api.list_revoked_tokens()
-
-        for t in tokens:
-            expires = t['expires']
-            if not (expires and isinstance(expires, unicode)):
-                    t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
-        json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
+        since = context['query_string'].get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                msg = _('The since parameter must be a revocation sequence '
+                        'number.')
+                raise exception.ValidationError(message=msg)
+        signed_text = self.token_api.get_signed_revocation_list(since)
 
         return {'signed': signed_text}
 
@@ -16,13 +16,14 @@
 
 """Main entry point into the Token service."""
 
-import copy
 import datetime
+import json
 
 from keystone.common import cache
 from keystone.common import cms
 from keystone.common import dependency
 from keystone.common import manager
+from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import log as logging
@@ -141,8 +142,9 @@ class Manager(manager.Manager):
 
     def create_token(self, token_id, data):
         unique_id = self.unique_id(token_id)
-        data_copy = copy.deepcopy(data)
-        data_copy['id'] = unique_id
+        # The token reference is frozen once here, so the driver and the
+        # cache can keep it without copying it again.
+        data_copy = utils.freeze(dict(data, id=unique_id))
         ret = self.driver.create_token(unique_id, data_copy)
         if SHOULD_CACHE(ret):
             # NOTE(morganfainberg): when doing a cache set, you must pass the
@@ -162,9 +164,8 @@ class Manager(manager.Manager):
         token_list = self.driver.list_tokens(user_id, tenant_id, trust_id,
                                              consumer_id)
         self.driver.delete_tokens(user_id, tenant_id, trust_id, consumer_id)
-        for token_id in token_list:
-            unique_id = self.unique_id(token_id)
-            self._invalidate_individual_token_cache(unique_id)
+        unique_ids = [self.unique_id(token_id) for token_id in token_list]
+        self._invalidate_individual_token_caches(unique_ids)
         self.invalidate_revocation_list()
 
     @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
@@ -172,6 +173,50 @@ class Manager(manager.Manager):
     def list_revoked_tokens(self):
         return self.driver.list_revoked_tokens()
 
+    def get_revocation_sequence(self):
+        return self.driver.get_revocation_sequence()
+
+    def get_signed_revocation_list(self, since=None):
+        """Return the CMS signed revocation list.
+
+        If ``since`` is given, only the tokens revoked after that revocation
+        sequence number are listed. The signed document includes the current
+        sequence number so that clients can ask for the next delta.
+
+        """
+        try:
+            sequence = self.get_revocation_sequence()
+        except exception.NotImplemented:
+            # The driver has no revocation sequence, so every client gets
+            # the full list, which is only cached until the next revocation.
+            tokens = [dict(t) for t in self.list_revoked_tokens()]
+            return self._sign_revocation_list(tokens, 0)
+        if since is not None and since > sequence:
+            # The client has seen revocations that we don't know of (e.g.
+            # the revocation log was reset), so give it the full list again.
+            since = None
+        return self._get_signed_revocation_list(sequence, since)
+
+    # The cache key includes the sequence number, so the signed document is
+    # only rebuilt after another token has been revoked.
+    @cache.on_arguments(should_cache_fn=SHOULD_CACHE,
+                        expiration_time=CONF.token.revocation_cache_time)
+    def _get_signed_revocation_list(self, sequence, since):
+        tokens = self.driver.list_revoked_tokens(since=since)
+        return self._sign_revocation_list(tokens, sequence)
+
+    def _sign_revocation_list(self, tokens, sequence):
+        for t in tokens:
+            t.pop('seq', None)
+            expires = t['expires']
+            if not (expires and isinstance(expires, unicode)):
+                t['expires'] = timeutils.isotime(expires)
+        data = {'revoked': tokens, 'sequence': sequence}
+        json_data = json.dumps(data)
+        return cms.cms_sign_text(json_data,
+                                 CONF.signing.certfile,
+                                 CONF.signing.keyfile)
+
     def invalidate_revocation_list(self):
         # NOTE(morganfainberg): Note that ``self`` needs to be passed to
         # invalidate() because of the way the invalidation method works on
@@ -190,6 +235,12 @@ class Manager(manager.Manager):
         self._get_token.invalidate(self, token_id)
         self.token_provider_api.invalidate_individual_token_cache(token_id)
 
+    def _invalidate_individual_token_caches(self, token_ids):
+        keys = [self._get_token.key_generator(self, token_id)
+                for token_id in token_ids]
+        cache.invalidate_multi(keys)
+        self.token_provider_api.invalidate_individual_token_caches(token_ids)
+
 
 class Driver(object):
     """Interface description for a Token driver."""
@@ -264,10 +315,8 @@ class Driver(object):
         :raises: keystone.exception.TokenNotFound
 
         """
-        # TODO(henry-nash): The SQL driver already has a more efficient
-        # implementation of this, although this is missing from the other
-        # backends.  These should be completed and then this should become
-        # a virtual method.  This is raised as bug #1227507.
+        # All the in-tree drivers have a more efficient implementation of
+        # this; the generic version is kept for other drivers.
 
         token_list = self.list_tokens(user_id,
                                       tenant_id=tenant_id,
@@ -301,15 +350,42 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_revoked_tokens(self):
+    def list_revoked_tokens(self, since=None):
         """Returns a list of all revoked tokens
 
+        :param since: only list the tokens revoked after this revocation
+                      sequence number
+        :type since: int
         :returns: list of token_id's
 
         """
         raise exception.NotImplemented()
 
+    def get_revocation_sequence(self):
+        """Returns the sequence number of the latest token revocation
+
+        Every revoked token increases the sequence number by at least one.
+
+        :returns: int, 0 if no token has been revoked
+
+        """
+        raise exception.NotImplemented()
+
     def flush_expired_tokens(self):
         """Archive or delete tokens that have expired.
         """
         raise exception.NotImplemented()
+
+    def flush_expired_tokens_batch(self, batch_size):
+        """Delete the oldest expired tokens, at most batch_size of them.
+
+        Each call is committed on its own, so callers can purge a large
+        backlog of expired tokens in small steps.
+
+        :param batch_size: maximum number of tokens to delete
+        :type batch_size: int
+        :returns: the number of tokens deleted, less than batch_size once
+                  no expired tokens are left
+
+        """
+        raise exception.NotImplemented()
@@ -223,6 +223,14 @@ class Manager(manager.Manager):
         self._validate_v2_token.invalidate(self, token_id)
         self._validate_v3_token.invalidate(self, token_id)
 
+    def invalidate_individual_token_caches(self, token_ids):
+        keys = []
+        for token_id in token_ids:
+            keys.append(self._validate_token.key_generator(self, token_id))
+            keys.append(self._validate_v2_token.key_generator(self, token_id))
+            keys.append(self._validate_v3_token.key_generator(self, token_id))
+        cache.invalidate_multi(keys)
+
 
 class Provider(object):
     """Interface description for a Token provider."""
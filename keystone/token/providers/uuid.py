@@ -21,10 +21,14 @@ from __future__ import absolute_import
 import json
 import sys
 import uuid
+import weakref
 
+from keystone.common import cache
 from keystone.common import dependency
+from keystone.common import utils
 from keystone import config
 from keystone import exception
+from keystone import notifications
 from keystone.openstack.common import log as logging
 from keystone.openstack.common import timeutils
 from keystone import token
@@ -34,6 +38,23 @@ from keystone import trust
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 DEFAULT_DOMAIN_ID = CONF.identity.default_domain_id
+SHOULD_CACHE = cache.should_cache_fn('token')
+SHOULD_CACHE_CATALOG = cache.should_cache_fn('catalog')
+
+# The token data caches of the V3TokenDataHelpers, all of which are cleared
+# when anything they may hold changes.
+_TOKEN_DATA_CACHES = weakref.WeakSet()
+
+
+def _clear_token_data_caches(operation, resource_type, resource_id):
+    for token_data_cache in list(_TOKEN_DATA_CACHES):
+        token_data_cache.clear()
+
+
+for _operation in ('updated', 'deleted'):
+    for _resource_type in ('user', 'project', 'domain', 'role'):
+        notifications.register_event_callback(_operation, _resource_type,
+                                              _clear_token_data_caches)
 
 
 @dependency.requires('catalog_api', 'identity_api')
@@ -65,8 +86,8 @@ class V2TokenDataHelper(object):
         if 'bind' in token_ref:
             o['access']['token']['bind'] = token_ref['bind']
         if 'tenant' in token_ref and token_ref['tenant']:
-            token_ref['tenant']['enabled'] = True
-            o['access']['token']['tenant'] = token_ref['tenant']
+            o['access']['token']['tenant'] = dict(token_ref['tenant'],
+                                                  enabled=True)
         if catalog_ref is not None:
             o['access']['serviceCatalog'] = V2TokenDataHelper.format_catalog(
                 catalog_ref)
@@ -138,6 +159,12 @@ class V3TokenDataHelper(object):
     def __init__(self):
         if CONF.trust.enabled:
             self.trust_api = trust.Manager()
+        # The user, scope, roles and catalog of recent tokens, by who they
+        # are for and their scope.
+        self._token_data_cache = utils.LRUCache(
+            CONF.token.token_data_cache_size,
+            CONF.token.token_data_cache_time)
+        _TOKEN_DATA_CACHES.add(self._token_data_cache)
 
     def _get_filtered_domain(self, domain_id):
         domain_ref = self.identity_api.get_domain(domain_id)
@@ -162,15 +189,26 @@ class V3TokenDataHelper(object):
         if project_id:
             token_data['project'] = self._get_filtered_project(project_id)
 
-    def _get_roles_for_user(self, user_id, domain_id, project_id):
-        roles = []
+    def _get_role_ids_for_user(self, user_id, domain_id, project_id):
+        role_ids = []
         if domain_id:
-            roles = self.identity_api.get_roles_for_user_and_domain(
+            role_ids = self.identity_api.get_roles_for_user_and_domain(
                 user_id, domain_id)
         if project_id:
-            roles = self.identity_api.get_roles_for_user_and_project(
+            role_ids = self.identity_api.get_roles_for_user_and_project(
                 user_id, project_id)
-        return [self.identity_api.get_role(role_id) for role_id in roles]
+        return role_ids
+
+    def _get_roles_for_user(self, user_id, domain_id, project_id):
+        return self.identity_api.get_roles(
+            self._get_role_ids_for_user(user_id, domain_id, project_id))
+
+    def _get_role_scope(self, user_id, domain_id, project_id, trust):
+        """Return the user, domain and project the roles are taken from."""
+        if CONF.trust.enabled and trust:
+            #trusts do not support domains yet
+            return trust['trustor_user_id'], None, trust['project_id']
+        return user_id, domain_id, project_id
 
     def _populate_user(self, token_data, user_id, domain_id, project_id,
                        trust):
@@ -207,7 +245,7 @@ class V3TokenDataHelper(object):
                                         'consumer_id': consumer_id})
 
     def _populate_roles(self, token_data, user_id, domain_id, project_id,
-                        trust, access_token):
+                        trust, access_token, role_ids=None):
         if 'roles' in token_data:
             # no need to repopulate roles
             return
@@ -224,20 +262,15 @@ class V3TokenDataHelper(object):
             token_data['roles'] = filtered_roles
             return
 
-        if CONF.trust.enabled and trust:
-            token_user_id = trust['trustor_user_id']
-            token_project_id = trust['project_id']
-            #trusts do not support domains yet
-            token_domain_id = None
-        else:
-            token_user_id = user_id
-            token_project_id = project_id
-            token_domain_id = domain_id
+        token_user_id, token_domain_id, token_project_id = (
+            self._get_role_scope(user_id, domain_id, project_id, trust))
 
         if token_domain_id or token_project_id:
-            roles = self._get_roles_for_user(token_user_id,
-                                             token_domain_id,
-                                             token_project_id)
+            if role_ids is None:
+                role_ids = self._get_role_ids_for_user(token_user_id,
+                                                       token_domain_id,
+                                                       token_project_id)
+            roles = self.identity_api.get_roles(role_ids)
             filtered_roles = []
             if CONF.trust.enabled and trust:
                 for trust_role in trust['roles']:
@@ -296,6 +329,61 @@ class V3TokenDataHelper(object):
         token_data['expires_at'] = expires
         token_data['issued_at'] = timeutils.isotime(subsecond=True)
 
+    def _populate_scoped_data(self, token_data, user_id, domain_id,
+                              project_id, trust, access_token,
+                              include_catalog, role_ids=None):
+        """Populate the parts of the token data that depend on its scope."""
+        self._populate_scope(token_data, domain_id, project_id)
+        self._populate_user(token_data, user_id, domain_id, project_id, trust)
+        self._populate_roles(token_data, user_id, domain_id, project_id, trust,
+                             access_token, role_ids)
+        if include_catalog:
+            self._populate_service_catalog(token_data, user_id, domain_id,
+                                           project_id, trust)
+
+    def _populate_cached_scoped_data(self, token_data, user_id, domain_id,
+                                     project_id, trust, access_token,
+                                     include_catalog):
+        """Populate the scoped parts of the token data through the cache.
+
+        The ids of the roles the user has on the scope are looked up every
+        time and are part of the cache key, so that changes to grants apply
+        to the very next token; so is the version of the catalog. Without
+        catalog caching every version is a new one, so the catalog is then
+        left out of the cached data and rendered for each token instead.
+
+        """
+        role_ids = None
+        if not access_token:
+            role_user_id, role_domain_id, role_project_id = (
+                self._get_role_scope(user_id, domain_id, project_id, trust))
+            if role_domain_id or role_project_id:
+                role_ids = self._get_role_ids_for_user(
+                    role_user_id, role_domain_id, role_project_id)
+        cache_catalog = include_catalog and SHOULD_CACHE_CATALOG(None)
+        catalog_version = None
+        if cache_catalog:
+            catalog_version = self.catalog_api.get_catalog_version()
+        key = (user_id, domain_id, project_id,
+               trust['id'] if trust else None,
+               access_token['id'] if access_token else None,
+               tuple(role_ids) if role_ids is not None else None,
+               catalog_version)
+
+        scoped_data = self._token_data_cache.get(key)
+        if scoped_data is None:
+            scoped_data = {}
+            self._populate_scoped_data(scoped_data, user_id, domain_id,
+                                       project_id, trust, access_token,
+                                       cache_catalog, role_ids)
+            # The cached parts are shared by all the tokens built from them.
+            scoped_data = utils.freeze(scoped_data)
+            self._token_data_cache.set(key, scoped_data)
+        token_data.update(scoped_data)
+        if include_catalog and not cache_catalog:
+            self._populate_service_catalog(token_data, user_id, domain_id,
+                                           project_id, trust)
+
     def get_token_data(self, user_id, method_names, extras,
                        domain_id=None, project_id=None, expires=None,
                        trust=None, token=None, include_catalog=True,
@@ -316,13 +404,14 @@ class V3TokenDataHelper(object):
         if bind:
             token_data['bind'] = bind
 
-        self._populate_scope(token_data, domain_id, project_id)
-        self._populate_user(token_data, user_id, domain_id, project_id, trust)
-        self._populate_roles(token_data, user_id, domain_id, project_id, trust,
-                             access_token)
-        if include_catalog:
-            self._populate_service_catalog(token_data, user_id, domain_id,
-                                           project_id, trust)
+        if token or not SHOULD_CACHE(None):
+            self._populate_scoped_data(token_data, user_id, domain_id,
+                                       project_id, trust, access_token,
+                                       include_catalog)
+        else:
+            self._populate_cached_scoped_data(token_data, user_id, domain_id,
+                                              project_id, trust, access_token,
+                                              include_catalog)
         self._populate_token_dates(token_data, expires=expires, trust=trust)
         self._populate_oauth_section(token_data, access_token)
         return {'token': token_data}
@@ -533,9 +622,8 @@ class Provider(token.provider.Provider):
                     token.provider.V2):
                 # token is created by old v2 logic
                 metadata_ref = token_ref['metadata']
-                roles_ref = []
-                for role_id in metadata_ref.get('roles', []):
-                    roles_ref.append(self.identity_api.get_role(role_id))
+                roles_ref = self.identity_api.get_roles(
+                    metadata_ref.get('roles', []))
 
                 # Get a service catalog if possible
                 # This is needed for on-behalf-of requests